@@ -0,0 +1,178 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+"""Compare size and encode/decode throughput of session job and file status records for every storage format.
+
+Run with `python -m benchmarks.codecs` in the service environment. When a Redis url is given, records are written under
+the "benchmark:" prefix and memory usage reported by Redis is measured as well:
+
+    python -m benchmarks.codecs --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import json
+import timeit
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from redis.asyncio.client import Redis
+
+from dataops.components.codecs import CODECS
+from dataops.components.codecs import get_codec
+from dataops.components.task_dispatch.crud import SessionJobCRUD
+from dataops.components.task_dispatch.schemas import TaskSchema
+from dataops.components.task_stream.parsing import StreamParser
+
+
+def build_job() -> tuple[str, dict]:
+    task = TaskSchema(
+        session_id=f'admin-{uuid.uuid4()}',
+        job_id=str(uuid.uuid4()),
+        source=f'admin/folder/subfolder/{uuid.uuid4()}.csv',
+        action='data_upload',
+        code='indoctestproject',
+        operator='admin',
+        progress=42,
+        payload={
+            'task_id': str(uuid.uuid4()),
+            'resumable_identifier': str(uuid.uuid4()),
+            'parent_folder_geid': str(uuid.uuid4()),
+        },
+    )
+    return SessionJobCRUD.build_job(task)
+
+
+def build_file_status() -> dict:
+    return {
+        'target_names': ['admin/folder/file_1.csv', 'admin/folder/file_2.csv'],
+        'target_type': 'batch',
+        'container_code': 'indoctestproject',
+        'container_type': 'project',
+        'action_type': 'data_upload',
+        'status': 'RUNNING',
+        'job_id': str(uuid.uuid4()),
+    }
+
+
+def get_size(record: dict[str, Any] | bytes) -> int:
+    """Return number of bytes of field names and values of the record."""
+    if isinstance(record, bytes):
+        return len(record)
+    return sum(
+        len(str(field).encode()) + len(value if isinstance(value, bytes) else str(value).encode())
+        for field, value in record.items()
+    )
+
+
+def get_throughput(function: Callable[[], Any], number: int) -> float:
+    return number / timeit.timeit(function, number=number)
+
+
+def get_job_formats(redis: Redis, key: str, job: dict) -> dict[str, tuple[Callable, Callable]]:
+    formats = {
+        'legacy string': (
+            lambda: json.dumps(job).encode(),
+            lambda record: json.loads(record),
+        ),
+        'legacy hash': (
+            lambda: {
+                **{name: json.dumps(value) for name, value in job.items() if name != 'payload'},
+                **{f'payload.{name}': json.dumps(value) for name, value in job['payload'].items()},
+            },
+            lambda record: SessionJobCRUD.decode_legacy_job({field.encode(): value for field, value in record.items()}),
+        ),
+    }
+    for name in CODECS:
+        session_job_crud = SessionJobCRUD(redis, get_codec(name))
+        formats[f'{name} hash'] = (
+            lambda crud=session_job_crud: crud.encode_job(job),
+            lambda record, crud=session_job_crud: crud.decode_job(
+                key.encode(), {field.encode(): value for field, value in record.items()}
+            ),
+        )
+    return formats
+
+
+def get_file_status_formats(file_status: dict) -> dict[str, tuple[Callable, Callable]]:
+    formats = {
+        'legacy fields': (
+            lambda: file_status | {'target_names': str(file_status['target_names'])},
+            lambda record: StreamParser.decode_file_status(
+                {field.encode(): value.encode() for field, value in record.items()}
+            ),
+        ),
+    }
+    for name in CODECS:
+        codec = get_codec(name)
+        formats[f'{name} entry'] = (
+            lambda codec=codec: StreamParser.encode_file_status(file_status, codec),
+            lambda record: StreamParser.decode_file_status({field.encode(): value for field, value in record.items()}),
+        )
+    return formats
+
+
+async def get_job_memory_usage(redis: Redis, record: dict | bytes, count: int) -> float:
+    keys = [f'benchmark:{uuid.uuid4()}' for _ in range(count)]
+    async with redis.pipeline(transaction=False) as pipeline:
+        for key in keys:
+            if isinstance(record, bytes):
+                pipeline.set(key, record)
+            else:
+                pipeline.hset(key, mapping=record)
+        await pipeline.execute()
+    try:
+        usages = [await redis.memory_usage(key, samples=0) for key in keys]
+    finally:
+        await redis.unlink(*keys)
+    return sum(usages) / count
+
+
+async def get_stream_memory_usage(redis: Redis, record: dict, count: int) -> float:
+    key = f'benchmark:{uuid.uuid4()}'
+    async with redis.pipeline(transaction=False) as pipeline:
+        for _ in range(count):
+            pipeline.xadd(key, record)
+        await pipeline.execute()
+    try:
+        usage = await redis.memory_usage(key, samples=0)
+    finally:
+        await redis.unlink(key)
+    return usage / count
+
+
+async def main(redis_url: str | None, count: int, number: int) -> None:
+    redis = Redis.from_url(redis_url) if redis_url else Redis()
+    key, job = build_job()
+    file_status = build_file_status()
+
+    print(f'{"session job":<16}{"bytes":>8}{"encode/s":>12}{"decode/s":>12}{"memory":>10}')
+    for name, (encode, decode) in get_job_formats(redis, key, job).items():
+        record = encode()
+        memory = await get_job_memory_usage(redis, record, count) if redis_url else float('nan')
+        encode_rate = get_throughput(encode, number)
+        decode_rate = get_throughput(lambda: decode(record), number)
+        print(f'{name:<16}{get_size(record):>8}{encode_rate:>12.0f}{decode_rate:>12.0f}{memory:>10.1f}')
+
+    print(f'\n{"file status":<16}{"bytes":>8}{"encode/s":>12}{"decode/s":>12}{"memory":>10}')
+    for name, (encode, decode) in get_file_status_formats(file_status).items():
+        record = encode()
+        memory = await get_stream_memory_usage(redis, record, count) if redis_url else float('nan')
+        encode_rate = get_throughput(encode, number)
+        decode_rate = get_throughput(lambda: decode(record), number)
+        print(f'{name:<16}{get_size(record):>8}{encode_rate:>12.0f}{decode_rate:>12.0f}{memory:>10.1f}')
+
+    await redis.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', help='Redis url to measure memory usage of records with')
+    parser.add_argument('--count', type=int, default=1000, help='Number of records written to measure memory usage')
+    parser.add_argument('--number', type=int, default=20000, help='Number of encodings and decodings to measure')
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.redis_url, arguments.count, arguments.number))
@@ -4,6 +4,7 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
 from functools import partial
 
 from common import configure_logging
@@ -22,6 +23,8 @@ from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from pydantic import ValidationError
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
 
 from dataops.components.archive_preview import archive_preview_router
 from dataops.components.central_node import central_node_router
@@ -29,13 +32,19 @@ from dataops.components.exceptions import ServiceException
 from dataops.components.exceptions import ServiceValidationError
 from dataops.components.health import health_router
 from dataops.components.resource_lock import resource_lock_router
+from dataops.components.resource_lock.cache import ResourceLockerCache
+from dataops.components.resource_lock.dependencies import get_resource_lock_release_listener
+from dataops.components.resource_lock.reaper import ResourceLockReaper
 from dataops.components.resource_operations import resource_ops_router
 from dataops.components.task_dispatch import task_router
+from dataops.components.task_dispatch.crud import SessionJobCRUD
 from dataops.components.task_stream import task_stream_router
+from dataops.components.task_stream.dependencies import get_stream_hub
 from dataops.config import Settings
 from dataops.config import get_settings
 from dataops.dependencies import get_redis
 from dataops.dependencies.db import get_db_engine
+from dataops.logger import logger
 
 
 def create_app() -> FastAPI:
@@ -81,15 +90,47 @@ def setup_dependencies(app: FastAPI, settings: Settings) -> None:
     """Perform dependencies setup/teardown at the application startup/shutdown events."""
 
     app.add_event_handler('startup', partial(startup_event, app, settings))
+    app.add_event_handler('shutdown', partial(shutdown_event, app))
 
 
 async def startup_event(app: FastAPI, settings: Settings) -> None:
     """Initialise dependencies at the application startup event."""
-    await get_redis(settings)
+    redis = await get_redis(settings)
+    resource_locker = ResourceLockerCache(redis, legacy_state=settings.RESOURCE_LOCK_LEGACY_STATE)
+    await resource_locker.load_scripts()
+    app.state.job_index_backfill = asyncio.create_task(backfill_job_indexes(redis))
+    if settings.RESOURCE_LOCK_REAPER_ENABLED:
+        reaper = ResourceLockReaper(
+            resource_locker,
+            interval=settings.RESOURCE_LOCK_REAPER_INTERVAL,
+            max_age=settings.RESOURCE_LOCK_REAPER_MAX_AGE,
+            batch_size=settings.RESOURCE_LOCK_REAPER_BATCH_SIZE,
+            batch_pause=settings.RESOURCE_LOCK_REAPER_BATCH_PAUSE,
+        )
+        app.state.resource_lock_reaper = asyncio.create_task(reaper.run())
     if settings.OPEN_TELEMETRY_ENABLED:
         await setup_tracing(app, settings)
 
 
+async def backfill_job_indexes(redis: Redis) -> None:
+    """Add jobs stored by previous versions to session indexes without delaying the application startup."""
+    try:
+        await SessionJobCRUD(redis).backfill_indexes()
+    except RedisError:
+        logger.exception('Unable to add jobs stored by previous versions to session indexes')
+
+
+async def shutdown_event(app: FastAPI) -> None:
+    """Stop background tasks at the application shutdown event."""
+    for name in ['resource_lock_reaper', 'job_index_backfill']:
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    await get_resource_lock_release_listener.stop()
+    await get_stream_hub.stop()
+
+
 def setup_middlewares(app: FastAPI) -> None:
     """Configure the application middlewares."""
 
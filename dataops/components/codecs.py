@@ -0,0 +1,71 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import json
+from abc import ABC
+from abc import abstractmethod
+from typing import Any
+
+import msgpack
+
+
+class Codec(ABC):
+    """Base class for encoding values stored in Redis.
+
+    The codec name is stored along with encoded values, so records written with any known codec can be read back after
+    the configured codec is changed.
+    """
+
+    name: str
+
+    @abstractmethod
+    def encode(self, value: Any) -> bytes:
+        """Return the value encoded as bytes."""
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        """Return the value decoded from bytes."""
+
+
+class JSONCodec(Codec):
+    """Encodes values as compact JSON."""
+
+    name = 'json'
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class MsgPackCodec(Codec):
+    """Encodes values with MessagePack."""
+
+    name = 'msgpack'
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS: dict[str, type[Codec]] = {
+    JSONCodec.name: JSONCodec,
+    MsgPackCodec.name: MsgPackCodec,
+}
+
+
+def get_codec(name: str | bytes) -> Codec:
+    """Return codec by its name."""
+
+    if isinstance(name, bytes):
+        name = name.decode()
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f'Unknown codec {name}')
@@ -4,13 +4,20 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+from collections.abc import AsyncIterator
+from collections.abc import Callable
 from datetime import timedelta
+from fnmatch import fnmatchcase
 from typing import Any
 from typing import Optional
 from uuid import UUID
 
 from pydantic import BaseModel
+from redis.asyncio.client import Pipeline
+from redis.asyncio.client import PubSub
 from redis.asyncio.client import Redis
+from redis.exceptions import ResponseError
+from redis.exceptions import WatchError
 from sqlalchemy import delete
 from sqlalchemy import insert
 from sqlalchemy.engine import CursorResult
@@ -24,6 +31,7 @@ from sqlalchemy.sql import Select
 
 from dataops.components.db_model import DBModel
 from dataops.components.exceptions import AlreadyExists
+from dataops.components.exceptions import InvalidInput
 from dataops.components.exceptions import NotFound
 from dataops.components.exceptions import ServiceException
 from dataops.components.exceptions import UnhandledException
@@ -137,6 +145,14 @@ class RedisCRUD:
     def __init__(self, redis: Redis) -> None:
         self.__instance = redis
 
+    def pipeline(self, transaction: bool = True) -> Pipeline:
+        """Create pipeline for sending multiple commands in a single round trip."""
+        return self.__instance.pipeline(transaction=transaction)
+
+    def pubsub(self) -> PubSub:
+        """Create pubsub for listening to channels on a dedicated connection."""
+        return self.__instance.pubsub()
+
     async def ping(self) -> bool:
         """Checks if connection is alive."""
         return await self.__instance.ping()
@@ -157,6 +173,171 @@ class RedisCRUD:
         keys = await self.__instance.keys(query)
         return await self.__instance.mget(keys)
 
+    @staticmethod
+    def queue_hset_with_index(
+        pipeline: Pipeline, key: str, mapping: dict[str, str], index: str, score: float, expire: int | None = None
+    ) -> None:
+        """Queue commands replacing hash record by key and adding the key to the index sorted set into the pipeline.
+
+        Index entries with score older than expiration of the records are dropped on the way.
+        """
+        expire_time = timedelta(hours=expire) if expire else None
+        pipeline.delete(key)
+        pipeline.hset(key, mapping=mapping)
+        pipeline.zadd(index, {key: score})
+        if expire_time:
+            pipeline.expire(key, expire_time)
+            pipeline.zremrangebyscore(index, '-inf', f'({score - expire_time.total_seconds()}')
+            pipeline.expire(index, expire_time)
+
+    async def convert_to_hash(
+        self, key: bytes, convert: Callable[[Pipeline, dict[bytes, bytes] | bytes], dict[str, str] | None]
+    ) -> bool:
+        """Replace record by hash with the mapping returned by the conversion keeping the expiration of the key.
+
+        The conversion receives the transaction and the current record, which is empty when the key does not exist,
+        and returns None to keep the record as it is. The key is watched until the transaction is executed, so the
+        conversion is repeated with the new record when the key is changed in the meantime.
+        """
+        async with self.__instance.pipeline(transaction=True) as pipeline:
+            while True:
+                try:
+                    await pipeline.watch(key)
+                    if await pipeline.type(key) == b'string':
+                        record = await pipeline.get(key)
+                    else:
+                        record = await pipeline.hgetall(key)
+                    expire_time = await pipeline.pttl(key)
+                    pipeline.multi()
+                    mapping = convert(pipeline, record)
+                    if mapping is None:
+                        return False
+                    pipeline.delete(key)
+                    pipeline.hset(key, mapping=mapping)
+                    if expire_time > 0:
+                        pipeline.pexpire(key, expire_time)
+                    await pipeline.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    @staticmethod
+    def parse_index_cursor(cursor: str) -> tuple[float, bytes]:
+        """Return score and key of the last entry from the index cursor."""
+        score, _, key = cursor.partition(':')
+        try:
+            return float(score), key.encode()
+        except ValueError:
+            raise InvalidInput()
+
+    async def get_keys_by_index(
+        self,
+        index: str,
+        pattern: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        min_score: float | str = '-inf',
+    ) -> tuple[list[bytes], str | None]:
+        """Find keys matching the pattern in the index sorted set, the most recent first.
+
+        When the limit is set, entries are read in batches until the limit of matching keys is reached and the cursor
+        for the next page is returned. The cursor holds score and key of the last returned entry, so pages stay stable
+        when entries are added to the index in the meantime.
+        """
+        max_score, last_key = '+inf', None
+        if cursor:
+            max_score, last_key = self.parse_index_cursor(cursor)
+
+        batch_size = max(limit, 100) if limit else None
+        offset = 0 if limit else None
+        keys = []
+        while True:
+            entries = await self.__instance.zrevrangebyscore(
+                index, max_score, min_score, start=offset, num=batch_size, withscores=True
+            )
+            for key, score in entries:
+                is_returned = last_key is not None and score == max_score and key >= last_key
+                if is_returned or not fnmatchcase(key.decode(), pattern):
+                    continue
+                keys.append(key)
+                if len(keys) == limit:
+                    return keys, f'{score}:{key.decode()}'
+
+            if not limit or len(entries) < batch_size:
+                return keys, None
+            offset += batch_size
+
+    async def get_keys_by_indexes(self, lookups: list[tuple[str, str]]) -> list[list[bytes]]:
+        """Find keys matching the pattern in the index for every index and pattern pair, the most recent first.
+
+        Every index is read once and all of them in a single round trip.
+        """
+        indexes = list(dict.fromkeys(index for index, _ in lookups))
+        async with self.__instance.pipeline(transaction=False) as pipeline:
+            for index in indexes:
+                pipeline.zrevrange(index, 0, -1)
+            index_keys = dict(zip(indexes, await pipeline.execute()))
+        return [[key for key in index_keys[index] if fnmatchcase(key.decode(), pattern)] for index, pattern in lookups]
+
+    async def hgetall_by_keys(self, keys: list[bytes]) -> list[dict[bytes, bytes] | bytes | None]:
+        """Retrieve hash records by keys in a single round trip.
+
+        Records stored as strings by previous versions are retrieved as they are. Missing records are empty.
+        """
+        async with self.__instance.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.hgetall(key)
+            values = await pipeline.execute(raise_on_error=False)
+        legacy_keys = [key for key, value in zip(keys, values) if isinstance(value, ResponseError)]
+        if legacy_keys:
+            legacy_values = dict(zip(legacy_keys, await self.__instance.mget(legacy_keys)))
+            values = [
+                legacy_values[key] if isinstance(value, ResponseError) else value for key, value in zip(keys, values)
+            ]
+        return values
+
+    async def hgetall_by_index(
+        self,
+        index: str,
+        pattern: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        min_score: float | str = '-inf',
+    ) -> tuple[list[tuple[bytes, dict[bytes, bytes] | bytes]], str | None]:
+        """Find keys matching the pattern in the index and retrieve respective keys and records with the next page
+        cursor.
+
+        Records are retrieved as hashes. Records stored as strings by previous versions are retrieved as they are.
+        Keys which do not exist anymore are removed from the index.
+        """
+        keys, next_cursor = await self.get_keys_by_index(index, pattern, limit, cursor, min_score)
+        if not keys:
+            return [], next_cursor
+        values = await self.hgetall_by_keys(keys)
+        expired_keys = [key for key, value in zip(keys, values) if not value]
+        if expired_keys:
+            await self.remove_from_index(index, expired_keys)
+        return [(key, value) for key, value in zip(keys, values) if value], next_cursor
+
+    async def remove_from_index(self, index: str, keys: list[bytes]) -> None:
+        """Remove keys which do not exist anymore from the index sorted set."""
+        await self.__instance.zrem(index, *keys)
+
+    @staticmethod
+    def queue_unlink(pipeline: Pipeline, keys: list[bytes], batch_size: int = 500) -> None:
+        """Queue commands unlinking the keys in batches into the pipeline."""
+        for i in range(0, len(keys), batch_size):
+            pipeline.unlink(*keys[i : i + batch_size])
+
+    async def unlink_by_keys(self, keys: list[bytes]) -> int:
+        """Unlink the keys from the keyspace in batches sent in a single round trip."""
+        if not keys:
+            return 0
+        async with self.__instance.pipeline(transaction=False) as pipeline:
+            self.queue_unlink(pipeline, keys)
+            results = await pipeline.execute()
+        return sum(results)
+
     async def delete_by_key(self, key: str) -> int:
         """Delete record by key."""
         return await self.__instance.delete(key)
@@ -165,29 +346,69 @@ class RedisCRUD:
         """Unlinks the key from the keyspace."""
         return await self.__instance.unlink(key)
 
-    async def mdele_by_prefix(self, prefix: str) -> list:
-        """Query to find key with pattern and delete respective record."""
-        query = f'{prefix}:*'
-        keys = await self.__instance.keys(query)
-        results = []
-        for key in keys:
-            res = await self.delete_by_key(key)
-            results.append(res)
-        return results
+    async def mdele_by_prefix(self, prefix: str) -> int:
+        """Find keys with pattern and delete respective records.
+
+        Keys are found with incremental scan and unlinked in batches. Returns the number of deleted records.
+        """
+        keys = await self.scan_by_pattern(f'{prefix}:*')
+        return await self.unlink_by_keys(keys)
+
+    async def scan_by_pattern(self, pattern: str) -> list[bytes]:
+        """Find keys matching the pattern with incremental scan, so the server is never blocked for long."""
+        return [key async for key in self.__instance.scan_iter(match=pattern, count=1000)]
+
+    async def scan_batches_by_pattern(self, pattern: str, batch_size: int = 500) -> AsyncIterator[list[bytes]]:
+        """Yield keys matching the pattern in batches as they are found with incremental scan."""
+        batch = []
+        async for key in self.__instance.scan_iter(match=pattern, count=1000):
+            batch.append(key)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     async def publish(self, channel: str, data: str) -> int:
         """Publish data to a channel."""
         res = await self.__instance.publish(channel, data)
         return res
 
-    async def streams_xadd(self, key: str, values: dict, id_arg: str = '*') -> bytes:
-        """Add data to stream."""
-        return await self.__instance.xadd(name=key, fields=values, id=id_arg)
+    async def streams_xadd(
+        self,
+        key: str,
+        values: dict,
+        id_arg: str = '*',
+        max_length: int | None = None,
+        min_id: str | None = None,
+        expire: int | None = None,
+    ) -> bytes:
+        """Add data to stream.
+
+        Stream is approximately trimmed to the maximum length and to entries not older than the minimum ID, and its
+        expiration is refreshed when given, in the same round trip.
+        """
+        pipeline = self.__instance.pipeline(transaction=False)
+        pipeline.xadd(name=key, fields=values, id=id_arg, maxlen=max_length, approximate=True)
+        if min_id is not None:
+            pipeline.xtrim(key, minid=min_id, approximate=True)
+        if expire:
+            pipeline.expire(key, expire)
+        entry_id, *_ = await pipeline.execute()
+        return entry_id
 
     async def streams_xread(self, key: str, offset: str, block=None, count: int = None) -> list:
         """Read data from stream."""
         return await self.__instance.xread(streams={key: offset}, block=block, count=count)
 
+    async def streams_xrange(
+        self, key: str, min_id: str = '-', max_id: str = '+', count: int | None = None, reverse: bool = False
+    ) -> list:
+        """Read data from stream between entry IDs, starting from the last entry when reversed."""
+        if reverse:
+            return await self.__instance.xrevrange(name=key, max=max_id, min=min_id, count=count)
+        return await self.__instance.xrange(name=key, min=min_id, max=max_id, count=count)
+
     async def streams_scan(self, cursor: int = 0, pattern: str = None, count: int = None):
         """Search Redis for streams.
 
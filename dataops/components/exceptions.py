@@ -117,6 +117,22 @@ class AlreadyExists(ServiceException):
         return 'Target resource already exists'
 
 
+class Conflict(ServiceException):
+    """Raised when target resource is not in the expected state."""
+
+    @property
+    def status(self) -> int:
+        return CONFLICT
+
+    @property
+    def code(self) -> str:
+        return 'conflict'
+
+    @property
+    def details(self) -> str:
+        return 'Target resource is not in the expected state'
+
+
 class InvalidInput(ServiceException):
     """Raised when target resource is invalid."""
 
@@ -4,63 +4,234 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+from collections.abc import Awaitable
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+from contextlib import nullcontext
+from contextlib import suppress
+from time import monotonic
+from time import perf_counter
+from time import time
+from uuid import uuid4
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+from redis.exceptions import ResponseError
+
 from dataops.components.cache import Cache
+from dataops.components.resource_lock.listener import ResourceLockReleaseListener
+from dataops.components.resource_lock.metrics import ResourceLockMetrics
 from dataops.components.resource_lock.schemas import ResourceLockBulkResponseSchema
+from dataops.components.resource_lock.schemas import ResourceLockInventoryItemSchema
+from dataops.components.resource_lock.schemas import ResourceLockInventorySchema
 from dataops.components.resource_lock.schemas import ResourceLockResponseSchema
+from dataops.components.resource_lock.scripts import HOLDERS_KEY_PREFIX
+from dataops.components.resource_lock.scripts import INDEX_KEY
+from dataops.components.resource_lock.scripts import RECURSIVE_TICKET_SUFFIX
+from dataops.components.resource_lock.scripts import ResourceLockScripts
 from dataops.logger import logger
 
 
 class ResourceLockerCache(Cache):
-    """Manages resource operation locking and unlocking and their respective lock statuses."""
+    """Manages resource operation locking and unlocking and their respective lock statuses.
 
-    def str_to_int_list(self, input_: bytes) -> list[int]:
-        """Return decoded strings as a list of integers."""
-        return [int(x) for x in input_.decode('utf-8').split(',')]
+    Every lock is a lease owned by a token, which is returned when the lock is created. The lease expires after
+    ``lease_ttl`` seconds unless it is renewed by the owner, so locks of crashed workers are eventually released.
 
-    def int_list_to_str(self, input_: list[int]) -> str:
-        """Return joined list as a string with delimiter."""
-        return ','.join([str(x) for x in input_])
+    The lock state is kept in a hash with read/write counts. Enable ``legacy_state`` to keep writing it in the
+    "<read_count>,<write_count>" string format while older instances are still running.
 
-    async def perform_bulk_lock(self, keys: list[str], operation: str) -> ResourceLockBulkResponseSchema:
-        """Perform bulk lock for multiple keys.
+    Lock requests with a wait timeout are queued on the keys and retried whenever the ``listener`` reports a released
+    lock, or every ``wait_poll_interval`` seconds when no release was noticed.
+
+    Latencies, hold durations, rejections and hot keys are recorded into ``metrics``.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        lease_ttl: int = 86400,
+        require_token: bool = False,
+        legacy_state: bool = False,
+        listener: ResourceLockReleaseListener | None = None,
+        wait_poll_interval: float = 1.0,
+        metrics: ResourceLockMetrics | None = None,
+    ) -> None:
+        super().__init__(redis)
+        self.scripts = ResourceLockScripts(redis, legacy_state)
+        self.lease_ttl = lease_ttl
+        self.require_token = require_token
+        self.listener = listener
+        self.wait_poll_interval = wait_poll_interval
+        self.metrics = metrics or ResourceLockMetrics()
+
+    async def load_scripts(self) -> None:
+        """Preload lock scripts into Redis, so the first lock requests don't have to."""
+
+        try:
+            await self.scripts.load()
+        except RedisError:
+            logger.warning('Unable to preload resource lock scripts, they will be loaded on first use')
+
+    def generate_token(self) -> str:
+        """Return a new unique owner token."""
+
+        return uuid4().hex
+
+    def get_lease_ms(self, ttl: int | None) -> int:
+        """Return lease duration in milliseconds falling back to the default lease ttl."""
+
+        return (ttl or self.lease_ttl) * 1000
+
+    @staticmethod
+    def normalize_key(key: str) -> str:
+        """Return the key without trailing slashes, so a folder is locked under the same key however it is written."""
+
+        return key.rstrip('/') or key
 
-        If one of the lock attempts fails, the locking attempts of the following keys are stopped.
+    def is_token_missing(self, token: str | None) -> bool:
+        """Return true if the token is required for unlocking, but it wasn't provided."""
+
+        if self.require_token and not token:
+            logger.info('Unable to remove lock without an owner token')
+            return True
+
+        return False
+
+    def watch(self, keys: list[str]) -> AbstractAsyncContextManager[asyncio.Event]:
+        """Return context manager yielding an event which is set when a lock for one of the keys is released."""
+
+        if self.listener is None:
+            return nullcontext(asyncio.Event())
+
+        return self.listener.watch(keys)
+
+    async def wait_for_lock(
+        self,
+        keys: list[str],
+        operation: str,
+        token: str,
+        wait_timeout: float | None,
+        attempt: Callable[[str], Awaitable[bool]],
+        recursive: bool = False,
+    ) -> bool:
+        """Repeat the lock attempt until it succeeds or the wait timeout is reached.
+
+        Without the wait timeout the lock is attempted once. Otherwise, the request is queued on the keys with a ticket,
+        so waiting requests are granted in the order they arrived, and the ticket is removed once the request gives up.
+        Tickets of recursive requests are marked, so they also hold back conflicting requests for keys under them.
         """
 
-        keys = sorted(keys)
-        status = []
-        have_failed_lock = False
+        if not wait_timeout:
+            return await attempt('')
 
-        for key in keys:
-            if have_failed_lock:
-                status.append((key, False))
-                continue
+        deadline = monotonic() + wait_timeout
+        ticket = f'{operation}|{int((time() + wait_timeout) * 1000)}|{token}'
+        if recursive:
+            ticket += RECURSIVE_TICKET_SUFFIX
+        is_successful = False
 
-            is_successful = await self.perform_rw_lock(key, operation)
-            status.append((key, is_successful.status))
+        try:
+            async with self.watch(keys) as released:
+                while True:
+                    released.clear()
+                    is_successful = await attempt(ticket)
+                    remaining = deadline - monotonic()
+                    if is_successful or remaining <= 0:
+                        return is_successful
 
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(released.wait(), min(remaining, self.wait_poll_interval))
+        finally:
             if not is_successful:
-                have_failed_lock = True
+                await self.scripts.dequeue(keys=keys, args=[ticket])
 
-        return ResourceLockBulkResponseSchema(keys_status=status)
+    async def perform_bulk_lock(
+        self,
+        keys: list[str],
+        operation: str,
+        ttl: int | None = None,
+        wait_timeout: float | None = None,
+        recursive: bool = False,
+    ) -> ResourceLockBulkResponseSchema:
+        """Perform bulk lock for multiple keys.
 
-    async def perform_bulk_unlock(self, keys: list[str], operation: str) -> ResourceLockBulkResponseSchema:
-        """Perform bulk unlock for multiple keys."""
+        All keys are checked and locked atomically in a single script call. If one of the keys cannot be locked, none
+        of the keys are locked. All acquired locks share the same owner token. With the wait timeout the request waits
+        until all keys can be locked together. With recursive flag the whole subtree under each key is locked.
+        """
 
-        keys = sorted(keys)
-        status = []
+        keys = sorted({self.normalize_key(key) for key in keys})
+        token = self.generate_token()
+        lease_ms = self.get_lease_ms(ttl)
+        blocking_index = 0
 
-        for key in keys:
-            is_successful = await self.perform_rw_unlock(key, operation)
-            status.append((key, is_successful.status))
+        async def attempt(ticket: str) -> bool:
+            nonlocal blocking_index
+            blocking_index = await self.scripts.bulk_lock(
+                keys=keys, args=[operation, token, lease_ms, ticket, int(recursive)]
+            )
+            return not blocking_index
 
-        return ResourceLockBulkResponseSchema(keys_status=status)
+        started_at = perf_counter()
+        is_successful = await self.wait_for_lock(keys, operation, token, wait_timeout, attempt, recursive)
+        self.metrics.record_acquire(keys, operation, perf_counter() - started_at, is_successful)
+        if not is_successful:
+            logger.info(f'Unable to add {operation} lock to {len(keys)} keys, blocked by {keys[blocking_index - 1]}')
+            return ResourceLockBulkResponseSchema(keys_status=[(key, False) for key in keys])
 
-    async def perform_rw_lock(self, key: str, operation: str) -> ResourceLockResponseSchema:
+        logger.info(f'Add {operation} lock to {len(keys)} keys')
+
+        return ResourceLockBulkResponseSchema(keys_status=[(key, True) for key in keys], token=token)
+
+    async def perform_bulk_unlock(
+        self, keys: list[str], operation: str, token: str | None = None
+    ) -> ResourceLockBulkResponseSchema:
+        """Perform bulk unlock for multiple keys.
+
+        Each key is unlocked independently, so failing to unlock one of the keys does not stop unlocking the others.
+        """
+
+        keys = sorted({self.normalize_key(key) for key in keys})
+        if self.is_token_missing(token):
+            return ResourceLockBulkResponseSchema(keys_status=[(key, False) for key in keys])
+
+        started_at = perf_counter()
+        results = await self.scripts.bulk_unlock(keys=keys, args=[operation, token or ''])
+        self.metrics.record_release(
+            operation, perf_counter() - started_at, [held_ms / 1000 for _, held_ms in results if held_ms >= 0]
+        )
+
+        statuses = [bool(is_successful) for is_successful, _ in results]
+        logger.info(f'Remove {operation} lock from {sum(statuses)} of {len(keys)} keys')
+
+        return ResourceLockBulkResponseSchema(keys_status=list(zip(keys, statuses)))
+
+    async def perform_bulk_renew(
+        self, keys: list[str], token: str, ttl: int | None = None
+    ) -> ResourceLockBulkResponseSchema:
+        """Extend leases of locks owned by the token for multiple keys."""
+
+        keys = sorted({self.normalize_key(key) for key in keys})
+
+        statuses = await self.scripts.renew(keys=keys, args=[token, self.get_lease_ms(ttl)])
+        logger.info(f'Renew lock lease for {sum(statuses)} of {len(keys)} keys')
+
+        return ResourceLockBulkResponseSchema(keys_status=list(zip(keys, map(bool, statuses))), token=token)
+
+    async def perform_rw_lock(
+        self,
+        key: str,
+        operation: str,
+        ttl: int | None = None,
+        wait_timeout: float | None = None,
+        recursive: bool = False,
+    ) -> ResourceLockResponseSchema:
         """
         Description:
             An async function will do the read/write lock on the key.
-            Inside Redis, the entry will be key:"<read_count>, <write_count>"(no bracket)
+            Inside Redis, the entry will be a hash key:{r: <read_count>, w: <write_count>}
             read_count will be >=0, while write_count CAN ONLY be 0 or 1.
             ----
             The read count will increase one, if there is a new read operation
@@ -71,97 +242,238 @@ class ResourceLockerCache(Cache):
             The write will increase one, if there a write operation(eg.delete). And
             any other operation will be blocked.
             ---
-            Therefore, the value pairs will be (N, 0), (0, 1). Also to avoid the racing
-            condition, the await keyword will be used for the function.
+            Therefore, the count pairs will be (N, 0), (0, 1). To avoid the racing
+            condition, the check and the update are done by a single Lua script
+            which Redis executes atomically in one round trip.
+            ---
+            Each lock is a lease identified by a new owner token. Once the lease
+            expires the lock is released and the counts are decreased.
+            ---
+            With the wait timeout the request waits in a queue until the lock
+            is granted. A lock is never granted while a conflicting request is
+            queued ahead, so writers are not starved by readers.
+            ---
+            Keys are paths, so a recursive lock covers the whole subtree under
+            the key. A recursive write lock conflicts with any lock under the
+            key and any lock conflicts with a recursive write lock above it.
         Parameters:
             - key: the object path in minio (eg. <bucket>/file.py)
             - operation: either read or write
+            - ttl: lease duration in seconds, defaults to the configured lease ttl
+            - wait_timeout: seconds to wait for the lock, fails immediately if not set
+            - recursive: lock the whole subtree under the key
         Return:
-            - True: the lock operation is success
+            - True: the lock operation is success, the owner token is included
             - False: the other operation blocks the current one
         """
-        if await self.is_exist(key):
-            rw_str = await self.get(key)
-            # index 0 is read_count, index 1 is write_count
-            read_count, write_count = tuple(self.str_to_int_list(rw_str))
-            logger.info(f'Found key:{key}, with r/w {read_count}/{write_count}')
+        key = self.normalize_key(key)
+        token = self.generate_token()
+        lease_ms = self.get_lease_ms(ttl)
 
-            # read_count > 0 -> block write
-            if read_count > 0 and operation == 'write':
-                return ResourceLockResponseSchema(key=key)
-            # write_count > 0 -> block all
-            elif write_count > 0:
-                return ResourceLockResponseSchema(key=key)
-
-        # TODO might refactor here later
-        if operation == 'read':
-            # check if the key exist, if not exist then create pair with (1,0)
-            # else increase the read count(index 0) by one
-            if await self.is_exist(key):
-                rw_str = await self.get(key)
-                read_count, write_count = tuple(self.str_to_int_list(rw_str))
-                await self.set(key, self.int_list_to_str([read_count + 1, write_count]))
-            else:
-                await self.set(key, '1,0')
+        async def attempt(ticket: str) -> bool:
+            is_successful, read_count, write_count = await self.scripts.lock(
+                keys=[key], args=[operation, token, lease_ms, ticket, int(recursive)]
+            )
+            logger.info(f'Found key:{key}, with r/w {read_count}/{write_count}')
+            return bool(is_successful)
 
-        else:
-            await self.set(key, '0,1')
+        started_at = perf_counter()
+        is_successful = await self.wait_for_lock([key], operation, token, wait_timeout, attempt, recursive)
+        self.metrics.record_acquire([key], operation, perf_counter() - started_at, is_successful)
+        if not is_successful:
+            return ResourceLockResponseSchema(key=key)
 
         logger.info(f'Add {operation} lock to {key}')
 
-        return ResourceLockResponseSchema(key=key, status=True)
+        return ResourceLockResponseSchema(key=key, status=True, token=token)
 
-    async def perform_rw_unlock(self, key: str, operation: str) -> ResourceLockResponseSchema:
+    async def perform_rw_unlock(self, key: str, operation: str, token: str | None = None) -> ResourceLockResponseSchema:
         """
         Description:
             An async function to reduce the read_write count based on key.
             ---
-            Read count can be "N,0", so each operation will do N-1. if count is
-            "1,0" then function will remove the entry for cleanup
+            Read count can be N with write count 0, so each operation will do N-1.
+            if read count is 1 then function will remove the entry for cleanup
+            ---
+            Write count can only be 1 with read count 0, so function will just
+            remove it. BUT to check the validation, the read count must be 0.
+            Otherwise, we might remove the read count by accident.
             ---
-            Write count can only be "0,1", so function will just remove it. BUT
-            to check the validation, the pair must be "0,1". Otherwise, we might
-            remove the read count by accident.
+            When the owner token is provided, only the lock owned by the token
+            is released. Without the token any lock of the operation is released,
+            unless tokens are required.
             ---
-            Also to avoid the racing issue, we use the awwait
+            Also to avoid the racing issue, the whole operation is done by a
+            single Lua script which Redis executes atomically.
         Parameters:
             - key: the object path in minio (eg. <bucket>/file.py)
             - operation: either read or write
+            - token: owner token returned when the lock was created
         Return:
             - True: the lock operation is success
             - False: the other operation blocks the current one
         """
-        # we cannot unlock the IDLE file
-        if not await self.is_exist(key):
+        key = self.normalize_key(key)
+        if self.is_token_missing(token):
             return ResourceLockResponseSchema(key=key)
 
-        # TODO: might need some check here
-        # delete cannot just remove the entry
-        rw_str = await self.get(key)
-        read_count, write_count = tuple(self.str_to_int_list(rw_str))
-        logger.info(f'Found key:{key}, with r/w {read_count}/{write_count}')
-        if operation == 'read':
-            # if the current read operation is the last one
-            # then we just remove the entry for cleanup
-            if read_count > 1:
-                await self.set(key, self.int_list_to_str([read_count - 1, write_count]))
-            else:
-                await self.delete(key)
+        started_at = perf_counter()
+        is_successful, read_count, write_count, held_ms = await self.scripts.unlock(
+            keys=[key], args=[operation, token or '']
+        )
+        self.metrics.record_release(operation, perf_counter() - started_at, [held_ms / 1000] if held_ms >= 0 else [])
 
-        else:
-            # corner case if there are some read operation ongoing(readcount>0)
-            # we should block the delete on the key
-            if read_count > 0:
-                return ResourceLockResponseSchema(key=key)
-            else:
-                await self.delete(key)
+        # we cannot unlock the IDLE file or the lock of another owner
+        if not is_successful:
+            return ResourceLockResponseSchema(key=key)
 
+        logger.info(f'Found key:{key}, with r/w {read_count}/{write_count}')
         logger.info(f'Remove {operation} lock to {key}')
 
         return ResourceLockResponseSchema(key=key, status=True)
 
+    async def perform_bulk_convert(self, keys: list[str], operation: str, token: str) -> ResourceLockBulkResponseSchema:
+        """Convert locks owned by the token for multiple keys to the operation atomically.
+
+        Converting to write upgrades read locks, which succeeds only when the owner is the sole reader. Converting to
+        read downgrades write locks. Either all locks are converted or none of them.
+        """
+
+        keys = sorted({self.normalize_key(key) for key in keys})
+
+        blocking_index = await self.scripts.convert(keys=keys, args=[operation, token])
+        if blocking_index:
+            logger.info(f'Unable to convert {len(keys)} locks to {operation}, blocked by {keys[blocking_index - 1]}')
+            return ResourceLockBulkResponseSchema(keys_status=[(key, False) for key in keys])
+
+        logger.info(f'Convert {len(keys)} locks to {operation}')
+
+        return ResourceLockBulkResponseSchema(keys_status=[(key, True) for key in keys], token=token)
+
+    async def perform_rw_convert(self, key: str, operation: str, token: str) -> ResourceLockResponseSchema:
+        """Upgrade read lock owned by the token to write lock or downgrade write lock to read lock atomically."""
+
+        key = self.normalize_key(key)
+        response = await self.perform_bulk_convert([key], operation, token)
+        if not response.is_successful():
+            return ResourceLockResponseSchema(key=key)
+
+        return ResourceLockResponseSchema(key=key, status=True, token=token)
+
+    async def perform_rw_renew(self, key: str, token: str, ttl: int | None = None) -> ResourceLockResponseSchema:
+        """Extend lease of the lock owned by the token."""
+
+        key = self.normalize_key(key)
+        statuses = await self.scripts.renew(keys=[key], args=[token, self.get_lease_ms(ttl)])
+        if not statuses[0]:
+            logger.info(f'Unable to renew lock lease for {key}')
+            return ResourceLockResponseSchema(key=key)
+
+        logger.info(f'Renew lock lease for {key}')
+
+        return ResourceLockResponseSchema(key=key, status=True, token=token)
+
+    def get_status_response(
+        self, key: str, read_count: int, write_count: int, acquired_at: int | None
+    ) -> ResourceLockResponseSchema:
+        """Return lock status response for the respective counts."""
+
+        if not read_count and not write_count:
+            return ResourceLockResponseSchema(key=key, status=None)
+
+        return ResourceLockResponseSchema(
+            key=key,
+            status=f'{read_count},{write_count}',
+            read_count=read_count,
+            write_count=write_count,
+            acquired_at=acquired_at,
+        )
+
     async def check_lock_status(self, key: str) -> ResourceLockResponseSchema:
-        """Returns respective key lock status."""
-        value = await self.get(key)
-        status_decode = value.decode() if value else None
-        return ResourceLockResponseSchema(key=key, status=status_decode)
+        """Returns respective key lock status with reader and writer counts."""
+        key = self.normalize_key(key)
+        read_count, write_count, acquired_at = await self.scripts.status(keys=[key])
+        return self.get_status_response(key, read_count, write_count, acquired_at)
+
+    async def check_bulk_lock_status(self, keys: list[str]) -> list[ResourceLockResponseSchema]:
+        """Returns lock statuses for multiple keys ordered as the keys."""
+
+        return await self.get_lock_statuses([self.normalize_key(key) for key in keys])
+
+    async def get_lock_statuses(self, keys: list[str]) -> list[ResourceLockResponseSchema]:
+        """Returns lock statuses for the stored keys reading all of them in a single pipelined round trip.
+
+        Counts of holders with expired leases are excluded without modifying the state. Keys still stored in the legacy
+        string format are checked one by one.
+        """
+
+        now = int(time() * 1000)
+        pipeline = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hmget(key, 'r', 'w', 'acquired_at')
+            pipeline.zcount(f'{HOLDERS_KEY_PREFIX}{key}', '-inf', now)
+        results = await pipeline.execute(raise_on_error=False)
+
+        statuses = []
+        for key, values, expired_count in zip(keys, results[::2], results[1::2]):
+            if isinstance(values, ResponseError):
+                read_count, write_count, acquired_at = await self.scripts.status(keys=[key])
+                statuses.append(self.get_status_response(key, read_count, write_count, acquired_at))
+                continue
+
+            read_count, write_count, acquired_at = (int(value) if value is not None else 0 for value in values)
+            if write_count and expired_count:
+                write_count = 0
+            else:
+                read_count = max(read_count - expired_count, 0)
+            statuses.append(self.get_status_response(key, read_count, write_count, acquired_at or None))
+
+        return statuses
+
+    async def check_prefix_lock_status(
+        self, prefix: str, cursor: str | None = None, limit: int = 100
+    ) -> tuple[list[ResourceLockResponseSchema], str | None]:
+        """Returns statuses of locked keys starting with the prefix and the cursor for the next page.
+
+        Keys are listed from the lexicographical index of locked keys after the cursor key. Keys found unlocked are
+        removed from the index by the reap script, which checks the state again, so keys locked in the meantime stay.
+        """
+
+        start = b'(' + cursor.encode() if cursor else b'[' + prefix.encode()
+        keys = [
+            key.decode()
+            for key in await self.redis.zrangebylex(INDEX_KEY, start, b'[' + prefix.encode() + b'\xff', 0, limit)
+        ]
+
+        statuses = await self.get_lock_statuses(keys)
+        expired_keys = [status.key for status in statuses if not status.status]
+        if expired_keys:
+            await self.scripts.reap(keys=expired_keys, args=[0])
+
+        next_cursor = keys[-1] if len(keys) == limit else None
+
+        return [status for status in statuses if status.status], next_cursor
+
+    async def list_locks(
+        self, prefix: str = '', cursor: str | None = None, limit: int = 100
+    ) -> ResourceLockInventorySchema:
+        """Returns page of existing locks under the prefix with their counts and age.
+
+        Keys are listed from the lexicographical index of locked keys, so no keyspace scan is needed.
+        """
+
+        statuses, next_cursor = await self.check_prefix_lock_status(prefix, cursor, limit)
+
+        now = time()
+        locks = [
+            ResourceLockInventoryItemSchema(
+                key=status.key,
+                read_count=status.read_count,
+                write_count=status.write_count,
+                acquired_at=status.acquired_at,
+                age=now - status.acquired_at / 1000 if status.acquired_at else None,
+            )
+            for status in statuses
+        ]
+
+        return ResourceLockInventorySchema(locks=locks, next_cursor=next_cursor)
@@ -4,16 +4,65 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+
 from aioredis.client import Redis
 from fastapi import Depends
 
 from dataops.components.resource_lock.cache import ResourceLockerCache
+from dataops.components.resource_lock.listener import ResourceLockReleaseListener
+from dataops.components.resource_lock.metrics import ResourceLockMetrics
+from dataops.components.resource_lock.metrics import resource_lock_metrics
+from dataops.config import Settings
+from dataops.config import get_settings
 from dataops.dependencies import get_redis
 
 
+class GetResourceLockReleaseListener:
+    """Class to create a single release listener instance per Redis connection."""
+
+    def __init__(self) -> None:
+        self.instance = None
+        self.lock = asyncio.Lock()
+
+    async def __call__(self, redis: Redis = Depends(get_redis)) -> ResourceLockReleaseListener:
+        """Return an instance of ResourceLockReleaseListener class."""
+
+        async with self.lock:
+            if not self.instance or self.instance.redis is not redis:
+                self.instance = ResourceLockReleaseListener(redis)
+            return self.instance
+
+    async def stop(self) -> None:
+        """Stop listening for released locks by the created instance, which closes its subscription."""
+
+        async with self.lock:
+            if self.instance is not None:
+                await self.instance.stop()
+
+
+get_resource_lock_release_listener = GetResourceLockReleaseListener()
+
+
+def get_resource_lock_metrics() -> ResourceLockMetrics:
+    """Return resource lock metrics of the process as a dependency."""
+    return resource_lock_metrics
+
+
 def get_resource_lock_cache(
     redis: Redis = Depends(get_redis),
+    listener: ResourceLockReleaseListener = Depends(get_resource_lock_release_listener),
+    metrics: ResourceLockMetrics = Depends(get_resource_lock_metrics),
+    settings: Settings = Depends(get_settings),
 ) -> ResourceLockerCache:
     """Return resource locker as a dependency."""
-    resource_locker = ResourceLockerCache(redis)
+    resource_locker = ResourceLockerCache(
+        redis,
+        lease_ttl=settings.RESOURCE_LOCK_LEASE_TTL,
+        require_token=settings.RESOURCE_LOCK_REQUIRE_TOKEN,
+        legacy_state=settings.RESOURCE_LOCK_LEGACY_STATE,
+        listener=listener,
+        wait_poll_interval=settings.RESOURCE_LOCK_WAIT_POLL_INTERVAL,
+        metrics=metrics,
+    )
     return resource_locker
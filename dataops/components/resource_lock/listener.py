@@ -0,0 +1,96 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from redis.asyncio.client import PubSub
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from dataops.components.resource_lock.scripts import RELEASED_CHANNEL
+from dataops.logger import logger
+
+
+class ResourceLockReleaseListener:
+    """Wakes up requests waiting for resource locks when a lock is released.
+
+    A single pub/sub subscription is shared by all waiting requests of the process. The subscription is opened with the
+    first waiting request and reopened after a failure, so waiters only have to fall back to polling while Redis is not
+    reachable.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+        self.waiters: defaultdict[str, set[asyncio.Event]] = defaultdict(set)
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start listening for released locks unless it is already running."""
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        """Stop listening for released locks."""
+
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def listen(self) -> None:
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(RELEASED_CHANNEL)
+            async for message in pubsub.listen():
+                self.notify(message['data'].decode())
+        except RedisError:
+            logger.exception('Unable to listen for released resource locks')
+        finally:
+            await self.close(pubsub)
+
+    async def close(self, pubsub: PubSub) -> None:
+        """Unsubscribe from released locks and release the pub/sub connection."""
+
+        try:
+            if pubsub.subscribed:
+                await pubsub.unsubscribe(RELEASED_CHANNEL)
+        except RedisError:
+            logger.warning('Unable to unsubscribe from released resource locks')
+        finally:
+            await pubsub.reset()
+
+    def notify(self, key: str) -> None:
+        """Wake up all requests waiting for the key, its ancestors or any key under it.
+
+        Locks of ancestors and descendants can block the waiting requests as well, since keys are hierarchical.
+        """
+
+        prefix = f'{key}/'
+        for waiting_key, events in self.waiters.items():
+            if waiting_key == key or waiting_key.startswith(prefix) or key.startswith(f'{waiting_key}/'):
+                for event in events:
+                    event.set()
+
+    @asynccontextmanager
+    async def watch(self, keys: list[str]) -> AsyncIterator[asyncio.Event]:
+        """Yield an event which is set every time a lock for one of the keys is released."""
+
+        event = asyncio.Event()
+        for key in keys:
+            self.waiters[key].add(event)
+        self.start()
+
+        try:
+            yield event
+        finally:
+            for key in keys:
+                self.waiters[key].discard(event)
+                if not self.waiters[key]:
+                    del self.waiters[key]
@@ -0,0 +1,141 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+from bisect import bisect_left
+from collections import Counter
+from collections import defaultdict
+from heapq import heapify
+from heapq import heappop
+from heapq import heappush
+from heapq import nlargest
+
+from dataops.components.resource_lock.schemas import ResourceLockHistogramSchema
+from dataops.components.resource_lock.schemas import ResourceLockHotKeySchema
+from dataops.components.resource_lock.schemas import ResourceLockMetricsSchema
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HOLD_DURATION_BUCKETS = (0.1, 1.0, 10.0, 60.0, 300.0, 900.0, 3600.0, 14400.0, 86400.0)
+
+
+class Histogram:
+    """Counts observed values in buckets with fixed upper bounds."""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_schema(self) -> ResourceLockHistogramSchema:
+        """Return histogram with cumulative bucket counts."""
+
+        cumulative_count = 0
+        buckets = {}
+        for bound, count in zip((*map(str, self.buckets), '+Inf'), self.counts):
+            cumulative_count += count
+            buckets[bound] = cumulative_count
+
+        return ResourceLockHistogramSchema(buckets=buckets, count=self.count, sum=self.sum)
+
+
+class HotKeys:
+    """Space-saving sketch tracking the most frequent keys in a fixed amount of memory.
+
+    At most ``capacity`` keys are tracked. A new key replaces the least frequent one and inherits its count, which is
+    kept as the maximum overestimation error of the new key. The least frequent key is found with a heap which may
+    contain outdated counts, those are skipped when popped and dropped when the heap is rebuilt.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self.heap: list[tuple[int, str]] = []
+
+    def add(self, key: str) -> None:
+        if key not in self.counts:
+            error = 0
+            if len(self.counts) >= self.capacity:
+                error = self.evict()
+            self.counts[key] = error
+            self.errors[key] = error
+
+        self.counts[key] += 1
+        heappush(self.heap, (self.counts[key], key))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, key) for key, count in self.counts.items()]
+            heapify(self.heap)
+
+    def evict(self) -> int:
+        """Remove the least frequent key and return its count."""
+
+        while True:
+            count, key = heappop(self.heap)
+            if self.counts.get(key) == count:
+                del self.counts[key]
+                del self.errors[key]
+                return count
+
+    def top(self, number: int) -> list[ResourceLockHotKeySchema]:
+        """Return the most frequent keys in descending order."""
+
+        keys = nlargest(number, self.counts, key=self.counts.__getitem__)
+
+        return [ResourceLockHotKeySchema(key=key, count=self.counts[key], error=self.errors[key]) for key in keys]
+
+
+class ResourceLockMetrics:
+    """Collects resource lock contention and latency metrics of the process."""
+
+    def __init__(self, hot_keys_capacity: int = 1000) -> None:
+        self.acquire_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.release_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.hold_duration = defaultdict(lambda: Histogram(HOLD_DURATION_BUCKETS))
+        self.acquisitions = Counter()
+        self.rejections = Counter()
+        self.hot_keys = HotKeys(hot_keys_capacity)
+        self.contended_keys = HotKeys(hot_keys_capacity)
+
+    def record_acquire(self, keys: list[str], operation: str, duration: float, is_successful: bool) -> None:
+        """Record lock attempt for the keys."""
+
+        self.acquire_latency[operation].observe(duration)
+        for key in keys:
+            self.hot_keys.add(key)
+
+        if is_successful:
+            self.acquisitions[operation] += 1
+            return
+
+        self.rejections[operation] += 1
+        for key in keys:
+            self.contended_keys.add(key)
+
+    def record_release(self, operation: str, duration: float, hold_durations: list[float]) -> None:
+        """Record unlock and how long the released keys were locked."""
+
+        self.release_latency[operation].observe(duration)
+        for hold_duration in hold_durations:
+            self.hold_duration[operation].observe(hold_duration)
+
+    def to_schema(self, top: int = 20) -> ResourceLockMetricsSchema:
+        return ResourceLockMetricsSchema(
+            acquire_latency={operation: histogram.to_schema() for operation, histogram in self.acquire_latency.items()},
+            release_latency={operation: histogram.to_schema() for operation, histogram in self.release_latency.items()},
+            hold_duration={operation: histogram.to_schema() for operation, histogram in self.hold_duration.items()},
+            acquisitions=self.acquisitions,
+            rejections=self.rejections,
+            hot_keys=self.hot_keys.top(top),
+            contended_keys=self.contended_keys.top(top),
+        )
+
+
+resource_lock_metrics = ResourceLockMetrics()
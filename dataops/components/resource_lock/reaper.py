@@ -0,0 +1,80 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+from uuid import uuid4
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from dataops.components.resource_lock.cache import ResourceLockerCache
+from dataops.components.resource_lock.scripts import INDEX_KEY
+from dataops.components.resource_lock.scripts import REAPER_KEY
+from dataops.logger import logger
+
+
+class ResourceLockReaper:
+    """Periodically removes orphaned resource locks.
+
+    Every pass goes through all locked keys removing expired leases of owners who stopped heartbeating and, when
+    ``max_age`` is set, releasing leases which were not renewed for more than ``max_age`` seconds. Keys are processed
+    in batches of ``batch_size`` with ``batch_pause`` seconds between them, so the reaper never competes with live
+    traffic. A pass is started at most once per ``interval`` seconds across all instances sharing the Redis.
+    """
+
+    def __init__(
+        self,
+        resource_locker: ResourceLockerCache,
+        interval: int = 300,
+        max_age: int = 0,
+        batch_size: int = 100,
+        batch_pause: float = 0.1,
+    ) -> None:
+        self.resource_locker = resource_locker
+        self.interval = interval
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.reaper_id = uuid4().hex
+
+    @property
+    def redis(self) -> Redis:
+        return self.resource_locker.redis
+
+    async def run(self) -> None:
+        """Reap orphaned locks until cancelled."""
+
+        while True:
+            try:
+                removed_count = await self.reap()
+                if removed_count:
+                    logger.info(f'Removed {removed_count} orphaned resource locks')
+            except RedisError:
+                logger.exception('Unable to reap orphaned resource locks')
+            await asyncio.sleep(self.interval)
+
+    async def reap(self) -> int:
+        """Perform a single pass if no other instance performed one during the interval.
+
+        Returns the number of keys which are not locked anymore.
+        """
+
+        interval_ms = self.interval * 1000
+        if not await self.redis.set(REAPER_KEY, self.reaper_id, nx=True, px=interval_ms):
+            return 0
+
+        removed_count = 0
+        start = b'-'
+        while True:
+            keys = await self.redis.zrangebylex(INDEX_KEY, start, b'+', 0, self.batch_size)
+            if not keys:
+                return removed_count
+
+            removed_count += await self.resource_locker.scripts.reap(keys=keys, args=[self.max_age * 1000])
+            start = b'(' + keys[-1]
+
+            await self.redis.set(REAPER_KEY, self.reaper_id, xx=True, px=interval_ms)
+            await asyncio.sleep(self.batch_pause)
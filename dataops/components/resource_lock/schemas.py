@@ -8,6 +8,9 @@ from enum import Enum
 from enum import unique
 
 from pydantic import BaseModel
+from pydantic import confloat
+from pydantic import conint
+from pydantic import root_validator
 
 
 @unique
@@ -26,6 +29,9 @@ class ResourceLockCreateSchema(BaseModel):
 
     resource_key: str
     operation: ResourceLockOperationSchema
+    ttl: conint(gt=0) | None = None
+    wait_timeout: confloat(gt=0, le=600) | None = None
+    recursive: bool = False
 
 
 class ResourceLockBulkCreateSchema(BaseModel):
@@ -33,6 +39,71 @@ class ResourceLockBulkCreateSchema(BaseModel):
 
     resource_keys: list[str]
     operation: ResourceLockOperationSchema
+    ttl: conint(gt=0) | None = None
+    wait_timeout: confloat(gt=0, le=600) | None = None
+    recursive: bool = False
+
+
+class ResourceLockDeleteSchema(BaseModel):
+    """Schema for removing resource lock by key, operation and owner token."""
+
+    resource_key: str
+    operation: ResourceLockOperationSchema
+    token: str | None = None
+
+
+class ResourceLockBulkDeleteSchema(BaseModel):
+    """Schema for bulk removing resource lock by keys, operation and owner token."""
+
+    resource_keys: list[str]
+    operation: ResourceLockOperationSchema
+    token: str | None = None
+
+
+class ResourceLockConvertSchema(BaseModel):
+    """Schema for upgrading or downgrading resource lock by key and owner token."""
+
+    resource_key: str
+    token: str
+
+
+class ResourceLockBulkConvertSchema(BaseModel):
+    """Schema for bulk upgrading or downgrading resource locks by keys and owner token."""
+
+    resource_keys: list[str]
+    token: str
+
+
+class ResourceLockRenewSchema(BaseModel):
+    """Schema for renewing resource lock lease by key and owner token."""
+
+    resource_key: str
+    token: str
+    ttl: conint(gt=0) | None = None
+
+
+class ResourceLockBulkRenewSchema(BaseModel):
+    """Schema for bulk renewing resource lock leases by keys and owner token."""
+
+    resource_keys: list[str]
+    token: str
+    ttl: conint(gt=0) | None = None
+
+
+class ResourceLockBulkStatusSchema(BaseModel):
+    """Schema for retrieving lock statuses by keys or by key prefix."""
+
+    resource_keys: list[str] | None = None
+    prefix: str | None = None
+    cursor: str | None = None
+    limit: conint(gt=0, le=1000) = 100
+
+    @root_validator(skip_on_failure=True)
+    def keys_or_prefix_valid(cls, values):
+        """Validates that either keys or prefix is provided."""
+        if (values['resource_keys'] is None) == (values['prefix'] is None):
+            raise ValueError('Either resource_keys or prefix must be provided')
+        return values
 
 
 class ResourceLockResponseSchema(BaseModel):
@@ -40,14 +111,74 @@ class ResourceLockResponseSchema(BaseModel):
 
     key: str
     status: str | None = False
+    token: str | None = None
+    read_count: int = 0
+    write_count: int = 0
+    acquired_at: int | None = None
 
 
 class ResourceLockBulkResponseSchema(BaseModel):
     """Schema for status of operation locking for multiple keys."""
 
     keys_status: list[tuple[str, bool]]
+    token: str | None = None
 
     def is_successful(self) -> bool:
         """Return true if all statuses are true."""
 
         return all(status for _, status in self.keys_status)
+
+
+class ResourceLockBulkStatusResponseSchema(BaseModel):
+    """Schema for lock statuses of multiple keys in response."""
+
+    locks: list[ResourceLockResponseSchema]
+    next_cursor: str | None = None
+
+
+class ResourceLockInventoryItemSchema(BaseModel):
+    """Schema for existing lock with its counts and age in seconds."""
+
+    key: str
+    read_count: int
+    write_count: int
+    acquired_at: int | None = None
+    age: float | None = None
+
+
+class ResourceLockInventorySchema(BaseModel):
+    """Schema for page of existing locks in response."""
+
+    locks: list[ResourceLockInventoryItemSchema]
+    next_cursor: str | None = None
+
+
+class ResourceLockHistogramSchema(BaseModel):
+    """Schema for histogram with cumulative counts per bucket upper bound."""
+
+    buckets: dict[str, int]
+    count: int
+    sum: float
+
+
+class ResourceLockHotKeySchema(BaseModel):
+    """Schema for frequently locked key with its estimated count and maximum overestimation."""
+
+    key: str
+    count: int
+    error: int
+
+
+class ResourceLockMetricsSchema(BaseModel):
+    """Schema for resource lock contention and latency metrics of the process.
+
+    Latency and hold duration histograms are in seconds and keyed by operation.
+    """
+
+    acquire_latency: dict[str, ResourceLockHistogramSchema]
+    release_latency: dict[str, ResourceLockHistogramSchema]
+    hold_duration: dict[str, ResourceLockHistogramSchema]
+    acquisitions: dict[str, int]
+    rejections: dict[str, int]
+    hot_keys: list[ResourceLockHotKeySchema]
+    contended_keys: list[ResourceLockHotKeySchema]
@@ -0,0 +1,711 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+from redis.asyncio.client import Redis
+from redis.commands.core import AsyncScript
+
+HOLDERS_KEY_PREFIX = 'resource-lock:holders:'
+QUEUE_KEY_PREFIX = 'resource-lock:queue:'
+QUEUE_SEQUENCE_KEY = 'resource-lock:queue-sequence'
+RELEASED_CHANNEL = 'resource-lock:released'
+PREFIX_KEY_PREFIX = 'resource-lock:prefix:'
+SUBTREE_KEY_PREFIX = 'resource-lock:subtree:'
+INDEX_KEY = 'resource-lock:index'
+REAPER_KEY = 'resource-lock:reaper'
+RENEWED_AT_FIELD_PREFIX = 'renewed_at:'
+RECURSIVE_TICKET_SUFFIX = '|r'
+
+# Helpers shared by all scripts.
+#
+# The lock state is stored under the resource key as a hash with "r" (read count), "w" (write count) and "acquired_at"
+# (time in milliseconds when the first current holder acquired the lock) fields. Every lock holder has a lease stored
+# in a sorted set next to it, where the member is the owner token and the score is the lease expiration time in
+# milliseconds. The time of the last acquisition or renewal of each lease is kept in the hash field
+# "<RENEWED_AT_FIELD_PREFIX><owner token>". Expired leases are removed whenever the key is touched and the counts are
+# decreased accordingly. Counts that are not backed by a lease belong to locks created before leases were introduced
+# and never expire.
+#
+# Keys stored in the legacy "<read_count>,<write_count>" string format are converted into hashes when touched. While
+# LEGACY_STATE is enabled the conversion goes the other way, so instances which only understand strings keep working
+# during a rolling deploy.
+#
+# Requests waiting for a lock are queued in a sorted set per key, where the member is the ticket
+# "<operation>|<deadline in milliseconds>|<owner token>" and the score is a global sequence number. A single ticket
+# queued on several keys by a bulk lock keeps the same relative order on every key, so bulk waiters cannot deadlock.
+# A lock is not granted while a conflicting ticket is queued ahead of the request, which keeps writers from being
+# starved by a stream of readers. Tickets of recursive requests end with RECURSIVE_TICKET_SUFFIX and also hold back
+# conflicting requests for keys under them. Every successful release is published, so the waiters can retry
+# immediately.
+#
+# Resource keys are paths separated by "/" and a lock can be taken recursively for the whole subtree under the key.
+# Every leased holder is indexed under each ancestor of its key in "<SUBTREE_KEY_PREFIX><operation>:<ancestor>" sorted
+# sets, where the member is "<owner token>|<key>" and the score is the lease expiration time. Recursive holders are
+# also indexed in "<PREFIX_KEY_PREFIX><operation>:<key>". A lock then only has to count live entries in the indexes of
+# the key ancestors, and a recursive lock in the index of the key itself, so conflicts are found in O(depth).
+#
+# All locked keys are kept in the INDEX_KEY sorted set with equal scores, so they can be listed by prefix in
+# lexicographical order. Entries of keys which expired with their last lease are removed when they are listed.
+STATE_FUNCTIONS = (
+    f'''
+local HOLDERS_KEY_PREFIX = '{HOLDERS_KEY_PREFIX}'
+local QUEUE_KEY_PREFIX = '{QUEUE_KEY_PREFIX}'
+local QUEUE_SEQUENCE_KEY = '{QUEUE_SEQUENCE_KEY}'
+local RELEASED_CHANNEL = '{RELEASED_CHANNEL}'
+local PREFIX_KEY_PREFIX = '{PREFIX_KEY_PREFIX}'
+local SUBTREE_KEY_PREFIX = '{SUBTREE_KEY_PREFIX}'
+local INDEX_KEY = '{INDEX_KEY}'
+local RECURSIVE_TICKET_SUFFIX = '{RECURSIVE_TICKET_SUFFIX}'
+local RENEWED_AT_FIELD_PREFIX = '{RENEWED_AT_FIELD_PREFIX}'
+'''
+    + '''
+local function now_ms()
+    local time = redis.call('TIME')
+    return tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+end
+
+local function read_counts(key)
+    local kind = redis.call('TYPE', key)['ok']
+    if kind == 'hash' then
+        local counts = redis.call('HMGET', key, 'r', 'w')
+        return tonumber(counts[1]) or 0, tonumber(counts[2]) or 0, kind
+    end
+    if kind == 'string' then
+        local value = redis.call('GET', key)
+        local separator = string.find(value, ',', 1, true)
+        return tonumber(string.sub(value, 1, separator - 1)), tonumber(string.sub(value, separator + 1)), kind
+    end
+    return 0, 0, kind
+end
+
+local function refresh_expiry(key, total_count)
+    local holders_key = HOLDERS_KEY_PREFIX .. key
+    local last_lease = redis.call('ZRANGE', holders_key, -1, -1, 'WITHSCORES')
+    if #last_lease == 0 or total_count > redis.call('ZCARD', holders_key) then
+        redis.call('PERSIST', key)
+        redis.call('PERSIST', holders_key)
+    else
+        redis.call('PEXPIREAT', key, last_lease[2])
+        redis.call('PEXPIREAT', holders_key, last_lease[2])
+    end
+end
+
+local function save_state(key, read_count, write_count, now)
+    if read_count + write_count == 0 then
+        redis.call('DEL', key, HOLDERS_KEY_PREFIX .. key)
+        redis.call('ZREM', INDEX_KEY, key)
+        return
+    end
+
+    redis.call('ZADD', INDEX_KEY, 0, key)
+    if LEGACY_STATE then
+        redis.call('SET', key, string.format('%d,%d', read_count, write_count))
+    else
+        redis.call('HSET', key, 'r', string.format('%d', read_count), 'w', string.format('%d', write_count))
+        redis.call('HSETNX', key, 'acquired_at', now)
+    end
+    refresh_expiry(key, read_count + write_count)
+end
+
+local function load_state(key, now)
+    local read_count, write_count, kind = read_counts(key)
+    if kind == 'none' then
+        return 0, 0
+    end
+
+    local expired_count = redis.call('ZREMRANGEBYSCORE', HOLDERS_KEY_PREFIX .. key, '-inf', now)
+    if expired_count > 0 then
+        if write_count > 0 then
+            write_count = 0
+        else
+            read_count = read_count - expired_count
+            if read_count < 0 then
+                read_count = 0
+            end
+        end
+    end
+
+    local is_converted = (kind == 'string') ~= LEGACY_STATE
+    if is_converted and kind == 'string' then
+        redis.call('DEL', key)
+    end
+    if expired_count > 0 or is_converted then
+        save_state(key, read_count, write_count, now)
+    end
+
+    return read_count, write_count
+end
+
+local function change_count(key, operation, delta, read_count, write_count, now)
+    if operation == 'read' then
+        read_count = read_count + delta
+    else
+        write_count = write_count + delta
+    end
+
+    if LEGACY_STATE or read_count + write_count == 0 then
+        save_state(key, read_count, write_count, now)
+        return
+    end
+
+    if operation == 'read' then
+        redis.call('HINCRBY', key, 'r', delta)
+    else
+        redis.call('HINCRBY', key, 'w', delta)
+    end
+    redis.call('HSETNX', key, 'acquired_at', now)
+    refresh_expiry(key, read_count + write_count)
+end
+
+local function mark_renewed(key, token, now)
+    if not LEGACY_STATE then
+        redis.call('HSET', key, RENEWED_AT_FIELD_PREFIX .. token, now)
+    end
+end
+
+local function unmark_renewed(key, token)
+    if not LEGACY_STATE and redis.call('EXISTS', key) == 1 then
+        redis.call('HDEL', key, RENEWED_AT_FIELD_PREFIX .. token)
+    end
+end
+
+local function is_blocked(operation, read_count, write_count)
+    return write_count > 0 or (operation == 'write' and read_count > 0)
+end
+
+local function ancestors(key)
+    local paths = {}
+    local index = string.find(key, '/', 1, true)
+    while index do
+        if index > 1 then
+            paths[#paths + 1] = string.sub(key, 1, index - 1)
+        end
+        index = string.find(key, '/', index + 1, true)
+    end
+    return paths
+end
+
+local function is_conflict_queued(queue_key, operation, position, now, is_ancestor)
+    local entries = redis.call('ZRANGE', queue_key, 0, -1, 'WITHSCORES')
+    for index = 1, #entries, 2 do
+        if position and tonumber(entries[index + 1]) >= tonumber(position) then
+            break
+        end
+        local entry_operation, deadline = string.match(entries[index], '^(%a+)|(%d+)|')
+        local is_covering = not is_ancestor
+            or string.sub(entries[index], -#RECURSIVE_TICKET_SUFFIX) == RECURSIVE_TICKET_SUFFIX
+        if tonumber(deadline) < now then
+            redis.call('ZREM', queue_key, entries[index])
+        elseif is_covering and (operation == 'write' or entry_operation == 'write') then
+            return true
+        end
+    end
+
+    return false
+end
+
+local function is_queued_ahead(key, operation, ticket, now)
+    local position = false
+    if ticket ~= '' then
+        position = redis.call('ZSCORE', QUEUE_KEY_PREFIX .. key, ticket)
+    end
+
+    if is_conflict_queued(QUEUE_KEY_PREFIX .. key, operation, position, now, false) then
+        return true
+    end
+    for _, path in ipairs(ancestors(key)) do
+        if is_conflict_queued(QUEUE_KEY_PREFIX .. path, operation, position, now, true) then
+            return true
+        end
+    end
+
+    return false
+end
+
+local function enqueue(keys, ticket, now)
+    local sequence = false
+    local wait_ms = tonumber(string.match(ticket, '^%a+|(%d+)|')) - now
+    for _, key in ipairs(keys) do
+        local queue_key = QUEUE_KEY_PREFIX .. key
+        if not redis.call('ZSCORE', queue_key, ticket) then
+            sequence = sequence or redis.call('INCR', QUEUE_SEQUENCE_KEY)
+            redis.call('ZADD', queue_key, sequence, ticket)
+        end
+        if redis.call('PTTL', queue_key) < wait_ms then
+            redis.call('PEXPIRE', queue_key, wait_ms)
+        end
+    end
+end
+
+local function dequeue(key, ticket)
+    if ticket ~= '' then
+        redis.call('ZREM', QUEUE_KEY_PREFIX .. key, ticket)
+    end
+end
+
+local function count_live(index_key, now)
+    return redis.call('ZCOUNT', index_key, string.format('(%d', now), '+inf')
+end
+
+local function is_blocked_by_hierarchy(key, operation, is_recursive, now)
+    for _, path in ipairs(ancestors(key)) do
+        if count_live(PREFIX_KEY_PREFIX .. 'write:' .. path, now) > 0 then
+            return true
+        end
+        if operation == 'write' and count_live(PREFIX_KEY_PREFIX .. 'read:' .. path, now) > 0 then
+            return true
+        end
+    end
+
+    if is_recursive then
+        if count_live(SUBTREE_KEY_PREFIX .. 'write:' .. key, now) > 0 then
+            return true
+        end
+        if operation == 'write' and count_live(SUBTREE_KEY_PREFIX .. 'read:' .. key, now) > 0 then
+            return true
+        end
+    end
+
+    return false
+end
+
+local function set_index_entry(index_key, member, expires_at, now, flag)
+    redis.call('ZREMRANGEBYSCORE', index_key, '-inf', now)
+    if flag then
+        redis.call('ZADD', index_key, flag, expires_at, member)
+    else
+        redis.call('ZADD', index_key, expires_at, member)
+    end
+    local last_entry = redis.call('ZRANGE', index_key, -1, -1, 'WITHSCORES')
+    if #last_entry > 0 then
+        redis.call('PEXPIREAT', index_key, last_entry[2])
+    end
+end
+
+local function index_holder(key, operation, token, is_recursive, now, expires_at, flag)
+    if is_recursive then
+        set_index_entry(PREFIX_KEY_PREFIX .. operation .. ':' .. key, token, expires_at, now, flag)
+    end
+    for _, path in ipairs(ancestors(key)) do
+        set_index_entry(SUBTREE_KEY_PREFIX .. operation .. ':' .. path, token .. '|' .. key, expires_at, now, flag)
+    end
+end
+
+local function unindex_holder(key, operation, token)
+    redis.call('ZREM', PREFIX_KEY_PREFIX .. operation .. ':' .. key, token)
+    for _, path in ipairs(ancestors(key)) do
+        redis.call('ZREM', SUBTREE_KEY_PREFIX .. operation .. ':' .. path, token .. '|' .. key)
+    end
+end
+
+local function unindex_all_holders(key, operation)
+    for _, token in ipairs(redis.call('ZRANGE', HOLDERS_KEY_PREFIX .. key, 0, -1)) do
+        unindex_holder(key, operation, token)
+    end
+end
+
+local function acquire(key, operation, read_count, token, is_recursive, now, expires_at)
+    redis.call('ZADD', HOLDERS_KEY_PREFIX .. key, expires_at, token)
+    redis.call('ZADD', INDEX_KEY, 0, key)
+    index_holder(key, operation, token, is_recursive, now, expires_at, false)
+    change_count(key, operation, 1, read_count, 0, now)
+    mark_renewed(key, token, now)
+end
+
+local function get_held_ms(key, acquired_at, now)
+    if acquired_at and redis.call('EXISTS', key) == 0 then
+        return now - tonumber(acquired_at)
+    end
+    return -1
+end
+
+local function release(key, operation, token, now)
+    local read_count, write_count = load_state(key, now)
+    if read_count + write_count == 0 then
+        return 0, 0, 0, -1
+    end
+    local acquired_at = not LEGACY_STATE and redis.call('HGET', key, 'acquired_at')
+
+    if token ~= '' then
+        local is_held = (operation == 'read' and read_count > 0) or (operation == 'write' and write_count > 0)
+        if not is_held or redis.call('ZREM', HOLDERS_KEY_PREFIX .. key, token) == 0 then
+            return 0, read_count, write_count, -1
+        end
+        unindex_holder(key, operation, token)
+        change_count(key, operation, -1, read_count, write_count, now)
+        unmark_renewed(key, token)
+        redis.call('PUBLISH', RELEASED_CHANNEL, key)
+        return 1, read_count, write_count, get_held_ms(key, acquired_at, now)
+    end
+
+    -- releasing without a token keeps the behaviour of locks created before owner tokens were introduced
+    if operation == 'read' then
+        if read_count > 1 then
+            if read_count <= redis.call('ZCARD', HOLDERS_KEY_PREFIX .. key) then
+                local oldest = redis.call('ZPOPMIN', HOLDERS_KEY_PREFIX .. key)
+                unindex_holder(key, operation, oldest[1])
+                unmark_renewed(key, oldest[1])
+            end
+            change_count(key, operation, -1, read_count, write_count, now)
+        else
+            unindex_all_holders(key, write_count > 0 and 'write' or 'read')
+            save_state(key, 0, 0, now)
+        end
+    else
+        if read_count > 0 then
+            return 0, read_count, write_count, -1
+        end
+        unindex_all_holders(key, operation)
+        save_state(key, 0, 0, now)
+    end
+    redis.call('PUBLISH', RELEASED_CHANNEL, key)
+
+    return 1, read_count, write_count, get_held_ms(key, acquired_at, now)
+end
+
+local function get_conversion(key, token, operation, now)
+    local read_count, write_count = load_state(key, now)
+    local expires_at = redis.call('ZSCORE', HOLDERS_KEY_PREFIX .. key, token)
+    if not expires_at then
+        return false
+    end
+
+    if operation == 'read' then
+        if write_count ~= 1 then
+            return false
+        end
+        return expires_at, redis.call('ZSCORE', PREFIX_KEY_PREFIX .. 'write:' .. key, token)
+    end
+
+    if read_count ~= 1 or write_count ~= 0 then
+        return false
+    end
+    local is_recursive = redis.call('ZSCORE', PREFIX_KEY_PREFIX .. 'read:' .. key, token)
+    if is_blocked_by_hierarchy(key, operation, is_recursive, now) then
+        return false
+    end
+    return expires_at, is_recursive
+end
+
+local function convert(key, token, operation, expires_at, is_recursive, now)
+    if operation == 'write' then
+        unindex_holder(key, 'read', token)
+        index_holder(key, 'write', token, is_recursive, now, expires_at, false)
+        save_state(key, 0, 1, now)
+    else
+        unindex_holder(key, 'write', token)
+        index_holder(key, 'read', token, is_recursive, now, expires_at, false)
+        save_state(key, 1, 0, now)
+        redis.call('PUBLISH', RELEASED_CHANNEL, key)
+    end
+end
+
+local function renew(key, token, now, expires_at)
+    local read_count, write_count = load_state(key, now)
+    if not redis.call('ZSCORE', HOLDERS_KEY_PREFIX .. key, token) then
+        return 0
+    end
+    redis.call('ZADD', HOLDERS_KEY_PREFIX .. key, 'XX', expires_at, token)
+    local operation = write_count > 0 and 'write' or 'read'
+    local is_recursive = redis.call('ZSCORE', PREFIX_KEY_PREFIX .. operation .. ':' .. key, token)
+    index_holder(key, operation, token, is_recursive, now, expires_at, 'XX')
+    refresh_expiry(key, read_count + write_count)
+    mark_renewed(key, token, now)
+    return 1
+end
+'''
+)
+
+# KEYS[1] - resource key
+# ARGV[1] - operation (read or write)
+# ARGV[2] - owner token
+# ARGV[3] - lease duration in milliseconds
+# ARGV[4] - wait queue ticket or empty string when the request is not waiting
+# ARGV[5] - "1" to lock the whole subtree under the key, "0" otherwise
+# Returns {is_successful, read_count, write_count} with counts found before the lock attempt.
+LOCK = (
+    STATE_FUNCTIONS
+    + '''
+local now = now_ms()
+local is_recursive = ARGV[5] == '1'
+local read_count, write_count = load_state(KEYS[1], now)
+
+if is_blocked(ARGV[1], read_count, write_count)
+    or is_blocked_by_hierarchy(KEYS[1], ARGV[1], is_recursive, now)
+    or is_queued_ahead(KEYS[1], ARGV[1], ARGV[4], now) then
+    if ARGV[4] ~= '' then
+        enqueue(KEYS, ARGV[4], now)
+    end
+    return {0, read_count, write_count}
+end
+
+acquire(KEYS[1], ARGV[1], read_count, ARGV[2], is_recursive, now, now + tonumber(ARGV[3]))
+dequeue(KEYS[1], ARGV[4])
+
+return {1, read_count, write_count}
+'''
+)
+
+# KEYS - resource keys
+# ARGV[1] - operation (read or write)
+# ARGV[2] - owner token
+# ARGV[3] - lease duration in milliseconds
+# ARGV[4] - wait queue ticket or empty string when the request is not waiting
+# ARGV[5] - "1" to lock the whole subtree under each key, "0" otherwise
+# Either locks all keys or none of them. Returns 0 on success or the 1-based index of the first key blocking the lock.
+BULK_LOCK = (
+    STATE_FUNCTIONS
+    + '''
+local now = now_ms()
+local is_recursive = ARGV[5] == '1'
+local read_counts = {}
+
+for index, key in ipairs(KEYS) do
+    local read_count, write_count = load_state(key, now)
+    if is_blocked(ARGV[1], read_count, write_count)
+        or is_blocked_by_hierarchy(key, ARGV[1], is_recursive, now)
+        or is_queued_ahead(key, ARGV[1], ARGV[4], now) then
+        if ARGV[4] ~= '' then
+            enqueue(KEYS, ARGV[4], now)
+        end
+        return index
+    end
+    read_counts[index] = read_count
+end
+
+for index, key in ipairs(KEYS) do
+    acquire(key, ARGV[1], read_counts[index], ARGV[2], is_recursive, now, now + tonumber(ARGV[3]))
+    dequeue(key, ARGV[4])
+end
+
+return 0
+'''
+)
+
+# KEYS[1] - resource key
+# ARGV[1] - operation (read or write)
+# ARGV[2] - owner token or empty string
+# Returns {is_successful, read_count, write_count, held_ms} with counts found before the unlock attempt and the time
+# the key was locked for when it is not locked anymore, -1 otherwise.
+UNLOCK = (
+    STATE_FUNCTIONS
+    + '''
+return {release(KEYS[1], ARGV[1], ARGV[2], now_ms())}
+'''
+)
+
+# KEYS - resource keys
+# ARGV[1] - operation (read or write)
+# ARGV[2] - owner token or empty string
+# Returns a list of {is_successful, held_ms} pairs ordered as the keys.
+BULK_UNLOCK = (
+    STATE_FUNCTIONS
+    + '''
+local now = now_ms()
+local statuses = {}
+
+for index, key in ipairs(KEYS) do
+    local is_successful, _, _, held_ms = release(key, ARGV[1], ARGV[2], now)
+    statuses[index] = {is_successful, held_ms}
+end
+
+return statuses
+'''
+)
+
+# KEYS - resource keys
+# ARGV[1] - wait queue ticket
+# Removes the ticket of a request that stopped waiting and wakes up the requests queued behind it.
+DEQUEUE = (
+    STATE_FUNCTIONS
+    + '''
+for _, key in ipairs(KEYS) do
+    if redis.call('ZREM', QUEUE_KEY_PREFIX .. key, ARGV[1]) == 1 then
+        redis.call('PUBLISH', RELEASED_CHANNEL, key)
+    end
+end
+
+return 0
+'''
+)
+
+# KEYS - resource keys
+# ARGV[1] - target operation, "write" to upgrade read locks or "read" to downgrade write locks
+# ARGV[2] - owner token
+# Either converts locks of all keys or none of them. A read lock is upgraded only when the owner is the sole reader.
+# Leases and recursion of the locks are kept. Returns 0 on success or the 1-based index of the first key which cannot be
+# converted.
+CONVERT = (
+    STATE_FUNCTIONS
+    + '''
+local now = now_ms()
+local conversions = {}
+
+for index, key in ipairs(KEYS) do
+    local expires_at, is_recursive = get_conversion(key, ARGV[2], ARGV[1], now)
+    if not expires_at then
+        return index
+    end
+    conversions[index] = {expires_at, is_recursive}
+end
+
+for index, key in ipairs(KEYS) do
+    convert(key, ARGV[2], ARGV[1], conversions[index][1], conversions[index][2], now)
+end
+
+return 0
+'''
+)
+
+# KEYS - resource keys
+# ARGV[1] - owner token
+# ARGV[2] - lease duration in milliseconds
+# Returns a list of is_successful flags ordered as the keys.
+RENEW = (
+    STATE_FUNCTIONS
+    + '''
+local now = now_ms()
+local statuses = {}
+
+for index, key in ipairs(KEYS) do
+    statuses[index] = renew(key, ARGV[1], now, now + tonumber(ARGV[2]))
+end
+
+return statuses
+'''
+)
+
+# KEYS - resource keys
+# ARGV[1] - maximum time in milliseconds since the last renewal of a lease or 0 to keep leases of any age
+# Removes expired leases and index entries of expired keys, and forcibly releases leases which were not renewed during
+# the maximum age. Counts not backed by a lease are released when the lock was acquired before the maximum age.
+# Returns the number of keys which are not locked anymore.
+REAP = (
+    STATE_FUNCTIONS
+    + '''
+local function reap_abandoned(key, read_count, write_count, now, max_age)
+    local operation = write_count > 0 and 'write' or 'read'
+    local acquired_at = tonumber(redis.call('HGET', key, 'acquired_at'))
+    local tokens = redis.call('ZRANGE', HOLDERS_KEY_PREFIX .. key, 0, -1)
+    local is_held = {}
+    local reaped_count = 0
+    for _, token in ipairs(tokens) do
+        is_held[RENEWED_AT_FIELD_PREFIX .. token] = true
+        local renewed_at = tonumber(redis.call('HGET', key, RENEWED_AT_FIELD_PREFIX .. token)) or acquired_at
+        if renewed_at and now - renewed_at > max_age then
+            redis.call('ZREM', HOLDERS_KEY_PREFIX .. key, token)
+            redis.call('HDEL', key, RENEWED_AT_FIELD_PREFIX .. token)
+            unindex_holder(key, operation, token)
+            reaped_count = reaped_count + 1
+        end
+    end
+    for _, field in ipairs(redis.call('HKEYS', key)) do
+        if string.sub(field, 1, #RENEWED_AT_FIELD_PREFIX) == RENEWED_AT_FIELD_PREFIX and not is_held[field] then
+            redis.call('HDEL', key, field)
+        end
+    end
+
+    local total_count = read_count + write_count
+    local unleased_count = total_count - #tokens
+    if unleased_count > 0 and acquired_at and now - acquired_at > max_age then
+        reaped_count = reaped_count + unleased_count
+    end
+    if reaped_count == 0 then
+        return false
+    end
+    if write_count > 0 then
+        write_count = 0
+    else
+        read_count = math.max(read_count - reaped_count, 0)
+    end
+    save_state(key, read_count, write_count, now)
+    redis.call('PUBLISH', RELEASED_CHANNEL, key)
+    return read_count + write_count == 0
+end
+
+local now = now_ms()
+local max_age = tonumber(ARGV[1])
+local removed_count = 0
+
+for _, key in ipairs(KEYS) do
+    local is_existing = redis.call('EXISTS', key) == 1
+    local read_count, write_count = load_state(key, now)
+    if read_count + write_count == 0 then
+        redis.call('ZREM', INDEX_KEY, key)
+        if is_existing then
+            removed_count = removed_count + 1
+        end
+    elseif max_age > 0 and not LEGACY_STATE and reap_abandoned(key, read_count, write_count, now, max_age) then
+        removed_count = removed_count + 1
+    end
+end
+
+return removed_count
+'''
+)
+
+# KEYS[1] - resource key
+# Returns {read_count, write_count, acquired_at} with expired leases excluded.
+STATUS = (
+    STATE_FUNCTIONS
+    + '''
+local read_count, write_count = load_state(KEYS[1], now_ms())
+local acquired_at = false
+if redis.call('TYPE', KEYS[1])['ok'] == 'hash' then
+    acquired_at = redis.call('HGET', KEYS[1], 'acquired_at')
+end
+
+return {read_count, write_count, acquired_at}
+'''
+)
+
+
+class ResourceLockScripts:
+    """Lua scripts performing resource lock state transitions atomically on the Redis side.
+
+    Scripts are invoked by their SHA digest. When Redis does not have a script cached yet (e.g. after a restart), it is
+    loaded transparently and the call is retried.
+
+    With ``legacy_state`` enabled the lock state is written in the legacy string format.
+    """
+
+    def __init__(self, redis: Redis, legacy_state: bool = False) -> None:
+        self.redis = redis
+        self.legacy_state = legacy_state
+
+        self.lock = self.register(LOCK)
+        self.bulk_lock = self.register(BULK_LOCK)
+        self.unlock = self.register(UNLOCK)
+        self.bulk_unlock = self.register(BULK_UNLOCK)
+        self.dequeue = self.register(DEQUEUE)
+        self.convert = self.register(CONVERT)
+        self.renew = self.register(RENEW)
+        self.reap = self.register(REAP)
+        self.status = self.register(STATUS)
+
+    def register(self, script: str) -> AsyncScript:
+        """Register script with the state format flag defined."""
+
+        return self.redis.register_script(f'local LEGACY_STATE = {str(self.legacy_state).lower()}\n{script}')
+
+    @property
+    def scripts(self) -> list[AsyncScript]:
+        return [
+            self.lock,
+            self.bulk_lock,
+            self.unlock,
+            self.bulk_unlock,
+            self.dequeue,
+            self.convert,
+            self.renew,
+            self.reap,
+            self.status,
+        ]
+
+    async def load(self) -> None:
+        """Load all scripts into the Redis script cache."""
+
+        for script in self.scripts:
+            script.sha = await self.redis.script_load(script.script)
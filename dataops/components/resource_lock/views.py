@@ -6,14 +6,29 @@
 
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Query
 
 from dataops.components.exceptions import AlreadyExists
 from dataops.components.exceptions import BadRequest
+from dataops.components.exceptions import NotFound
 from dataops.components.resource_lock.cache import ResourceLockerCache
 from dataops.components.resource_lock.dependencies import get_resource_lock_cache
+from dataops.components.resource_lock.dependencies import get_resource_lock_metrics
+from dataops.components.resource_lock.metrics import ResourceLockMetrics
+from dataops.components.resource_lock.schemas import ResourceLockBulkConvertSchema
 from dataops.components.resource_lock.schemas import ResourceLockBulkCreateSchema
+from dataops.components.resource_lock.schemas import ResourceLockBulkDeleteSchema
+from dataops.components.resource_lock.schemas import ResourceLockBulkRenewSchema
 from dataops.components.resource_lock.schemas import ResourceLockBulkResponseSchema
+from dataops.components.resource_lock.schemas import ResourceLockBulkStatusResponseSchema
+from dataops.components.resource_lock.schemas import ResourceLockBulkStatusSchema
+from dataops.components.resource_lock.schemas import ResourceLockConvertSchema
 from dataops.components.resource_lock.schemas import ResourceLockCreateSchema
+from dataops.components.resource_lock.schemas import ResourceLockDeleteSchema
+from dataops.components.resource_lock.schemas import ResourceLockInventorySchema
+from dataops.components.resource_lock.schemas import ResourceLockMetricsSchema
+from dataops.components.resource_lock.schemas import ResourceLockOperationSchema
+from dataops.components.resource_lock.schemas import ResourceLockRenewSchema
 from dataops.components.resource_lock.schemas import ResourceLockResponseSchema
 
 router = APIRouter(prefix='/resource/lock', tags=['Resource Locking'])
@@ -24,7 +39,9 @@ async def lock(
     body: ResourceLockCreateSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
 ) -> ResourceLockResponseSchema:
     """Create operation lock on a respective resource via a resource key."""
-    response = await resource_locker.perform_rw_lock(body.resource_key, body.operation)
+    response = await resource_locker.perform_rw_lock(
+        body.resource_key, body.operation, body.ttl, body.wait_timeout, body.recursive
+    )
     if not response.status:
         raise AlreadyExists()
     return response
@@ -35,7 +52,9 @@ async def bulk_lock(
     body: ResourceLockBulkCreateSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
 ) -> ResourceLockBulkResponseSchema:
     """Bulk create operation locks on respective resources via resource keys."""
-    response = await resource_locker.perform_bulk_lock(body.resource_keys, body.operation)
+    response = await resource_locker.perform_bulk_lock(
+        body.resource_keys, body.operation, body.ttl, body.wait_timeout, body.recursive
+    )
     if not response.is_successful():
         raise AlreadyExists()
     return response
@@ -43,10 +62,10 @@ async def bulk_lock(
 
 @router.delete('/', response_model=ResourceLockResponseSchema, summary='Remove a lock')
 async def unlock(
-    body: ResourceLockCreateSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+    body: ResourceLockDeleteSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
 ) -> ResourceLockResponseSchema:
     """Remove operation lock on a respective resource via a resource key."""
-    response = await resource_locker.perform_rw_unlock(body.resource_key, body.operation)
+    response = await resource_locker.perform_rw_unlock(body.resource_key, body.operation, body.token)
     if not response.status:
         raise BadRequest()
     return response
@@ -54,15 +73,89 @@ async def unlock(
 
 @router.delete('/bulk', response_model=ResourceLockBulkResponseSchema, summary='Remove multiple locks')
 async def bulk_unlock(
-    body: ResourceLockBulkCreateSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+    body: ResourceLockBulkDeleteSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
 ) -> ResourceLockBulkResponseSchema:
     """Bulk remove operation locks on respective resources via resource keys."""
-    response = await resource_locker.perform_bulk_unlock(body.resource_keys, body.operation)
+    response = await resource_locker.perform_bulk_unlock(body.resource_keys, body.operation, body.token)
+    if not response.is_successful():
+        raise BadRequest()
+    return response
+
+
+@router.post('/upgrade', response_model=ResourceLockResponseSchema, summary='Upgrade a read lock to write lock')
+async def upgrade(
+    body: ResourceLockConvertSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+) -> ResourceLockResponseSchema:
+    """Atomically upgrade read lock owned by the token to write lock, if the owner is the sole reader."""
+    response = await resource_locker.perform_rw_convert(
+        body.resource_key, ResourceLockOperationSchema.WRITE.value, body.token
+    )
+    if not response.status:
+        raise AlreadyExists()
+    return response
+
+
+@router.post('/downgrade', response_model=ResourceLockResponseSchema, summary='Downgrade a write lock to read lock')
+async def downgrade(
+    body: ResourceLockConvertSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+) -> ResourceLockResponseSchema:
+    """Atomically downgrade write lock owned by the token to read lock."""
+    response = await resource_locker.perform_rw_convert(
+        body.resource_key, ResourceLockOperationSchema.READ.value, body.token
+    )
+    if not response.status:
+        raise BadRequest()
+    return response
+
+
+@router.post('/bulk/upgrade', response_model=ResourceLockBulkResponseSchema, summary='Upgrade multiple read locks')
+async def bulk_upgrade(
+    body: ResourceLockBulkConvertSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+) -> ResourceLockBulkResponseSchema:
+    """Atomically upgrade read locks owned by the token to write locks, either all of them or none."""
+    response = await resource_locker.perform_bulk_convert(
+        body.resource_keys, ResourceLockOperationSchema.WRITE.value, body.token
+    )
+    if not response.is_successful():
+        raise AlreadyExists()
+    return response
+
+
+@router.post('/bulk/downgrade', response_model=ResourceLockBulkResponseSchema, summary='Downgrade multiple write locks')
+async def bulk_downgrade(
+    body: ResourceLockBulkConvertSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+) -> ResourceLockBulkResponseSchema:
+    """Atomically downgrade write locks owned by the token to read locks, either all of them or none."""
+    response = await resource_locker.perform_bulk_convert(
+        body.resource_keys, ResourceLockOperationSchema.READ.value, body.token
+    )
     if not response.is_successful():
         raise BadRequest()
     return response
 
 
+@router.post('/renew', response_model=ResourceLockResponseSchema, summary='Renew a lock lease')
+async def renew(
+    body: ResourceLockRenewSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+) -> ResourceLockResponseSchema:
+    """Extend lease of the lock owned by the token on a respective resource via a resource key."""
+    response = await resource_locker.perform_rw_renew(body.resource_key, body.token, body.ttl)
+    if not response.status:
+        raise NotFound()
+    return response
+
+
+@router.post('/bulk/renew', response_model=ResourceLockBulkResponseSchema, summary='Renew multiple lock leases')
+async def bulk_renew(
+    body: ResourceLockBulkRenewSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+) -> ResourceLockBulkResponseSchema:
+    """Bulk extend leases of the locks owned by the token on respective resources via resource keys."""
+    response = await resource_locker.perform_bulk_renew(body.resource_keys, body.token, body.ttl)
+    if not response.is_successful():
+        raise NotFound()
+    return response
+
+
 @router.get('/', response_model=ResourceLockResponseSchema, summary='Check a lock status')
 async def check_lock(
     resource_key: str, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
@@ -70,3 +163,40 @@ async def check_lock(
     """Retrieve status of lock via a resource key."""
     response = await resource_locker.check_lock_status(resource_key)
     return response
+
+
+@router.post(
+    '/bulk/status', response_model=ResourceLockBulkStatusResponseSchema, summary='Check multiple lock statuses'
+)
+async def check_bulk_lock(
+    body: ResourceLockBulkStatusSchema, resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache)
+) -> ResourceLockBulkStatusResponseSchema:
+    """Retrieve statuses of locks via resource keys or of all locks via a resource key prefix."""
+    if body.resource_keys is not None:
+        locks = await resource_locker.check_bulk_lock_status(body.resource_keys)
+        return ResourceLockBulkStatusResponseSchema(locks=locks)
+
+    locks, next_cursor = await resource_locker.check_prefix_lock_status(body.prefix, body.cursor, body.limit)
+    return ResourceLockBulkStatusResponseSchema(locks=locks, next_cursor=next_cursor)
+
+
+@router.get('/inventory', response_model=ResourceLockInventorySchema, summary='List existing locks')
+async def list_locks(
+    prefix: str = '',
+    cursor: str | None = None,
+    limit: int = Query(default=100, gt=0, le=1000),
+    resource_locker: ResourceLockerCache = Depends(get_resource_lock_cache),
+) -> ResourceLockInventorySchema:
+    """List existing locks under a resource key prefix page by page.
+
+    Pass the returned next cursor to retrieve the next page.
+    """
+    return await resource_locker.list_locks(prefix, cursor, limit)
+
+
+@router.get('/metrics', response_model=ResourceLockMetricsSchema, summary='Retrieve lock metrics')
+async def get_metrics(
+    top: int = Query(default=20, gt=0, le=1000), metrics: ResourceLockMetrics = Depends(get_resource_lock_metrics)
+) -> ResourceLockMetricsSchema:
+    """Retrieve lock latency, hold duration, rejection and hot key metrics collected by the process."""
+    return metrics.to_schema(top)
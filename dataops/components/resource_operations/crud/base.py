@@ -7,6 +7,7 @@
 from time import time
 from uuid import UUID
 
+from dataops.components.codecs import get_codec
 from dataops.components.crud import RedisCRUD
 from dataops.components.exceptions import InvalidInput
 from dataops.components.resource_operations.filtering import ItemFilter
@@ -17,6 +18,8 @@ from dataops.components.resource_operations.schemas import ResourceOperationSche
 from dataops.components.resource_operations.schemas import ResourceOperationTargetSchema
 from dataops.components.resource_operations.schemas import ResourceType
 from dataops.components.schemas import EActionType
+from dataops.components.task_stream.parsing import StreamParser
+from dataops.config import get_settings
 from dataops.logger import logger
 
 
@@ -26,6 +29,8 @@ class BaseResourceProcessing(RedisCRUD):
     def __init__(self, metadata_client, queue_client, redis):
         self.metadata_client = metadata_client
         self.queue_client = queue_client
+        self.codec = get_codec(get_settings().REDIS_CODEC)
+        self.stream_legacy_format = get_settings().TASK_STREAM_LEGACY_FORMAT
         super().__init__(redis)
 
     async def validate_base(self, item_id: str) -> bool:
@@ -67,8 +72,12 @@ class BaseResourceProcessing(RedisCRUD):
         )
         values = status_data.to_payload()
         values.pop('session_id')
-        values['target_names'] = str(values['target_names'])
-        await self.streams_xadd(data.session_id, values, '*')
+        await self.streams_xadd(
+            data.session_id,
+            StreamParser.encode_file_status(values, self.codec, self.stream_legacy_format),
+            '*',
+            **StreamParser.get_retention(),
+        )
         return ResourceOperationResponseSchema(operation_info=[status_data])
 
     async def send_message(self, job_id: UUID, data: ResourceOperationSchema, targets: ItemFilter, token: str) -> None:
@@ -0,0 +1,20 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+
+from fastapi import Request
+
+from dataops.config import get_settings
+
+
+async def watch_disconnect(request: Request) -> None:
+    """Return once the client disconnects.
+
+    Run as a separate task next to a blocking read of events, so the read does not have to time out to notice it.
+    """
+    while not await request.is_disconnected():
+        await asyncio.sleep(get_settings().SSE_DISCONNECT_CHECK_INTERVAL)
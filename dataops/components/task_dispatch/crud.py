@@ -4,19 +4,176 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
 import json
 import time
+from collections import Counter
+from collections.abc import AsyncIterator
+from typing import Any
 
+from fastapi import Request
+from redis.asyncio.client import Pipeline
+from redis.asyncio.client import Redis
+from sse_starlette.sse import EventSourceResponse
+
+from dataops.components.codecs import Codec
+from dataops.components.codecs import get_codec
 from dataops.components.crud import RedisCRUD
 from dataops.components.exceptions import AlreadyExists
+from dataops.components.exceptions import Conflict
 from dataops.components.exceptions import NotFound
+from dataops.components.exceptions import ServiceException
 from dataops.components.schemas import BaseSchema
+from dataops.components.sse import watch_disconnect
+from dataops.components.task_dispatch.schemas import TaskDeleteSchema
+from dataops.components.task_dispatch.schemas import TaskSchema
+from dataops.components.task_dispatch.schemas import TaskUpdateSchema
+from dataops.components.task_dispatch.scripts import FORMAT_FIELD
+from dataops.components.task_dispatch.scripts import JOB_FIELDS
+from dataops.components.task_dispatch.scripts import JSON_FIELDS
+from dataops.components.task_dispatch.scripts import PAYLOAD_FIELD_PREFIX
+from dataops.components.task_dispatch.scripts import STATS_BUCKET_SIZE
+from dataops.components.task_dispatch.scripts import SessionJobScripts
 from dataops.components.task_dispatch.sorting import sort_by_update_time
+from dataops.config import get_settings
 from dataops.logger import logger
 
+LEGACY_PAYLOAD_FIELD_PREFIX = 'payload.'
+INDEX_BACKFILL_KEY = 'dataaction:index-backfill'
+REMOVE_BATCH_SIZE = 500
+
 
 class SessionJobCRUD(RedisCRUD):
-    """CRUD for managing jobs for a user session, which are stored in Redis using RedisCRUD."""
+    """CRUD for managing jobs for a user session, which are stored in Redis using RedisCRUD.
+
+    Job keys of every session are indexed in a sorted set scored by update time, so lookups and deletes only go
+    through entries of the session instead of the whole keyspace. Jobs stored by previous versions, which did not index
+    them, are added to the indexes once in the background after the application startup. Jobs are stored as hashes,
+    so status, progress and payload fields are updated in place by a single script call. Job values are encoded with
+    the configured codec and jobs stored by previous versions or with another codec are converted on their first
+    update. Every change increments the session version and is published to the session events channel within the same
+    round trip as the change itself.
+    """
+
+    expire = 24
+
+    def __init__(self, redis: Redis, codec: Codec | None = None) -> None:
+        super().__init__(redis)
+        settings = get_settings()
+        self.scripts = SessionJobScripts(redis)
+        self.codec = codec or get_codec(settings.REDIS_CODEC)
+        self.history_max_length = settings.TASK_HISTORY_MAX_LENGTH if settings.TASK_HISTORY_ENABLED else 0
+        self.history_max_age = settings.TASK_HISTORY_MAX_AGE
+
+    @staticmethod
+    def get_index_key(session_id: str) -> str:
+        """Return key of the sorted set indexing jobs of the session."""
+        return f'dataaction:index:{session_id}'
+
+    @staticmethod
+    def get_version_key(session_id: str) -> str:
+        """Return key of the counter incremented on every change of the session jobs."""
+        return f'dataaction:version:{session_id}'
+
+    @staticmethod
+    def get_stats_prefixes(session_id: str, code: str) -> list[str]:
+        """Return key prefixes of the stats buckets counting jobs of the session and of the project code."""
+        return [f'dataaction:stats:session:{session_id}:', f'dataaction:stats:code:{code}:']
+
+    @staticmethod
+    def get_stats_group(label: str, code: str, action: str) -> str:
+        """Return beginning of the stats field up to the status for jobs with the label, code and action."""
+        return '[' + ''.join(f'{json.dumps(value)},' for value in [label, code, action])
+
+    @staticmethod
+    def get_history_key(key: str | bytes) -> str:
+        """Return key of the stream with status changes of the job."""
+        if isinstance(key, bytes):
+            key = key.decode()
+        return f'dataaction:history:{key.removeprefix("dataaction:")}'
+
+    @staticmethod
+    def get_events_channel(session_id: str) -> str:
+        """Return channel where changes of the session jobs are published."""
+        return f'dataaction:events:{session_id}'
+
+    @staticmethod
+    def build_event(event_type: str, **data: Any) -> str:
+        """Return JSON encoded job change event."""
+        return json.dumps({'type': event_type, **data})
+
+    @staticmethod
+    def parse_job_key(key: bytes) -> dict:
+        """Return job identity fields from the job key."""
+        _, *values = key.decode().split(':', 7)
+        return dict(zip(['session_id', 'label', 'job_id', 'action', 'code', 'operator', 'source'], values))
+
+    @staticmethod
+    def is_job_key(key: bytes) -> bool:
+        """Check if the key holds a job record rather than an index, a counter or a history of the jobs."""
+        return key.count(b':') >= 7 and not key.startswith(b'dataaction:history:')
+
+    @staticmethod
+    def get_job_pattern(session_id: str, label: str, job_id: str, action: str, code: str, operator: str) -> str:
+        """Return pattern matching keys of the session jobs."""
+        return f'dataaction:{session_id}:{label}:{job_id}:{action}:{code}:{operator}:*'
+
+    def encode_value(self, name: str, value: Any) -> bytes | str:
+        """Return value of the job field encoded for the hash.
+
+        Values read by scripts are JSON encoded regardless of the codec.
+        """
+        return json.dumps(value) if name in JSON_FIELDS else self.codec.encode(value)
+
+    def encode_payload(self, payload: dict) -> dict[str, bytes]:
+        """Return hash fields for the payload entries with values encoded by the codec."""
+        return {f'{PAYLOAD_FIELD_PREFIX}{key}': self.codec.encode(value) for key, value in payload.items()}
+
+    def encode_job(self, job: dict) -> dict[str, bytes | str]:
+        """Return hash fields with short names and encoded values for the job record.
+
+        Identity fields of the job are not stored, since they are part of the job key.
+        """
+        fields = {FORMAT_FIELD: self.codec.name}
+        for name, field in JOB_FIELDS.items():
+            fields[field] = self.encode_value(name, job[name])
+        return fields | self.encode_payload(job['payload'])
+
+    def decode_job(self, key: bytes, record: dict[bytes, bytes] | bytes) -> dict:
+        """Return job record from hash fields or from hash fields and JSON string stored by previous versions."""
+        if isinstance(record, bytes):
+            return json.loads(record.decode('utf-8'))
+
+        format_name = record.get(FORMAT_FIELD.encode())
+        if format_name is None:
+            return self.decode_legacy_job(record)
+
+        codec = get_codec(format_name)
+        names = {field.encode(): name for name, field in JOB_FIELDS.items()}
+        job = self.parse_job_key(key)
+        payload = {}
+        for field, value in record.items():
+            if field in names:
+                name = names[field]
+                job[name] = json.loads(value) if name in JSON_FIELDS else codec.decode(value)
+            elif field.startswith(PAYLOAD_FIELD_PREFIX.encode()):
+                payload[field.decode().removeprefix(PAYLOAD_FIELD_PREFIX)] = codec.decode(value)
+        job['payload'] = payload
+        return job
+
+    @staticmethod
+    def decode_legacy_job(record: dict[bytes, bytes]) -> dict:
+        """Return job record from hash fields with full names and JSON encoded values stored by previous versions."""
+        job = {}
+        payload = {}
+        for key, value in record.items():
+            key = key.decode()
+            if key.startswith(LEGACY_PAYLOAD_FIELD_PREFIX):
+                payload[key.removeprefix(LEGACY_PAYLOAD_FIELD_PREFIX)] = json.loads(value)
+            else:
+                job[key] = json.loads(value)
+        job['payload'] = payload
+        return job
 
     async def get_job(
         self,
@@ -29,12 +186,72 @@ class SessionJobCRUD(RedisCRUD):
         sorting: bool | None = False,
     ) -> list:
         """Get job records in Redis for a respective session."""
-        key = f'dataaction:{session_id}:{label}:{job_id}:{action}:{code}:{operator}'
-        value = await self.mget_by_prefix(key)
-        value_decode = [json.loads(record.decode('utf-8')) for record in value] if value else []
+        value_decode, _ = await self.get_job_page(session_id, label, job_id, code, action, operator)
         session_jobs = sort_by_update_time(value_decode) if sorting else value_decode
         return session_jobs
 
+    async def get_job_page(
+        self,
+        session_id: str,
+        label: str,
+        job_id: str,
+        code: str,
+        action: str,
+        operator: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        since_timestamp: int | None = None,
+    ) -> tuple[list, str | None]:
+        """Get page of job records for a respective session in descending update time order with the next page cursor.
+
+        Jobs are read from the session index ordered by update time, so only the requested page is retrieved.
+        """
+        pattern = self.get_job_pattern(session_id, label, job_id, action, code, operator)
+        min_score = since_timestamp if since_timestamp is not None else '-inf'
+        records, next_cursor = await self.hgetall_by_index(
+            self.get_index_key(session_id), pattern, limit, cursor, min_score
+        )
+        value_decode = [self.decode_job(key, record) for key, record in records]
+        return value_decode, next_cursor
+
+    async def backfill_indexes(self, batch_size: int = 500) -> int:
+        """Add jobs stored by previous versions, which did not index jobs, to the indexes of their sessions.
+
+        The keyspace is scanned only once, the marker of the finished backfill never expires. Jobs stored by previous
+        versions are expired before another backfill could be needed. Returns the number of jobs added to the indexes.
+        """
+        if await self.get_by_key(INDEX_BACKFILL_KEY) is not None:
+            return 0
+
+        added_count = 0
+        async for keys in self.scan_batches_by_pattern('dataaction:*', batch_size):
+            added_count += await self.index_jobs([key for key in keys if self.is_job_key(key)])
+
+        await self.set_by_key(INDEX_BACKFILL_KEY, str(added_count), expire=None)
+        if added_count:
+            logger.info(f'Added {added_count} jobs stored by previous versions to session indexes')
+        return added_count
+
+    async def index_jobs(self, keys: list[bytes]) -> int:
+        """Add existing jobs missing in the indexes of their sessions and return the number of added jobs."""
+        if not keys:
+            return 0
+
+        records = await self.hgetall_by_keys(keys)
+        index_keys = set()
+        async with self.pipeline(transaction=False) as pipeline:
+            for key, record in zip(keys, records):
+                if not record:
+                    continue
+                index_key = self.get_index_key(self.parse_job_key(key)['session_id'])
+                score = int(self.decode_job(key, record)['update_timestamp'])
+                pipeline.zadd(index_key, {key: score}, nx=True)
+                index_keys.add(index_key)
+            for index_key in index_keys:
+                pipeline.expire(index_key, self.expire * 3600)
+            results = await pipeline.execute()
+        return sum(results[: len(results) - len(index_keys)])
+
     async def check_job_id(self, entry: BaseSchema):
         """Verifies if job_id already exists for respective session."""
         job = entry.dict()
@@ -45,8 +262,9 @@ class SessionJobCRUD(RedisCRUD):
             logger.exception(f'Job id already exists: {job["job_id"]}')
             raise AlreadyExists()
 
-    async def set_job(self, entry: BaseSchema | dict) -> dict:
-        """Create new or update existing job record (key,value) in Redis for a respective session."""
+    @staticmethod
+    def build_job(entry: BaseSchema | dict) -> tuple[str, dict]:
+        """Return key and record of the job."""
 
         job = dict(entry)
         key = (
@@ -74,10 +292,219 @@ class SessionJobCRUD(RedisCRUD):
             'payload': job['payload'],
             'update_timestamp': str(round(time.time())),
         }
-        my_value = json.dumps(value)
-        await self.set_by_key(key, my_value, 24)
+        return key, value
+
+    def queue_version_increment(self, pipeline: Pipeline, session_id: str) -> None:
+        """Queue commands incrementing the session version into the pipeline."""
+
+        version_key = self.get_version_key(session_id)
+        expire_time = self.expire * 3600
+        pipeline.set(version_key, round(time.time() * 1000), nx=True)
+        pipeline.incr(version_key)
+        pipeline.expire(version_key, expire_time)
+
+    def queue_change(self, pipeline: Pipeline, session_id: str, event: str) -> None:
+        """Queue commands incrementing the session version and publishing the change event into the pipeline."""
+
+        self.queue_version_increment(pipeline, session_id)
+        pipeline.publish(self.get_events_channel(session_id), event)
+
+    async def remove_from_index(self, index: str, keys: list[bytes]) -> None:
+        """Remove expired jobs from the session index and increment the session version, since the jobs are gone."""
+
+        async with self.pipeline(transaction=True) as pipeline:
+            pipeline.zrem(index, *keys)
+            self.queue_version_increment(pipeline, self.parse_job_key(keys[0])['session_id'])
+            await pipeline.execute()
+
+    def queue_stats_increment(self, pipeline: Pipeline, job: dict) -> None:
+        """Queue commands counting the job in the stats buckets of its update time into the pipeline."""
+
+        field = self.get_stats_group(job['label'], job['code'], job['action']) + json.dumps(job['status']) + ']'
+        bucket = int(job['update_timestamp']) // STATS_BUCKET_SIZE
+        for prefix in self.get_stats_prefixes(job['session_id'], job['code']):
+            stats_key = f'{prefix}{bucket}'
+            pipeline.hincrby(stats_key, field, 1)
+            pipeline.expireat(stats_key, (bucket + 1) * STATS_BUCKET_SIZE + self.expire * 3600)
+
+    def get_history_min_id(self) -> str:
+        """Return id of the oldest entry kept in job history streams."""
+        return str(round((time.time() - self.history_max_age) * 1000))
+
+    def queue_history_entry(self, pipeline: Pipeline, key: str, job: dict) -> None:
+        """Queue commands appending the job status to the job history stream into the pipeline when enabled."""
+
+        if not self.history_max_length:
+            return
+
+        history_key = self.get_history_key(key)
+        fields = {FORMAT_FIELD: self.codec.name}
+        for name in ['status', 'progress']:
+            fields[JOB_FIELDS[name]] = self.encode_value(name, job[name])
+        pipeline.xadd(history_key, fields, maxlen=self.history_max_length, approximate=False)
+        pipeline.xtrim(history_key, minid=self.get_history_min_id(), approximate=False)
+        pipeline.expire(history_key, self.expire * 3600)
+
+    async def get_stats(self, session_id: str | None = None, code: str | None = None) -> list[dict]:
+        """Return counts of existing jobs of the session or of the project code grouped by label, code, action and
+        status.
+
+        Only stats buckets of the expiration period are read, regardless of the number of jobs. When both the session
+        and the project code are given, counts of the session are limited to jobs of the project code.
+        """
+
+        prefix = self.get_stats_prefixes(session_id, code)[0 if session_id is not None else 1]
+        last_bucket = int(time.time()) // STATS_BUCKET_SIZE
+        first_bucket = last_bucket - self.expire * 3600 // STATS_BUCKET_SIZE
+        async with self.pipeline(transaction=False) as pipeline:
+            for bucket in range(first_bucket, last_bucket + 1):
+                pipeline.hgetall(f'{prefix}{bucket}')
+            buckets = await pipeline.execute()
+
+        counts = Counter()
+        for stats in buckets:
+            for field, count in stats.items():
+                counts[field] += int(count)
+
+        groups = []
+        for field, count in counts.items():
+            label, job_code, action, status = json.loads(field)
+            if count > 0 and (code is None or job_code == code):
+                groups.append({'label': label, 'code': job_code, 'action': action, 'status': status, 'count': count})
+        return groups
+
+    async def get_version(self, session_id: str) -> int | None:
+        """Return current version of the session jobs or None when the session has no jobs.
+
+        Index entries of jobs expired since their last update are dropped first and the version is incremented when
+        there were any, so clients holding the previous version do not keep the expired jobs.
+        """
+
+        async with self.pipeline(transaction=False) as pipeline:
+            expired_score = round(time.time()) - self.expire * 3600
+            pipeline.zremrangebyscore(self.get_index_key(session_id), '-inf', f'({expired_score}')
+            pipeline.get(self.get_version_key(session_id))
+            expired_count, version = await pipeline.execute()
+        if expired_count:
+            async with self.pipeline(transaction=True) as pipeline:
+                self.queue_version_increment(pipeline, session_id)
+                _, version, _ = await pipeline.execute()
+        return int(version) if version is not None else None
+
+    async def set_job(self, entry: BaseSchema | dict) -> dict:
+        """Create new or update existing job record (key,value) in Redis for a respective session."""
+
+        key, value = self.build_job(entry)
+        async with self.pipeline(transaction=True) as pipeline:
+            self.queue_hset_with_index(
+                pipeline,
+                key,
+                self.encode_job(value),
+                self.get_index_key(value['session_id']),
+                int(value['update_timestamp']),
+                self.expire,
+            )
+            self.queue_stats_increment(pipeline, value)
+            self.queue_history_entry(pipeline, key, value)
+            self.queue_change(pipeline, value['session_id'], self.build_event('set', job=value))
+            await pipeline.execute()
         return value
 
+    async def create_jobs(self, entries: list[TaskSchema]) -> list[dict | ServiceException]:
+        """Create multiple jobs which do not exist yet and return created record or error for every job.
+
+        Existing jobs are looked up in a single round trip and all new jobs are written in another one.
+        """
+
+        lookups = [
+            (
+                self.get_index_key(entry.session_id),
+                self.get_job_pattern(
+                    entry.session_id, entry.label, entry.job_id, entry.action, entry.code, entry.operator
+                ),
+            )
+            for entry in entries
+        ]
+        existing_keys = await self.get_keys_by_indexes(lookups)
+
+        results = []
+        created_lookups = set()
+        async with self.pipeline(transaction=True) as pipeline:
+            for entry, lookup, keys in zip(entries, lookups, existing_keys):
+                if keys or lookup in created_lookups:
+                    logger.info(f'Job id already exists: {entry.job_id}')
+                    results.append(AlreadyExists())
+                    continue
+                created_lookups.add(lookup)
+
+                key, value = self.build_job(entry)
+                mapping = self.encode_job(value)
+                self.queue_hset_with_index(
+                    pipeline, key, mapping, lookup[0], int(value['update_timestamp']), self.expire
+                )
+                self.queue_stats_increment(pipeline, value)
+                self.queue_history_entry(pipeline, key, value)
+                self.queue_change(pipeline, entry.session_id, self.build_event('set', job=value))
+                results.append(value)
+
+            await pipeline.execute()
+
+        return results
+
+    def get_update_args(
+        self, key: bytes, payload: dict, status: str, progress: int, expected_status: str | None = None
+    ) -> list[str | int]:
+        """Return arguments of the update script for the job key."""
+
+        update_timestamp = round(time.time())
+        fields = self.encode_payload(payload)
+        job = self.parse_job_key(key) | {
+            'status': status,
+            'progress': progress,
+            'update_timestamp': str(update_timestamp),
+        }
+        return [
+            self.encode_value('status', expected_status) if expected_status is not None else '',
+            self.encode_value('status', status),
+            self.encode_value('progress', progress),
+            self.encode_value('update_timestamp', str(update_timestamp)),
+            update_timestamp,
+            self.expire * 3600,
+            self.get_events_channel(job['session_id']),
+            self.build_event('updated', job=job, add_payload=payload),
+            round(time.time() * 1000),
+            self.codec.name,
+            self.get_stats_group(job['label'], job['code'], job['action']),
+            self.history_max_length,
+            self.get_history_min_id(),
+            *(item for field in fields.items() for item in field),
+        ]
+
+    def get_update_keys(self, key: bytes) -> list[str | bytes]:
+        """Return keys of the update script for the job key."""
+
+        job = self.parse_job_key(key)
+        return [
+            key,
+            self.get_index_key(job['session_id']),
+            self.get_version_key(job['session_id']),
+            *self.get_stats_prefixes(job['session_id'], job['code']),
+            self.get_history_key(key),
+        ]
+
+    def get_update_result(self, key: bytes | None, job_id: str, result: list) -> dict:
+        """Return updated job record from the update script result or raise respective error."""
+
+        if result[0] == 0:
+            logger.exception(f'Job id not found: {job_id}')
+            raise NotFound()
+        if result[0] == -1:
+            logger.info(f'Job status does not match the expected status: {job_id}')
+            raise Conflict()
+
+        record = dict(zip(result[1][::2], result[1][1::2]))
+        return self.decode_job(key, record)
+
     async def update_job(
         self,
         session_id: str,
@@ -89,31 +516,249 @@ class SessionJobCRUD(RedisCRUD):
         payload: dict,
         status: str,
         progress: int,
+        expected_status: str | None = None,
     ) -> dict:
-        """Update existing job for a respective session."""
-        retrieved_job = await self.get_job(session_id, label, job_id, code, action, operator)
-        if not retrieved_job:
+        """Update status, progress and merge payload of existing job for a respective session.
+
+        When the expected status is set, the job is only updated if its current status matches.
+        """
+        index_key = self.get_index_key(session_id)
+        keys, _ = await self.get_keys_by_index(
+            index_key, self.get_job_pattern(session_id, label, job_id, action, code, operator), limit=1
+        )
+        if not keys:
             logger.exception(f'Job id not found: {job_id}')
             raise NotFound()
-        job = retrieved_job[0]
-        for key, value in payload.items():
-            payload[key] = value
-        job['target_status'] = status
-        job['progress'] = progress
-        updated_job = await self.set_job(job)
-        return updated_job
-
-    async def delete_job(self, entry: BaseSchema) -> list:
-        """Delete existing job for a respective session."""
-        job = entry.dict()
-        key = (
-            f'dataaction'
-            f':{job["session_id"]}'
-            f':{job["label"]}'
-            f':{job["job_id"]}'
-            f':{job["action"]}'
-            f':{job["code"]}'
-            f':{job["operator"]}'
+
+        args = self.get_update_args(keys[0], payload, status, progress, expected_status)
+        script_keys = self.get_update_keys(keys[0])
+        result = await self.scripts.update(keys=script_keys, args=args)
+        if result[0] == -2:
+            await self.convert_legacy_job(keys[0])
+            result = await self.scripts.update(keys=script_keys, args=args)
+
+        return self.get_update_result(keys[0], job_id, result)
+
+    async def update_jobs(self, entries: list[TaskUpdateSchema]) -> list[dict | ServiceException]:
+        """Update multiple jobs and return updated record or error for every job.
+
+        Jobs are looked up in a single round trip and all update scripts are sent in another one.
+        """
+
+        lookups = [
+            (
+                self.get_index_key(entry.session_id),
+                self.get_job_pattern(entry.session_id, entry.label, entry.job_id, '*', '*', '*'),
+            )
+            for entry in entries
+        ]
+        job_keys = await self.get_keys_by_indexes(lookups)
+
+        async with self.pipeline(transaction=False) as pipeline:
+            for entry, (index_key, _), keys in zip(entries, lookups, job_keys):
+                if keys:
+                    args = self.get_update_args(
+                        keys[0], entry.add_payload, entry.status, entry.progress, entry.expected_status
+                    )
+                    await self.scripts.update(keys=self.get_update_keys(keys[0]), args=args, client=pipeline)
+            responses = iter(await pipeline.execute())
+
+        results = []
+        for entry, keys in zip(entries, job_keys):
+            try:
+                key, result = (keys[0], next(responses)) if keys else (None, [0])
+                if result[0] == -2:
+                    results.append(
+                        await self.update_job(
+                            entry.session_id,
+                            '*',
+                            '*',
+                            '*',
+                            entry.label,
+                            entry.job_id,
+                            entry.add_payload,
+                            entry.status,
+                            entry.progress,
+                            entry.expected_status,
+                        )
+                    )
+                else:
+                    results.append(self.get_update_result(key, entry.job_id, result))
+            except ServiceException as e:
+                results.append(e)
+
+        return results
+
+    async def convert_legacy_job(self, key: bytes) -> None:
+        """Convert job stored by previous versions or encoded with another codec into hash encoded with the codec.
+
+        Jobs stored as JSON strings were not counted in stats, so they are counted once converted. The job is converted
+        in a transaction watching the key, so concurrent conversions and changes of the job are not overwritten.
+        """
+
+        def convert(pipeline: Pipeline, record: dict[bytes, bytes] | bytes) -> dict[str, str] | None:
+            if not record or (
+                isinstance(record, dict) and record.get(FORMAT_FIELD.encode()) == self.codec.name.encode()
+            ):
+                return None
+
+            job = self.decode_job(key, record)
+            if isinstance(record, bytes):
+                self.queue_stats_increment(pipeline, job)
+            return self.encode_job(job)
+
+        await self.convert_to_hash(key, convert)
+
+    async def delete_job(self, entry: BaseSchema) -> int:
+        """Delete existing job for a respective session and return number of deleted jobs."""
+        value = await self.delete_jobs([entry])
+        return value[0]
+
+    async def detach_job(self, entry: BaseSchema) -> list[bytes]:
+        """Remove existing job for a respective session from the session index and return keys to unlink later.
+
+        Jobs are not visible anymore once they are removed from the index.
+        """
+        keys = await self.remove_jobs([entry], unlink=False)
+        return keys[0]
+
+    async def unlink_jobs(self, keys: list[bytes]) -> int:
+        """Unlink detached jobs with their history."""
+        return await self.unlink_by_keys([*keys, *(self.get_history_key(key) for key in keys)])
+
+    async def get_job_history(
+        self, session_id: str, label: str, job_id: str, code: str, action: str, operator: str
+    ) -> list[dict]:
+        """Return status changes of existing jobs for a respective session, the oldest change first.
+
+        Histories of all matching jobs are read in a single round trip.
+        """
+        keys, _ = await self.get_keys_by_index(
+            self.get_index_key(session_id), self.get_job_pattern(session_id, label, job_id, action, code, operator)
         )
-        value = await self.mdele_by_prefix(key)
-        return value
+        if not keys:
+            return []
+
+        async with self.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.xrange(self.get_history_key(key))
+            histories = await pipeline.execute()
+
+        return [
+            self.parse_job_key(key) | {'history': [self.decode_history_entry(*entry) for entry in entries]}
+            for key, entries in zip(keys, histories)
+        ]
+
+    @staticmethod
+    def decode_history_entry(entry_id: bytes, fields: dict[bytes, bytes]) -> dict:
+        """Return status change of the job from the job history stream entry."""
+        codec = get_codec(fields[FORMAT_FIELD.encode()])
+        entry_id = entry_id.decode()
+        return {
+            'entry_id': entry_id,
+            'status': json.loads(fields[JOB_FIELDS['status'].encode()]),
+            'progress': codec.decode(fields[JOB_FIELDS['progress'].encode()]),
+            'update_timestamp': str(int(entry_id.partition('-')[0]) // 1000),
+        }
+
+    def build_deleted_event(self, job: dict, deleted_count: int) -> str:
+        """Return event of deleting jobs matching the filter fields of the job."""
+        job_filter = {field: job[field] for field in ['label', 'job_id', 'action', 'code', 'operator']}
+        return self.build_event('deleted', filter=job_filter, deleted_count=deleted_count)
+
+    async def listen_events(
+        self, request: Request, session_id: str, request_timeout: int | None = None
+    ) -> AsyncIterator[str]:
+        """Yield change events of the session jobs until client disconnects or the request times out.
+
+        Events are awaited with a blocking read of the subscription, while client disconnect is watched separately and
+        interrupts waiting.
+        """
+
+        request_start_time = time.time()
+        async with self.pubsub() as pubsub:
+            await pubsub.subscribe(self.get_events_channel(session_id))
+            disconnect_watcher = asyncio.create_task(watch_disconnect(request))
+            message_read = None
+            try:
+                while True:
+                    timeout = request_start_time + request_timeout - time.time() if request_timeout else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    message_read = asyncio.create_task(pubsub.get_message(ignore_subscribe_messages=True, timeout=None))
+                    await asyncio.wait(
+                        {message_read, disconnect_watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if disconnect_watcher.done() or not message_read.done():
+                        break
+                    message = message_read.result()
+                    if message:
+                        yield message['data'].decode()
+            finally:
+                disconnect_watcher.cancel()
+                if message_read is not None:
+                    message_read.cancel()
+                    await asyncio.gather(message_read, return_exceptions=True)
+                logger.info('Disconnected from client (via disconnect/timeout)')
+
+    async def get_events_with_sse(
+        self, request: Request, session_id: str, request_timeout: int | None = None
+    ) -> EventSourceResponse:
+        """Stream change events of the session jobs over SSE."""
+        return EventSourceResponse(
+            self.listen_events(request, session_id, request_timeout), ping=get_settings().SSE_PING_INTERVAL
+        )
+
+    async def delete_jobs(self, entries: list[TaskDeleteSchema]) -> list[int]:
+        """Delete multiple jobs and return number of deleted records for every entry."""
+
+        keys = await self.remove_jobs(entries)
+        return [len(entry_keys) for entry_keys in keys]
+
+    async def remove_jobs(self, entries: list[BaseSchema], unlink: bool = True) -> list[list[bytes]]:
+        """Remove jobs of multiple entries from the session index and the stats and return their keys.
+
+        Jobs are looked up in a single round trip and all of them are removed in another one. Removal scripts and
+        unlinks are sent in batches of keys, so no single command holds Redis for long. Records are unlinked with their
+        history as well unless they are left to be unlinked later.
+        """
+
+        jobs = [entry.dict() for entry in entries]
+        lookups = [
+            (
+                self.get_index_key(job['session_id']),
+                self.get_job_pattern(
+                    job['session_id'], job['label'], job['job_id'], job['action'], job['code'], job['operator']
+                ),
+            )
+            for job in jobs
+        ]
+        job_keys = await self.get_keys_by_indexes(lookups)
+
+        results = []
+        removed_keys = set()
+        async with self.pipeline(transaction=False) as pipeline:
+            for job, (index_key, _), keys in zip(jobs, lookups, job_keys):
+                keys = [key for key in keys if key not in removed_keys]
+                removed_keys.update(keys)
+                if keys:
+                    for i in range(0, len(keys), REMOVE_BATCH_SIZE):
+                        await self.queue_remove(pipeline, index_key, job['session_id'], keys[i : i + REMOVE_BATCH_SIZE])
+                    if unlink:
+                        self.queue_unlink(pipeline, [*keys, *(self.get_history_key(key) for key in keys)])
+                    self.queue_change(pipeline, job['session_id'], self.build_deleted_event(job, len(keys)))
+                results.append(keys)
+
+            await pipeline.execute()
+
+        return results
+
+    async def queue_remove(self, pipeline: Pipeline, index_key: str, session_id: str, keys: list[bytes]) -> None:
+        """Queue the script removing the jobs from the session index and the stats into the pipeline."""
+
+        args = [self.expire * 3600, self.get_stats_prefixes(session_id, '')[0]]
+        for key in keys:
+            key_job = self.parse_job_key(key)
+            args.append(self.get_stats_prefixes(session_id, key_job['code'])[1])
+            args.append(self.get_stats_group(key_job['label'], key_job['code'], key_job['action']))
+        await self.scripts.remove(keys=[index_key, *keys], args=args, client=pipeline)
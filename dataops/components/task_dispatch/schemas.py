@@ -45,6 +45,7 @@ class TaskUpdateSchema(BaseSchema):
     status: str
     add_payload: dict = {}
     progress: int = 0
+    expected_status: str | None = None
 
 
 class TaskResponseSchema(BaseModel):
@@ -53,13 +54,79 @@ class TaskResponseSchema(BaseModel):
     task_status: str = 'SUCCEED'
 
 
+class TaskDeleteResponseSchema(TaskResponseSchema):
+    """Response schema for deleting session jobs."""
+
+    deleted_count: int = 0
+
+
 class TaskRetrieveResponseSchema(BaseModel):
     """Response schema for retrieving session job info."""
 
     task_info: list = []
+    next_cursor: str | None = None
+
+
+class TaskAggregateGroupSchema(BaseModel):
+    """Response schema for number of session jobs in a single group."""
+
+    label: str
+    code: str
+    action: str
+    status: str
+    count: int
+
+
+class TaskAggregateResponseSchema(BaseModel):
+    """Response schema for aggregating session jobs."""
+
+    groups: list[TaskAggregateGroupSchema] = []
+
+
+class TaskHistoryEntrySchema(BaseModel):
+    """Response schema for single status change of session job."""
+
+    entry_id: str
+    status: str
+    progress: int
+    update_timestamp: str
+
+
+class TaskHistorySchema(BaseModel):
+    """Response schema for status changes of single session job."""
+
+    session_id: str
+    label: str
+    job_id: str
+    action: str
+    code: str
+    operator: str
+    source: str
+    history: list[TaskHistoryEntrySchema] = []
+
+
+class TaskHistoryResponseSchema(BaseModel):
+    """Response schema for retrieving status changes of session jobs."""
+
+    task_history: list[TaskHistorySchema] = []
 
 
 class TaskUpdateResponseSchema(BaseModel):
     """Response schema for updating session job info."""
 
     task_info: dict = {}
+
+
+class TaskBulkResultSchema(BaseModel):
+    """Response schema for result of single session job in bulk operation."""
+
+    job_id: str
+    task_status: str = 'SUCCEED'
+    task_info: dict = {}
+    error: dict[str, str] | None = None
+
+
+class TaskBulkResponseSchema(BaseModel):
+    """Response schema for bulk operation on session jobs."""
+
+    results: list[TaskBulkResultSchema]
@@ -0,0 +1,162 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+from redis.asyncio.client import Redis
+from redis.commands.core import AsyncScript
+
+FORMAT_FIELD = 'f'
+PAYLOAD_FIELD_PREFIX = 'p.'
+JOB_FIELDS = {'task_id': 'ti', 'status': 'st', 'progress': 'pr', 'update_timestamp': 'ts'}
+JSON_FIELDS = ['status', 'update_timestamp']
+STATS_BUCKET_SIZE = 3600
+
+# Jobs are stored as hashes with short field names, where every payload entry is stored in a separate
+# "<PAYLOAD_FIELD_PREFIX><name>" field, so the payload can be merged without decoding the job. Identity fields of the
+# job are not stored, since they are part of the job key. Values are encoded with the codec named in the FORMAT_FIELD,
+# except for JSON_FIELDS which are read by scripts and stay JSON encoded. Hashes without the FORMAT_FIELD are stored by
+# previous versions with full field names and JSON encoded values.
+#
+# Every change of session jobs increments the session version. A new version counter starts at the current time in
+# milliseconds, so versions keep increasing even after the counter expires together with all jobs of the session.
+#
+# Jobs are counted in hashes per session and per project code, one for every hour of the job update time, where the
+# field is the JSON array of label, code, action and status of the job. A bucket expires when all jobs counted in it
+# would expire, so summing up buckets of the expiration period gives counts of existing jobs. Scripts receive the
+# stats group, the beginning of the field up to the status, since label, code and action are not stored in the job.
+#
+# When enabled, every status change of the job is appended to the job history stream as an entry with the codec name,
+# status and progress in FORMAT_FIELD and JOB_FIELDS. The stream is capped by length and by age of entries.
+STATS_FUNCTIONS = (
+    f'''
+local STATS_BUCKET_SIZE = {STATS_BUCKET_SIZE}
+local FORMAT_FIELD = '{FORMAT_FIELD}'
+local STATUS_FIELD = '{JOB_FIELDS['status']}'
+local PROGRESS_FIELD = '{JOB_FIELDS['progress']}'
+local TIMESTAMP_FIELD = '{JOB_FIELDS['update_timestamp']}'
+'''
+    + '''
+local function get_stats_field(key, group)
+    local fields = {STATUS_FIELD, TIMESTAMP_FIELD}
+    if redis.call('HEXISTS', key, FORMAT_FIELD) == 0 then
+        fields = {'status', 'update_timestamp'}
+    end
+    local values = redis.call('HMGET', key, fields[1], fields[2])
+    local field = group .. values[1] .. ']'
+    local bucket = math.floor(tonumber(string.sub(values[2], 2, -2)) / STATS_BUCKET_SIZE)
+    return field, bucket
+end
+
+local function change_stats(key, group, prefixes, delta, expire)
+    local field, bucket = get_stats_field(key, group)
+    local expire_at = string.format('%d', (bucket + 1) * STATS_BUCKET_SIZE + tonumber(expire))
+    for _, prefix in ipairs(prefixes) do
+        local stats_key = prefix .. string.format('%d', bucket)
+        redis.call('HINCRBY', stats_key, field, delta)
+        redis.call('EXPIREAT', stats_key, expire_at)
+    end
+end
+'''
+)
+
+# Update status, progress and payload fields of the job in KEYS[1], move it in the session index KEYS[2], increment
+# the session version KEYS[3], move the job between stats buckets with the session and code prefixes KEYS[4] and
+# KEYS[5] and append the status change to the job history stream KEYS[6].
+#
+# ARGV: expected status ('' to skip the check), status, progress, update timestamp, index score, expiration in
+# seconds, events channel and event published there once the job is updated, current time in milliseconds, codec
+# name, stats group, maximum length of the history ('0' to disable the history), minimum id of history entries,
+# followed by payload field and value pairs. Values are encoded by the caller.
+#
+# Returns {1, <job fields and values>} when updated, {0} when the job does not exist, {-1} when the current status
+# does not match the expected one and {-2} when the job is not stored in the format of the codec.
+UPDATE = (
+    STATS_FUNCTIONS
+    + '''
+local key_type = redis.call('TYPE', KEYS[1])['ok']
+if key_type == 'none' then
+    return {0}
+end
+if key_type ~= 'hash' or redis.call('HGET', KEYS[1], FORMAT_FIELD) ~= ARGV[10] then
+    return {-2}
+end
+
+local previous_status = redis.call('HGET', KEYS[1], STATUS_FIELD)
+if ARGV[1] ~= '' and previous_status ~= ARGV[1] then
+    return {-1}
+end
+
+local stats_prefixes = {KEYS[4], KEYS[5]}
+change_stats(KEYS[1], ARGV[11], stats_prefixes, -1, ARGV[6])
+redis.call('HSET', KEYS[1], STATUS_FIELD, ARGV[2], PROGRESS_FIELD, ARGV[3], TIMESTAMP_FIELD, ARGV[4])
+for i = 14, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+change_stats(KEYS[1], ARGV[11], stats_prefixes, 1, ARGV[6])
+
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('ZADD', KEYS[2], ARGV[5], KEYS[1])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+redis.call('SET', KEYS[3], ARGV[9], 'NX')
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[6])
+redis.call('PUBLISH', ARGV[7], ARGV[8])
+
+if ARGV[12] ~= '0' and previous_status ~= ARGV[2] then
+    redis.call(
+        'XADD', KEYS[6], 'MAXLEN', ARGV[12], '*',
+        FORMAT_FIELD, ARGV[10], STATUS_FIELD, ARGV[2], PROGRESS_FIELD, ARGV[3]
+    )
+    redis.call('XTRIM', KEYS[6], 'MINID', ARGV[13])
+    redis.call('EXPIRE', KEYS[6], ARGV[6])
+end
+
+return {1, redis.call('HGETALL', KEYS[1])}
+'''
+)
+
+# Remove jobs in KEYS[2..] from the session index KEYS[1] and from stats buckets. Records are left to be unlinked by
+# the caller, so a single call does not have to free all of them.
+#
+# ARGV: expiration in seconds, session stats prefix, followed by code stats prefix and stats group of every job.
+#
+# Returns the number of removed jobs.
+REMOVE = (
+    STATS_FUNCTIONS
+    + '''
+local removed_count = 0
+for i = 2, #KEYS do
+    local key_type = redis.call('TYPE', KEYS[i])['ok']
+    if redis.call('ZREM', KEYS[1], KEYS[i]) == 1 and key_type ~= 'none' then
+        removed_count = removed_count + 1
+        if key_type == 'hash' then
+            change_stats(KEYS[i], ARGV[2 * i], {ARGV[2], ARGV[2 * i - 1]}, -1, ARGV[1])
+        end
+    end
+end
+
+return removed_count
+'''
+)
+
+
+class SessionJobScripts:
+    """Lua scripts updating session jobs atomically on the Redis side."""
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+
+        self.update = self.redis.register_script(UPDATE)
+        self.remove = self.redis.register_script(REMOVE)
+
+    @property
+    def scripts(self) -> list[AsyncScript]:
+        return [self.update, self.remove]
+
+    async def load(self) -> None:
+        """Load all scripts into the Redis script cache."""
+
+        for script in self.scripts:
+            script.sha = await self.redis.script_load(script.script)
@@ -4,12 +4,28 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+from http import HTTPStatus
+
 from fastapi import APIRouter
+from fastapi import BackgroundTasks
 from fastapi import Depends
+from fastapi import Header
+from fastapi import Query
+from fastapi import Request
+from fastapi import Response
+from pydantic import conlist
+from sse_starlette.sse import EventSourceResponse
 
+from dataops.components.exceptions import InvalidInput
+from dataops.components.exceptions import ServiceException
 from dataops.components.task_dispatch.crud import SessionJobCRUD
 from dataops.components.task_dispatch.dependencies import get_session_job_crud
+from dataops.components.task_dispatch.schemas import TaskAggregateResponseSchema
+from dataops.components.task_dispatch.schemas import TaskBulkResponseSchema
+from dataops.components.task_dispatch.schemas import TaskBulkResultSchema
+from dataops.components.task_dispatch.schemas import TaskDeleteResponseSchema
 from dataops.components.task_dispatch.schemas import TaskDeleteSchema
+from dataops.components.task_dispatch.schemas import TaskHistoryResponseSchema
 from dataops.components.task_dispatch.schemas import TaskResponseSchema
 from dataops.components.task_dispatch.schemas import TaskRetrieveResponseSchema
 from dataops.components.task_dispatch.schemas import TaskSchema
@@ -18,6 +34,30 @@ from dataops.components.task_dispatch.schemas import TaskUpdateSchema
 
 router = APIRouter(prefix='/tasks', tags=['Task Dispatch'])
 
+BULK_MAX_ITEMS = 1000
+
+
+def is_etag_matching(if_none_match: str | None, etag: str) -> bool:
+    """Return true if the If-None-Match header value matches the ETag."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in tags or etag in tags
+
+
+def get_bulk_response(job_ids: list[str], results: list[dict | ServiceException]) -> TaskBulkResponseSchema:
+    """Return bulk response with the job record or the error for every job."""
+    return TaskBulkResponseSchema(
+        results=[
+            (
+                TaskBulkResultSchema(job_id=job_id, task_status='FAILED', error=result.dict())
+                if isinstance(result, ServiceException)
+                else TaskBulkResultSchema(job_id=job_id, task_info=result)
+            )
+            for job_id, result in zip(job_ids, results)
+        ]
+    )
+
 
 @router.post('/', response_model=TaskResponseSchema, summary='Asynchronized Task Management API, Create a new task')
 async def post(data: TaskSchema, session_crud: SessionJobCRUD = Depends(get_session_job_crud)) -> TaskResponseSchema:
@@ -32,35 +72,170 @@ async def post(data: TaskSchema, session_crud: SessionJobCRUD = Depends(get_sess
 )
 async def get(
     session_id,
+    response: Response,
     label='Container',
     job_id='*',
     code='*',
     action='*',
     operator='*',
+    limit: int | None = Query(default=None, gt=0, le=1000),
+    cursor: str | None = None,
+    since_timestamp: int | None = None,
+    if_none_match: str | None = Header(default=None),
     session_crud: SessionJobCRUD = Depends(get_session_job_crud),
-) -> TaskRetrieveResponseSchema:
-    """Retrieve job info for a given session."""
-    fetched = await session_crud.get_job(session_id, label, job_id, code, action, operator, sorting=True)
-    response = TaskRetrieveResponseSchema(task_info=fetched)
-    return response
+) -> TaskRetrieveResponseSchema | Response:
+    """Retrieve job info for a given session starting from the most recently updated.
+
+    When the limit is set, pass the returned next cursor to retrieve the next page. The response carries the session
+    version as ETag, and 304 is returned without reading any job when the If-None-Match header holds the current one.
+    """
+    version = await session_crud.get_version(session_id)
+    if version is not None:
+        etag = f'"{version}"'
+        if is_etag_matching(if_none_match, etag):
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers={'ETag': etag})
+        response.headers['ETag'] = etag
+
+    fetched, next_cursor = await session_crud.get_job_page(
+        session_id, label, job_id, code, action, operator, limit, cursor, since_timestamp
+    )
+    return TaskRetrieveResponseSchema(task_info=fetched, next_cursor=next_cursor)
 
 
-@router.delete('/', response_model=TaskResponseSchema, summary='Asynchronized Task Management API, Delete tasks')
+@router.get(
+    '/history',
+    response_model=TaskHistoryResponseSchema,
+    summary='Asynchronized Task Management API, Get task status changes',
+)
+async def get_history(
+    session_id: str,
+    job_id: str,
+    label: str = 'Container',
+    code: str = '*',
+    action: str = '*',
+    operator: str = '*',
+    session_crud: SessionJobCRUD = Depends(get_session_job_crud),
+) -> TaskHistoryResponseSchema:
+    """Retrieve timeline of status changes with progress for jobs of a given session, the oldest change first.
+
+    Status changes are recorded only when the task history is enabled and are kept for a limited number and time.
+    """
+    task_history = await session_crud.get_job_history(session_id, label, job_id, code, action, operator)
+    return TaskHistoryResponseSchema(task_history=task_history)
+
+
+@router.get('/events', summary='Asynchronized Task Management API, Stream task changes over SSE')
+async def get_events(
+    request: Request,
+    session_id: str,
+    request_timeout: int | None = Query(default=None, gt=0),
+    session_crud: SessionJobCRUD = Depends(get_session_job_crud),
+) -> EventSourceResponse:
+    """Stream changes of jobs for a given session over SSE.
+
+    Every event holds its type ("set", "updated" or "deleted") with the changed job fields, so clients can retrieve
+    the job list once and then apply only the changes.
+    """
+    return await session_crud.get_events_with_sse(request, session_id, request_timeout)
+
+
+@router.get(
+    '/aggregate',
+    response_model=TaskAggregateResponseSchema,
+    summary='Asynchronized Task Management API, Count tasks by label, code, action and status',
+)
+async def get_aggregate(
+    session_id: str | None = None,
+    code: str | None = None,
+    session_crud: SessionJobCRUD = Depends(get_session_job_crud),
+) -> TaskAggregateResponseSchema:
+    """Count existing jobs of a given session or project code grouped by label, code, action and status.
+
+    Counts are maintained on every job change, so they are read without scanning the jobs. When both the session and
+    the project code are given, only jobs of the session with the project code are counted.
+    """
+    if session_id is None and code is None:
+        raise InvalidInput()
+
+    groups = await session_crud.get_stats(session_id=session_id, code=code)
+    return TaskAggregateResponseSchema(groups=groups)
+
+
+@router.delete('/', response_model=TaskDeleteResponseSchema, summary='Asynchronized Task Management API, Delete tasks')
 async def delete(
-    data: TaskDeleteSchema, session_crud: SessionJobCRUD = Depends(get_session_job_crud)
-) -> TaskResponseSchema:
-    """Delete job for a given session."""
-    await session_crud.delete_job(data)
-    return TaskResponseSchema()
+    data: TaskDeleteSchema,
+    background_tasks: BackgroundTasks,
+    asynchronous: bool = False,
+    session_crud: SessionJobCRUD = Depends(get_session_job_crud),
+) -> TaskDeleteResponseSchema:
+    """Delete job for a given session.
+
+    In asynchronous mode jobs are hidden immediately and their records are removed in the background after response.
+    """
+    if asynchronous:
+        keys = await session_crud.detach_job(data)
+        background_tasks.add_task(session_crud.unlink_jobs, keys)
+        return TaskDeleteResponseSchema(deleted_count=len(keys))
+
+    deleted_count = await session_crud.delete_job(data)
+    return TaskDeleteResponseSchema(deleted_count=deleted_count)
 
 
 @router.put('/', summary='Asynchronized Task Management API, Update tasks', response_model=TaskUpdateResponseSchema)
 async def put(
     data: TaskUpdateSchema, session_crud: SessionJobCRUD = Depends(get_session_job_crud)
 ) -> TaskUpdateResponseSchema:
-    """Update job info for a given session."""
+    """Update job info for a given session.
+
+    When the expected status is set, the job is only updated if its current status matches.
+    """
     job = await session_crud.update_job(
-        data.session_id, '*', '*', '*', data.label, data.job_id, data.add_payload, data.status, data.progress
+        data.session_id,
+        '*',
+        '*',
+        '*',
+        data.label,
+        data.job_id,
+        data.add_payload,
+        data.status,
+        data.progress,
+        data.expected_status,
     )
     response = TaskUpdateResponseSchema(task_info=job)
     return response
+
+
+@router.post(
+    '/bulk', response_model=TaskBulkResponseSchema, summary='Asynchronized Task Management API, Create multiple tasks'
+)
+async def bulk_post(
+    data: conlist(TaskSchema, min_items=1, max_items=BULK_MAX_ITEMS),
+    session_crud: SessionJobCRUD = Depends(get_session_job_crud),
+) -> TaskBulkResponseSchema:
+    """Create new jobs whose job_id does not exist for a given session and return result for every job."""
+    results = await session_crud.create_jobs(data)
+    return get_bulk_response([entry.job_id for entry in data], results)
+
+
+@router.put(
+    '/bulk', response_model=TaskBulkResponseSchema, summary='Asynchronized Task Management API, Update multiple tasks'
+)
+async def bulk_put(
+    data: conlist(TaskUpdateSchema, min_items=1, max_items=BULK_MAX_ITEMS),
+    session_crud: SessionJobCRUD = Depends(get_session_job_crud),
+) -> TaskBulkResponseSchema:
+    """Update info of multiple jobs and return result for every job."""
+    results = await session_crud.update_jobs(data)
+    return get_bulk_response([entry.job_id for entry in data], results)
+
+
+@router.delete(
+    '/bulk', response_model=TaskBulkResponseSchema, summary='Asynchronized Task Management API, Delete multiple tasks'
+)
+async def bulk_delete(
+    data: conlist(TaskDeleteSchema, min_items=1, max_items=BULK_MAX_ITEMS),
+    session_crud: SessionJobCRUD = Depends(get_session_job_crud),
+) -> TaskBulkResponseSchema:
+    """Delete jobs of multiple entries and return number of deleted jobs for every entry."""
+    results = await session_crud.delete_jobs(data)
+    return get_bulk_response([entry.job_id for entry in data], [{'deleted_count': count} for count in results])
@@ -9,15 +9,21 @@ import json
 from time import time
 
 from fastapi import Request
+from redis.asyncio.client import Redis
 from sse_starlette.sse import EventSourceResponse
 
+from dataops.components.codecs import Codec
+from dataops.components.codecs import get_codec
 from dataops.components.crud import RedisCRUD
+from dataops.components.sse import watch_disconnect
+from dataops.components.task_stream.hub import StreamHub
 from dataops.components.task_stream.parsing import StreamParser
 from dataops.components.task_stream.schemas import SSETaskStreamSchema
 from dataops.components.task_stream.schemas import TaskStreamCreateSchema
 from dataops.components.task_stream.schemas import TaskStreamDeleteSchema
+from dataops.components.task_stream.schemas import TaskStreamRangeResponseSchema
+from dataops.components.task_stream.schemas import TaskStreamRangeSchema
 from dataops.components.task_stream.schemas import TaskStreamResponseSchema
-from dataops.components.task_stream.schemas import TaskStreamRetrieveSchema
 from dataops.config import get_settings
 from dataops.logger import logger
 
@@ -27,6 +33,11 @@ settings = get_settings()
 class StreamCRUD(StreamParser, RedisCRUD):
     """Manages file status events with Redis streams."""
 
+    def __init__(self, redis: Redis, codec: Codec | None = None, legacy_format: bool | None = None) -> None:
+        super().__init__(redis)
+        self.codec = codec or get_codec(settings.REDIS_CODEC)
+        self.legacy_format = settings.TASK_STREAM_LEGACY_FORMAT if legacy_format is None else legacy_format
+
     async def create_status(self, data: TaskStreamCreateSchema) -> TaskStreamResponseSchema:
         """Writes file status to streams."""
         stream_data = data.to_payload()
@@ -34,58 +45,106 @@ class StreamCRUD(StreamParser, RedisCRUD):
         values = stream_data.copy()
         session_id = values['session_id']
         values.pop('session_id')
-        values['target_names'] = str(values['target_names'])
         try:
-            await self.streams_xadd(session_id, values, '*')
+            await self.streams_xadd(
+                session_id,
+                self.encode_file_status(values, self.codec, self.legacy_format),
+                '*',
+                **self.get_retention(),
+            )
         except Exception:
             logger.error('An exception occurred while performing writing file status to streams.')
             raise
 
         return TaskStreamResponseSchema(stream_info=stream_data, total=1)
 
-    async def get_status_with_sse(self, request: Request, params: SSETaskStreamSchema) -> EventSourceResponse:
-        """Retrieve file status events over SSE."""
+    @staticmethod
+    def get_block_timeout(request_start_time: float, request_timeout: int | None) -> int:
+        """Return milliseconds to wait for new events without exceeding the request timeout."""
+        block_timeout = settings.TASK_STREAM_BLOCK_TIMEOUT
+        if request_timeout:
+            time_left = request_start_time + request_timeout - time()
+            block_timeout = min(block_timeout, round(time_left * 1000))
+        return block_timeout
+
+    async def get_status_with_sse(
+        self, request: Request, params: SSETaskStreamSchema, hub: StreamHub
+    ) -> EventSourceResponse:
+        """Retrieve file status events over SSE.
+
+        New events are read from the stream by the hub shared with all other connections of the process and are
+        delivered as soon as they are written. Client disconnect is watched separately and interrupts waiting. Every
+        event carries the stream entry ID, so a reconnecting client can resume after the last received event.
+        """
 
-        async def event_generator() -> str:
+        async def event_generator() -> dict[str, str]:
             """Generate event from stream."""
             request_start_time = time()
-            redis_stream_offset = '0'
             logger.info(f'Handling request for session {params.session_id}')
-            while True:
-                time_elapsed = time() - request_start_time
-                timed_out = params.request_timeout and time_elapsed >= params.request_timeout
-                disconnected = await request.is_disconnected()
-                if disconnected or timed_out:
-                    logger.info('Disconnected from client (via disconnect/timeout)')
-                    break
-                else:
-                    try:
-                        redis_results = await self.streams_xread(params.session_id, redis_stream_offset)
-                    except Exception:
-                        logger.error('An exception occurred while retrieving status from stream.')
-                        raise
-                    if redis_results:
-                        file_statuses = self.parse_file_status(redis_results)
-                        redis_stream_offset = file_statuses[
-                            len(file_statuses) - 1
-                        ].entry_id  # keep last entry ID as new offset
+            disconnect_watcher = asyncio.create_task(watch_disconnect(request))
+            subscription_read = None
+            try:
+                async with hub.subscribe(params.session_id, params.from_id or '0') as subscription:
+                    while True:
+                        block_timeout = self.get_block_timeout(request_start_time, params.request_timeout)
+                        if block_timeout <= 0:
+                            break
+                        subscription_read = asyncio.create_task(subscription.get())
+                        await asyncio.wait(
+                            {subscription_read, disconnect_watcher},
+                            timeout=block_timeout / 1000,
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
+                        if disconnect_watcher.done():
+                            break
+                        if not subscription_read.done():
+                            subscription_read.cancel()
+                            continue
+                        try:
+                            file_statuses = subscription_read.result()
+                        except Exception:
+                            logger.error('An exception occurred while retrieving status from stream.')
+                            raise
                         filtered_file_statuses = self.filter_parsed_status(file_statuses, params)
                         logger.info(f'Returning data from Redis for session {params.session_id}')
                         for file_status in filtered_file_statuses:
-                            yield json.dumps(file_status)
-                    await asyncio.sleep(1.0)
+                            yield {'id': file_status['entry_id'], 'data': json.dumps(file_status)}
+            finally:
+                disconnect_watcher.cancel()
+                if subscription_read is not None:
+                    subscription_read.cancel()
+                logger.info('Disconnected from client (via disconnect/timeout)')
 
         return EventSourceResponse(event_generator(), ping=settings.SSE_PING_INTERVAL)
 
-    async def get_status_without_sse(self, params: TaskStreamRetrieveSchema) -> TaskStreamResponseSchema:
-        """Retrieve file status events without SSE."""
+    async def get_status_without_sse(self, params: TaskStreamRangeSchema) -> TaskStreamRangeResponseSchema:
+        """Retrieve file status events without SSE.
+
+        Only entries between the start and end IDs are read, up to count of them when given, starting from the end when
+        reversed. Next cursor is the ID of the entry following the page, which is used as the start of the next page,
+        or as the end of the next page when reversed. Filters are applied to entries of the page, so a page can contain
+        fewer statuses than the count even when there are more pages.
+        """
+        entries = await self.streams_xrange(
+            params.session_id,
+            min_id=params.start or '-',
+            max_id=params.end or '+',
+            count=params.count + 1 if params.count else None,
+            reverse=params.reverse,
+        )
+        next_cursor = None
+        if params.count and len(entries) > params.count:
+            next_cursor = entries[params.count][0].decode()
+            entries = entries[: params.count]
+
         filtered_file_statuses = []
-        redis_results = await self.streams_xread(params.session_id, '0')
-        if redis_results:
-            file_statuses = self.parse_file_status(redis_results)
+        if entries:
+            file_statuses = self.parse_file_status([[params.session_id.encode(), entries]])
             filtered_file_statuses = self.filter_parsed_status(file_statuses, params)
 
-        return TaskStreamResponseSchema(stream_info=filtered_file_statuses, total=len(filtered_file_statuses))
+        return TaskStreamRangeResponseSchema(
+            stream_info=filtered_file_statuses, total=len(filtered_file_statuses), next_cursor=next_cursor
+        )
 
     async def delete_old_statuses(self, params: TaskStreamDeleteSchema) -> TaskStreamResponseSchema:
         """Delete a user's old file status events from Redis."""
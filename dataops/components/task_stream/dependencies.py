@@ -4,10 +4,13 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+
 from aioredis.client import Redis
 from fastapi import Depends
 
 from dataops.components.task_stream.crud import StreamCRUD
+from dataops.components.task_stream.hub import StreamHub
 from dataops.config import Settings
 from dataops.config import get_settings
 from dataops.dependencies import get_redis
@@ -19,6 +22,36 @@ def get_streams_crud(redis: Redis = Depends(get_redis)) -> StreamCRUD:
     return StreamCRUD(redis)
 
 
+class GetStreamHub:
+    """Class to create a single stream hub instance per Redis connection."""
+
+    def __init__(self) -> None:
+        self.instance = None
+        self.lock = asyncio.Lock()
+
+    async def __call__(
+        self, redis: Redis = Depends(get_redis), settings: Settings = Depends(get_settings)
+    ) -> StreamHub:
+        """Return an instance of StreamHub class."""
+
+        async with self.lock:
+            if not self.instance or self.instance.redis is not redis:
+                self.instance = StreamHub(
+                    redis, block_timeout=settings.TASK_STREAM_BLOCK_TIMEOUT, queue_size=settings.TASK_STREAM_QUEUE_SIZE
+                )
+            return self.instance
+
+    async def stop(self) -> None:
+        """Stop reading streams by the created instance, which closes its dedicated connection."""
+
+        async with self.lock:
+            if self.instance is not None:
+                await self.instance.stop()
+
+
+get_stream_hub = GetStreamHub()
+
+
 async def get_auth_manager(settings: Settings = Depends(get_settings)) -> AuthManager:
     """Returns an instance of AuthManager as a dependency."""
     return AuthManager(settings)
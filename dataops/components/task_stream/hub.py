@@ -0,0 +1,204 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from dataops.components.crud import RedisCRUD
+from dataops.components.task_stream.parsing import StreamParser
+from dataops.components.task_stream.schemas import TaskStreamCreateSchema
+from dataops.logger import logger
+
+
+def parse_entry_id(entry_id: str) -> tuple[int, int]:
+    """Return stream entry ID as a tuple, so IDs can be compared."""
+    milliseconds, _, sequence = entry_id.partition('-')
+    return int(milliseconds), int(sequence or 0)
+
+
+class StreamSubscription:
+    """File statuses of a single stream delivered to a single connection.
+
+    Statuses are dispatched by the hub into a bounded queue. A new subscription and a subscription whose queue
+    overflowed read missed statuses from the stream by themselves, so a slow connection never blocks the hub.
+    """
+
+    def __init__(self, hub: 'StreamHub', stream: str, offset: str, queue_size: int) -> None:
+        self.hub = hub
+        self.stream = stream
+        self.offset = offset
+        self.queue: asyncio.Queue[tuple[str, list[TaskStreamCreateSchema]]] = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = True
+
+    def put(self, offset: str, file_statuses: list[TaskStreamCreateSchema]) -> None:
+        """Queue file statuses read up to the offset unless the queue is full."""
+
+        try:
+            self.queue.put_nowait((offset, file_statuses))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def catch_up(self) -> tuple[str, list[TaskStreamCreateSchema]]:
+        """Read file statuses written after the last returned ones directly from the stream."""
+
+        self.overflowed = False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        try:
+            offset, file_statuses = await self.hub.read_file_statuses(self.stream, self.offset)
+            await self.hub.follow(self.stream, offset)
+        except BaseException:
+            self.overflowed = True
+            raise
+        return offset, file_statuses
+
+    async def get(self) -> list[TaskStreamCreateSchema]:
+        """Return file statuses written after the previously returned ones."""
+
+        while True:
+            self.hub.start()
+            if self.overflowed:
+                offset, file_statuses = await self.catch_up()
+            else:
+                offset, file_statuses = await self.queue.get()
+
+            last_offset = parse_entry_id(self.offset)
+            if parse_entry_id(offset) <= last_offset:
+                continue
+            self.offset = offset
+            file_statuses = [
+                file_status for file_status in file_statuses if parse_entry_id(file_status.entry_id) > last_offset
+            ]
+            if file_statuses:
+                return file_statuses
+
+
+class StreamHub(StreamParser, RedisCRUD):
+    """Reads file status streams for all SSE connections of the process.
+
+    All streams with at least one subscription are followed by a single reader with one blocking XREAD over a dedicated
+    connection. Entries are parsed once and dispatched to queues of subscriptions, so the number of Redis connections
+    and commands depends on the number of followed streams rather than on the number of connections. When a new stream
+    is followed, the pending read is interrupted with CLIENT UNBLOCK to include it.
+    """
+
+    def __init__(self, redis: Redis, block_timeout: int = 5000, queue_size: int = 100) -> None:
+        super().__init__(redis)
+        self.redis = redis
+        self.block_timeout = block_timeout
+        self.queue_size = queue_size
+        self.subscriptions: defaultdict[str, set[StreamSubscription]] = defaultdict(set)
+        self.offsets: dict[str, str] = {}
+        self.streams_changed = asyncio.Event()
+        self.reader_id: int | None = None
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start reading streams unless it is already running."""
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.read())
+
+    async def stop(self) -> None:
+        """Stop reading streams and close the dedicated connection of the reader.
+
+        Commands are shielded from cancellation by the Redis client, which can swallow the cancellation of the reader.
+        The reader is therefore also woken up and interrupted, and it stops once it is not the current reader anymore.
+        """
+
+        if self.task is not None:
+            task, self.task = self.task, None
+            task.cancel()
+            self.streams_changed.set()
+            await self.unblock_reader()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def read(self) -> None:
+        client = self.redis.client()
+        try:
+            self.reader_id = await self.get_client_id(client)
+            while self.task is asyncio.current_task():
+                if not self.offsets:
+                    self.streams_changed.clear()
+                    await self.streams_changed.wait()
+                    continue
+                self.dispatch(await client.xread(dict(self.offsets), block=self.block_timeout))
+        except RedisError:
+            logger.exception('Unable to read file status streams')
+        finally:
+            self.reader_id = None
+            await client.close()
+
+    @staticmethod
+    async def get_client_id(client: Redis) -> int | None:
+        """Return ID of the client connection, which is not available when CLIENT commands are disabled."""
+
+        try:
+            return await client.client_id()
+        except RedisError:
+            return None
+
+    def dispatch(self, redis_results: list | None) -> None:
+        """Parse read entries and put them into queues of stream subscriptions."""
+
+        for stream, entries in redis_results or []:
+            stream = stream.decode()
+            if stream not in self.offsets or not entries:
+                continue
+            offset = entries[-1][0].decode()
+            if parse_entry_id(offset) <= parse_entry_id(self.offsets[stream]):
+                continue
+            self.offsets[stream] = offset
+            file_statuses = self.parse_file_status([[stream.encode(), entries]])
+            for subscription in self.subscriptions[stream]:
+                subscription.put(offset, file_statuses)
+
+    async def read_file_statuses(self, stream: str, offset: str) -> tuple[str, list[TaskStreamCreateSchema]]:
+        """Return ID of the last entry written after the offset along with parsed file statuses."""
+
+        redis_results = await self.streams_xread(stream, offset)
+        if not redis_results:
+            return offset, []
+        return redis_results[0][1][-1][0].decode(), self.parse_file_status(redis_results)
+
+    async def follow(self, stream: str, offset: str) -> None:
+        """Include the stream into reads starting after the offset unless it is already followed."""
+
+        if stream in self.offsets or stream not in self.subscriptions:
+            return
+        self.offsets[stream] = offset
+        self.streams_changed.set()
+        await self.unblock_reader()
+
+    async def unblock_reader(self) -> None:
+        """Interrupt the pending blocking read of the reader, if any."""
+
+        if self.reader_id is not None:
+            try:
+                await self.redis.client_unblock(self.reader_id)
+            except RedisError:
+                logger.exception('Unable to interrupt file status streams read')
+
+    @asynccontextmanager
+    async def subscribe(self, stream: str, offset: str = '0') -> AsyncIterator[StreamSubscription]:
+        """Yield a subscription for file statuses of the stream written after the offset."""
+
+        subscription = StreamSubscription(self, stream, offset, self.queue_size)
+        self.subscriptions[stream].add(subscription)
+        self.start()
+
+        try:
+            yield subscription
+        finally:
+            self.subscriptions[stream].discard(subscription)
+            if not self.subscriptions[stream]:
+                del self.subscriptions[stream]
+                self.offsets.pop(stream, None)
@@ -5,16 +5,71 @@
 # You may not use this file except in compliance with the License.
 
 import ast
+from time import time
 
+from dataops.components.codecs import Codec
+from dataops.components.codecs import get_codec
 from dataops.components.task_stream.schemas import SSETaskStreamSchema
 from dataops.components.task_stream.schemas import TaskStreamCreateSchema
 from dataops.components.task_stream.schemas import TaskStreamRetrieveSchema
+from dataops.config import get_settings
 from dataops.logger import logger
 
+STREAM_ENTRY_FIELDS = [
+    'target_names',
+    'target_type',
+    'container_code',
+    'container_type',
+    'action_type',
+    'status',
+    'job_id',
+]
+
 
 class StreamParser:
     """Manages redis stream parsing."""
 
+    @staticmethod
+    def encode_file_status(values: dict, codec: Codec, legacy_format: bool = False) -> dict[str, bytes | str]:
+        """Return stream entry fields for the file status.
+
+        Values are encoded as a single list ordered as STREAM_ENTRY_FIELDS and stored in the field named after the
+        codec, so entries do not repeat field names. Enable ``legacy_format`` to keep writing every value in a separate
+        field as previous versions do, so instances which only understand that layout can read new entries during an
+        upgrade.
+        """
+        if legacy_format:
+            return {field: str(values[field]) for field in STREAM_ENTRY_FIELDS}
+        return {codec.name: codec.encode([values[field] for field in STREAM_ENTRY_FIELDS])}
+
+    @staticmethod
+    def get_retention() -> dict[str, int | str | None]:
+        """Return stream trimming and expiration arguments for writing file statuses.
+
+        Streams are trimmed by length and by age of entries on every write, and expire when no status is written for
+        the configured time, so memory used by a session is bounded. Zero disables the respective limit.
+        """
+        settings = get_settings()
+        min_id = None
+        if settings.TASK_STREAM_MAX_AGE:
+            min_id = str(int((time() - settings.TASK_STREAM_MAX_AGE) * 1000))
+        return {
+            'max_length': settings.TASK_STREAM_MAX_LENGTH or None,
+            'min_id': min_id,
+            'expire': settings.TASK_STREAM_EXPIRE or None,
+        }
+
+    @staticmethod
+    def decode_file_status(entry_values: dict[bytes, bytes]) -> dict:
+        """Return file status values from stream entry fields or from the fields written by previous versions."""
+        if b'target_names' in entry_values:
+            values = {field: entry_values[field.encode()].decode() for field in STREAM_ENTRY_FIELDS}
+            values['target_names'] = ast.literal_eval(values['target_names'])
+            return values
+
+        [(codec_name, data)] = entry_values.items()
+        return dict(zip(STREAM_ENTRY_FIELDS, get_codec(codec_name).decode(data)))
+
     def parse_file_status(self, results: list) -> list[TaskStreamCreateSchema]:
         """Parses file statuses in a stream for a respective session id."""
         status = []
@@ -22,17 +77,8 @@ class StreamParser:
         for entry in results[0][1]:
             try:
                 entry_id = entry[0].decode()
-                entry_values = entry[1]
                 redis_file_status = TaskStreamCreateSchema(
-                    entry_id=entry_id,
-                    session_id=session_id,
-                    target_names=ast.literal_eval(entry_values[b'target_names'].decode()),
-                    target_type=entry_values[b'target_type'].decode(),
-                    container_code=entry_values[b'container_code'].decode(),
-                    container_type=entry_values[b'container_type'].decode(),
-                    action_type=entry_values[b'action_type'].decode(),
-                    status=entry_values[b'status'].decode(),
-                    job_id=entry_values[b'job_id'].decode(),
+                    entry_id=entry_id, session_id=session_id, **self.decode_file_status(entry[1])
                 )
                 status.append(redis_file_status)
             except Exception:
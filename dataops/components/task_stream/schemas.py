@@ -9,12 +9,15 @@ from uuid import UUID
 from uuid import uuid4
 
 from pydantic import BaseModel
+from pydantic import conint
 from pydantic import validator
 
 from dataops.components.schemas import BaseSchema
 from dataops.components.schemas import EActionType
 from dataops.components.schemas import EFileStatus
 
+ENTRY_ID_PATTERN = r'\d+(-\d+)?'
+
 
 class TaskStreamRetrieveSchema(BaseModel):
     """Schema for retrieving file status."""
@@ -28,9 +31,33 @@ class TaskStreamRetrieveSchema(BaseModel):
 
 
 class SSETaskStreamSchema(TaskStreamRetrieveSchema):
-    """Schema for stream SSE timeout."""
+    """Schema for stream SSE timeout and the entry ID to resume streaming after."""
 
     request_timeout: int | None
+    from_id: str | None
+
+    @validator('from_id')
+    def from_id_valid(cls, v):
+        """Validates stream entry ID."""
+        if v is not None and not re.fullmatch(ENTRY_ID_PATTERN, v):
+            raise ValueError(f'Invalid stream entry ID {v}')
+        return v
+
+
+class TaskStreamRangeSchema(TaskStreamRetrieveSchema):
+    """Schema for retrieving a page of file statuses between stream entry IDs."""
+
+    start: str | None
+    end: str | None
+    count: conint(ge=1) | None
+    reverse: bool = False
+
+    @validator('start', 'end')
+    def entry_id_valid(cls, v):
+        """Validates stream entry ID."""
+        if v is not None and not re.fullmatch(ENTRY_ID_PATTERN, v):
+            raise ValueError(f'Invalid stream entry ID {v}')
+        return v
 
 
 class TaskStreamCreateSchema(BaseSchema):
@@ -96,3 +123,9 @@ class TaskStreamResponseSchema(BaseModel):
 
     total: int = 0
     stream_info: dict | list | list[dict] = {}
+
+
+class TaskStreamRangeResponseSchema(TaskStreamResponseSchema):
+    """Response schema for retrieving a page of file statuses."""
+
+    next_cursor: str | None = None
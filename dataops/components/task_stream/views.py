@@ -6,18 +6,22 @@
 
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Header
 from fastapi import Request
 from sse_starlette.sse import EventSourceResponse
 
 from dataops.components.exceptions import BadRequest
 from dataops.components.task_stream.crud import StreamCRUD
 from dataops.components.task_stream.dependencies import get_auth_manager
+from dataops.components.task_stream.dependencies import get_stream_hub
 from dataops.components.task_stream.dependencies import get_streams_crud
+from dataops.components.task_stream.hub import StreamHub
 from dataops.components.task_stream.schemas import SSETaskStreamSchema
 from dataops.components.task_stream.schemas import TaskStreamCreateSchema
 from dataops.components.task_stream.schemas import TaskStreamDeleteSchema
+from dataops.components.task_stream.schemas import TaskStreamRangeResponseSchema
+from dataops.components.task_stream.schemas import TaskStreamRangeSchema
 from dataops.components.task_stream.schemas import TaskStreamResponseSchema
-from dataops.components.task_stream.schemas import TaskStreamRetrieveSchema
 from dataops.dependencies.auth import AuthManager
 
 router = APIRouter(prefix='/task-stream', tags=['Task Streaming'])
@@ -37,21 +41,35 @@ async def get_status_with_sse(
     request: Request,
     params: SSETaskStreamSchema = Depends(SSETaskStreamSchema),
     stream_crud: StreamCRUD = Depends(get_streams_crud),
+    stream_hub: StreamHub = Depends(get_stream_hub),
     auth_manager: AuthManager = Depends(get_auth_manager),
+    last_event_id: str | None = Header(default=None),
 ) -> EventSourceResponse:
-    """Stream file status events over SSE."""
+    """Stream file status events over SSE.
+
+    Events written after the entry ID from the Last-Event-ID header, sent by reconnecting clients, or from the from_id
+    parameter are streamed, starting from the first event of the stream otherwise.
+    """
     current_identity = await auth_manager.get_current_identity(request)
     if not params.session_id.startswith(current_identity['username']):
         raise BadRequest()
-    return await stream_crud.get_status_with_sse(request, params)
+    if last_event_id:
+        params = SSETaskStreamSchema(**params.dict(exclude={'from_id'}), from_id=last_event_id)
+    return await stream_crud.get_status_with_sse(request, params, stream_hub)
 
 
-@router.get('/static/', response_model=TaskStreamResponseSchema, summary='Get file status events without SSE streaming')
+@router.get(
+    '/static/', response_model=TaskStreamRangeResponseSchema, summary='Get file status events without SSE streaming'
+)
 async def get_static_status(
-    params: TaskStreamRetrieveSchema = Depends(TaskStreamRetrieveSchema),
+    params: TaskStreamRangeSchema = Depends(TaskStreamRangeSchema),
     stream_crud: StreamCRUD = Depends(get_streams_crud),
-) -> TaskStreamResponseSchema:
-    """Get file status events without SSE streaming."""
+) -> TaskStreamRangeResponseSchema:
+    """Get file status events without SSE streaming.
+
+    Events between the start and end entry IDs are returned, up to count of them when given, latest first when
+    reversed. The next cursor is used as the start, or as the end when reversed, to get the next page of events.
+    """
     return await stream_crud.get_status_without_sse(params)
 
 
@@ -45,6 +45,7 @@ class Settings(BaseSettings):
     REDIS_PORT: int
     REDIS_DB: int
     REDIS_PASSWORD: str
+    REDIS_CODEC: str = 'json'
 
     RDS_HOST: str
     RDS_PORT: str
@@ -63,6 +64,27 @@ class Settings(BaseSettings):
     RSA_PUBLIC_KEY: str
 
     SSE_PING_INTERVAL: int = 5
+    SSE_DISCONNECT_CHECK_INTERVAL: float = 1.0
+    TASK_STREAM_BLOCK_TIMEOUT: int = 5000
+    TASK_STREAM_QUEUE_SIZE: int = 100
+    TASK_STREAM_LEGACY_FORMAT: bool = False
+    TASK_STREAM_MAX_LENGTH: int = 1000
+    TASK_STREAM_MAX_AGE: int = 0
+    TASK_STREAM_EXPIRE: int = 604800
+
+    TASK_HISTORY_ENABLED: bool = False
+    TASK_HISTORY_MAX_LENGTH: int = 100
+    TASK_HISTORY_MAX_AGE: int = 86400
+
+    RESOURCE_LOCK_LEASE_TTL: int = 86400
+    RESOURCE_LOCK_REQUIRE_TOKEN: bool = False
+    RESOURCE_LOCK_LEGACY_STATE: bool = False
+    RESOURCE_LOCK_WAIT_POLL_INTERVAL: float = 1.0
+    RESOURCE_LOCK_REAPER_ENABLED: bool = False
+    RESOURCE_LOCK_REAPER_INTERVAL: int = 300
+    RESOURCE_LOCK_REAPER_MAX_AGE: int = 0
+    RESOURCE_LOCK_REAPER_BATCH_SIZE: int = 100
+    RESOURCE_LOCK_REAPER_BATCH_PAUSE: float = 0.1
 
     def __init__(self):
         super().__init__()
@@ -0,0 +1,757 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from dataops.app import shutdown_event
+from dataops.components.resource_lock.cache import ResourceLockerCache
+from dataops.components.resource_lock.dependencies import get_resource_lock_release_listener
+from dataops.components.resource_lock.scripts import HOLDERS_KEY_PREFIX
+from dataops.components.resource_lock.scripts import INDEX_KEY
+from dataops.components.resource_lock.scripts import QUEUE_KEY_PREFIX
+from dataops.components.resource_lock.scripts import RELEASED_CHANNEL
+from dataops.components.resource_lock.scripts import SUBTREE_KEY_PREFIX
+
+
+async def get_counts(resource_locker: ResourceLockerCache, *keys: str) -> list[tuple[int, int]]:
+    """Return read and write counts stored for the keys."""
+
+    pipeline = resource_locker.redis.pipeline(transaction=False)
+    for key in keys:
+        pipeline.hmget(key, 'r', 'w')
+    values = await pipeline.execute()
+
+    return [(int(read_count or 0), int(write_count or 0)) for read_count, write_count in values]
+
+
+async def expire_leases(resource_locker: ResourceLockerCache, key: str, *tokens: str) -> None:
+    """Move lease expiration of the tokens into the past."""
+
+    await resource_locker.redis.zadd(f'{HOLDERS_KEY_PREFIX}{key}', {token: 1 for token in tokens}, xx=True)
+
+
+class TestResourceLockerCache:
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_perform_rw_lock_takes_single_round_trip(self, resource_locker, mocker, fake, operation):
+        await resource_locker.scripts.load()
+        spy = mocker.spy(resource_locker.redis, 'execute_command')
+
+        response = await resource_locker.perform_rw_lock(fake.pystr(), operation)
+
+        assert response.status
+        assert spy.call_count == 1
+        assert spy.call_args.args[0] == 'EVALSHA'
+
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_perform_rw_unlock_takes_single_round_trip(self, resource_locker, mocker, fake, operation):
+        await resource_locker.scripts.load()
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, operation)
+        spy = mocker.spy(resource_locker.redis, 'execute_command')
+
+        response = await resource_locker.perform_rw_unlock(key, operation)
+
+        assert response.status
+        assert spy.call_count == 1
+
+    async def test_scripts_are_reloaded_when_missing_in_redis_cache(self, resource_locker, fake):
+        await resource_locker.redis.script_flush()
+
+        response = await resource_locker.perform_rw_lock(fake.pystr(), 'write')
+
+        assert response.status
+
+    async def test_load_scripts_does_not_raise_when_redis_is_not_available(self, redis, mocker):
+        mocker.patch.object(redis, 'script_load', side_effect=RedisConnectionError())
+
+        await ResourceLockerCache(redis).load_scripts()
+
+    async def test_only_one_of_concurrent_write_locks_succeeds(self, resource_locker, fake):
+        key = fake.pystr()
+
+        responses = await asyncio.gather(*[resource_locker.perform_rw_lock(key, 'write') for _ in range(50)])
+
+        assert sum(bool(response.status) for response in responses) == 1
+        assert await get_counts(resource_locker, key) == [(0, 1)]
+
+    async def test_concurrent_read_locks_are_all_counted(self, resource_locker, fake):
+        key = fake.pystr()
+        num = 50
+
+        responses = await asyncio.gather(*[resource_locker.perform_rw_lock(key, 'read') for _ in range(num)])
+
+        assert all(response.status for response in responses)
+        assert await get_counts(resource_locker, key) == [(num, 0)]
+
+    async def test_concurrent_read_and_write_locks_never_hold_together(self, resource_locker, fake):
+        key = fake.pystr()
+        operations = ['read', 'write'] * 25
+
+        responses = await asyncio.gather(*[resource_locker.perform_rw_lock(key, op) for op in operations])
+
+        granted = {op for op, response in zip(operations, responses) if response.status}
+        assert granted in ({'read'}, {'write'})
+
+    async def test_concurrent_read_unlocks_remove_the_key(self, resource_locker, fake):
+        key = fake.pystr()
+        num = 50
+        for _ in range(num):
+            await resource_locker.perform_rw_lock(key, 'read')
+
+        responses = await asyncio.gather(*[resource_locker.perform_rw_unlock(key, 'read') for _ in range(num)])
+
+        assert all(response.status for response in responses)
+        assert await resource_locker.is_exist(key) is False
+
+    async def test_write_unlock_is_rejected_while_read_lock_is_held(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, 'read')
+
+        response = await resource_locker.perform_rw_unlock(key, 'write')
+
+        assert not response.status
+        assert await get_counts(resource_locker, key) == [(1, 0)]
+
+    async def test_perform_bulk_lock_locks_all_keys_in_single_round_trip(self, resource_locker, mocker, fake):
+        await resource_locker.scripts.load()
+        keys = [f'{fake.pystr()}/{index}' for index in range(10000)]
+        spy = mocker.spy(resource_locker.redis, 'execute_command')
+
+        response = await resource_locker.perform_bulk_lock(keys, 'write')
+
+        assert response.is_successful()
+        assert spy.call_count == 1
+        assert await get_counts(resource_locker, *keys) == [(0, 1)] * len(keys)
+
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_perform_bulk_lock_does_not_lock_any_key_when_one_key_is_blocked(
+        self, resource_locker, fake, operation
+    ):
+        keys = [f'a_{fake.pystr()}', f'b_{fake.pystr()}', f'c_{fake.pystr()}']
+        await resource_locker.perform_rw_lock(keys[2], 'write')
+
+        response = await resource_locker.perform_bulk_lock(keys, operation)
+
+        assert response.keys_status == [(key, False) for key in keys]
+        assert await resource_locker.is_exist(keys[0]) is False
+        assert await resource_locker.is_exist(keys[1]) is False
+        assert await get_counts(resource_locker, keys[2]) == [(0, 1)]
+
+    async def test_perform_bulk_lock_locks_duplicated_keys_once(self, resource_locker, fake):
+        key = fake.pystr()
+
+        response = await resource_locker.perform_bulk_lock([key, key], 'read')
+
+        assert response.keys_status == [(key, True)]
+        assert await get_counts(resource_locker, key) == [(1, 0)]
+
+    async def test_only_one_of_concurrent_overlapping_bulk_write_locks_succeeds(self, resource_locker, fake):
+        keys = [fake.pystr() for _ in range(10)]
+
+        responses = await asyncio.gather(
+            *[resource_locker.perform_bulk_lock(keys[index : index + 5], 'write') for index in range(6)]
+        )
+
+        locked = [key for response in responses if response.is_successful() for key, _ in response.keys_status]
+        assert len(locked) == len(set(locked))
+        counts = await get_counts(resource_locker, *keys)
+        assert sorted(key for key, count in zip(keys, counts) if count == (0, 1)) == sorted(locked)
+
+    async def test_perform_bulk_unlock_continues_when_one_key_fails(self, resource_locker, fake):
+        keys = [f'a_{fake.pystr()}', f'b_{fake.pystr()}', f'c_{fake.pystr()}']
+        await resource_locker.perform_bulk_lock([keys[0], keys[2]], 'write')
+
+        response = await resource_locker.perform_bulk_unlock(keys, 'write')
+
+        assert response.keys_status == [(keys[0], True), (keys[1], False), (keys[2], True)]
+        assert await resource_locker.redis.exists(*keys) == 0
+
+    async def test_perform_rw_lock_returns_owner_token_and_sets_lease_expiration(self, resource_locker, fake):
+        key = fake.pystr()
+
+        response = await resource_locker.perform_rw_lock(key, 'write', ttl=60)
+
+        assert response.token
+        assert 0 < await resource_locker.redis.pttl(key) <= 60000
+        assert await resource_locker.redis.zscore(f'{HOLDERS_KEY_PREFIX}{key}', response.token)
+
+    async def test_expired_write_lease_releases_the_lock(self, resource_locker, fake):
+        key = fake.pystr()
+        response = await resource_locker.perform_rw_lock(key, 'write')
+        await expire_leases(resource_locker, key, response.token)
+
+        response = await resource_locker.perform_rw_lock(key, 'write')
+
+        assert response.status
+        assert await get_counts(resource_locker, key) == [(0, 1)]
+
+    async def test_expired_read_leases_decrease_read_count(self, resource_locker, fake):
+        key = fake.pystr()
+        responses = [await resource_locker.perform_rw_lock(key, 'read') for _ in range(3)]
+        await expire_leases(resource_locker, key, responses[0].token, responses[1].token)
+
+        response = await resource_locker.check_lock_status(key)
+
+        assert response.status == '1,0'
+        assert await get_counts(resource_locker, key) == [(1, 0)]
+
+    async def test_read_count_without_leases_is_not_expired(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.redis.hset(key, mapping={'r': 2, 'w': 0})
+        response = await resource_locker.perform_rw_lock(key, 'read')
+        await expire_leases(resource_locker, key, response.token)
+
+        response = await resource_locker.check_lock_status(key)
+
+        assert response.status == '2,0'
+        assert await resource_locker.redis.pttl(key) == -1
+
+    async def test_check_lock_status_returns_reader_and_writer_counts(self, resource_locker, fake):
+        key = fake.pystr()
+        for _ in range(3):
+            await resource_locker.perform_rw_lock(key, 'read')
+
+        response = await resource_locker.check_lock_status(key)
+
+        assert response.read_count == 3
+        assert response.write_count == 0
+        assert response.acquired_at
+
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_legacy_string_state_is_converted_into_hash_when_touched(self, resource_locker, fake, operation):
+        key = fake.pystr()
+        await resource_locker.set(key, '2,0')
+
+        response = await resource_locker.perform_rw_lock(key, operation)
+
+        assert bool(response.status) is (operation == 'read')
+        assert await resource_locker.redis.type(key) == b'hash'
+        assert await get_counts(resource_locker, key) == [(3, 0) if operation == 'read' else (2, 0)]
+
+    async def test_legacy_string_state_is_unlocked(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.set(key, '0,1')
+
+        response = await resource_locker.perform_rw_unlock(key, 'write')
+
+        assert response.status
+        assert await resource_locker.is_exist(key) is False
+
+    async def test_lock_state_is_written_as_string_when_legacy_state_is_enabled(self, redis, fake):
+        resource_locker = ResourceLockerCache(redis, legacy_state=True)
+        key = fake.pystr()
+        await redis.hset(key, mapping={'r': 1, 'w': 0})
+
+        await resource_locker.perform_rw_lock(key, 'read')
+
+        assert await resource_locker.get(key) == b'2,0'
+
+    async def test_check_lock_status_returns_none_when_all_leases_expired(self, resource_locker, fake):
+        key = fake.pystr()
+        response = await resource_locker.perform_rw_lock(key, 'read')
+        await expire_leases(resource_locker, key, response.token)
+
+        response = await resource_locker.check_lock_status(key)
+
+        assert response.status is None
+        assert await resource_locker.redis.exists(key, f'{HOLDERS_KEY_PREFIX}{key}') == 0
+
+    async def test_perform_rw_unlock_with_token_releases_only_owned_lock(self, resource_locker, fake):
+        key = fake.pystr()
+        first = await resource_locker.perform_rw_lock(key, 'read')
+        second = await resource_locker.perform_rw_lock(key, 'read')
+
+        response = await resource_locker.perform_rw_unlock(key, 'read', first.token)
+
+        assert response.status
+        assert await get_counts(resource_locker, key) == [(1, 0)]
+        assert await resource_locker.redis.zrange(f'{HOLDERS_KEY_PREFIX}{key}', 0, -1) == [second.token.encode()]
+
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_perform_rw_unlock_with_foreign_token_is_rejected(self, resource_locker, fake, operation):
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, operation)
+
+        response = await resource_locker.perform_rw_unlock(key, operation, fake.pystr())
+
+        assert not response.status
+        assert await resource_locker.is_exist(key) is True
+
+    async def test_perform_rw_unlock_without_token_is_rejected_when_token_is_required(self, redis, fake):
+        resource_locker = ResourceLockerCache(redis, require_token=True)
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, 'write')
+
+        response = await resource_locker.perform_rw_unlock(key, 'write')
+
+        assert not response.status
+        assert await get_counts(resource_locker, key) == [(0, 1)]
+
+    async def test_perform_rw_renew_extends_lease_of_owned_lock(self, resource_locker, fake):
+        key = fake.pystr()
+        lock_response = await resource_locker.perform_rw_lock(key, 'write', ttl=10)
+
+        response = await resource_locker.perform_rw_renew(key, lock_response.token, ttl=600)
+
+        assert response.status
+        assert await resource_locker.redis.pttl(key) > 10000
+
+    async def test_perform_rw_renew_fails_for_expired_lease(self, resource_locker, fake):
+        key = fake.pystr()
+        lock_response = await resource_locker.perform_rw_lock(key, 'write')
+        await expire_leases(resource_locker, key, lock_response.token)
+
+        response = await resource_locker.perform_rw_renew(key, lock_response.token)
+
+        assert not response.status
+        assert await resource_locker.is_exist(key) is False
+
+    async def test_perform_bulk_lock_shares_token_that_renews_and_unlocks_all_keys(self, resource_locker, fake):
+        keys = [fake.pystr() for _ in range(3)]
+        lock_response = await resource_locker.perform_bulk_lock(keys, 'write')
+
+        renew_response = await resource_locker.perform_bulk_renew(keys, lock_response.token)
+        unlock_response = await resource_locker.perform_bulk_unlock(keys, 'write', lock_response.token)
+
+        assert renew_response.is_successful()
+        assert unlock_response.is_successful()
+        assert await resource_locker.redis.exists(*keys) == 0
+
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_recursive_write_lock_blocks_locks_under_the_key(self, resource_locker, fake, operation):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        await resource_locker.perform_rw_lock(folder, 'write', recursive=True)
+
+        response = await resource_locker.perform_rw_lock(f'{folder}/sub/{fake.file_name()}', operation)
+
+        assert not response.status
+
+    async def test_recursive_read_lock_blocks_only_write_locks_under_the_key(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        await resource_locker.perform_rw_lock(folder, 'read', recursive=True)
+
+        read_response = await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'read')
+        write_response = await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'write')
+
+        assert read_response.status
+        assert not write_response.status
+
+    @pytest.mark.parametrize('recursive', [True, False])
+    async def test_recursive_write_lock_is_blocked_by_lock_under_the_key(self, resource_locker, fake, recursive):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        await resource_locker.perform_rw_lock(f'{folder}/sub/{fake.file_name()}', 'read', recursive=recursive)
+
+        response = await resource_locker.perform_rw_lock(folder, 'write', recursive=True)
+
+        assert not response.status
+
+    async def test_recursive_read_lock_is_blocked_only_by_write_lock_under_the_key(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'read')
+
+        response = await resource_locker.perform_rw_lock(folder, 'read', recursive=True)
+        assert response.status
+
+        await resource_locker.perform_rw_unlock(folder, 'read', response.token)
+        await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'write')
+
+        response = await resource_locker.perform_rw_lock(folder, 'read', recursive=True)
+        assert not response.status
+
+    async def test_not_recursive_lock_does_not_block_locks_under_the_key(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        await resource_locker.perform_rw_lock(folder, 'write')
+
+        response = await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'write')
+
+        assert response.status
+
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_recursive_lock_of_folder_key_with_trailing_slash_blocks_locks_under_it(
+        self, resource_locker, fake, operation
+    ):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        lock_response = await resource_locker.perform_rw_lock(f'{folder}/', 'write', recursive=True)
+
+        response = await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', operation)
+        folder_response = await resource_locker.perform_rw_lock(folder, operation)
+        unlock_response = await resource_locker.perform_rw_unlock(folder, 'write', lock_response.token)
+
+        assert not response.status
+        assert not folder_response.status
+        assert unlock_response.status
+
+    async def test_recursive_write_lock_is_granted_once_locks_under_the_key_are_released(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        files = [f'{folder}/{index}/{fake.file_name()}' for index in range(1000)]
+        lock_response = await resource_locker.perform_bulk_lock(files, 'read')
+
+        response = await resource_locker.perform_rw_lock(folder, 'write', recursive=True)
+        assert not response.status
+
+        await resource_locker.perform_bulk_unlock(files, 'read', lock_response.token)
+
+        response = await resource_locker.perform_rw_lock(folder, 'write', recursive=True)
+        assert response.status
+        assert await resource_locker.redis.exists(f'{SUBTREE_KEY_PREFIX}read:{folder}') == 0
+
+    async def test_unlock_without_token_removes_holder_from_hierarchy_index(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        file = f'{folder}/{fake.file_name()}'
+        await resource_locker.perform_rw_lock(file, 'write')
+
+        await resource_locker.perform_rw_unlock(file, 'write')
+
+        response = await resource_locker.perform_rw_lock(folder, 'write', recursive=True)
+        assert response.status
+
+    async def test_expired_lease_under_the_key_does_not_block_recursive_lock(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        file = f'{folder}/{fake.file_name()}'
+        lock_response = await resource_locker.perform_rw_lock(file, 'write')
+        await resource_locker.redis.zadd(f'{SUBTREE_KEY_PREFIX}write:{folder}', {f'{lock_response.token}|{file}': 1})
+
+        response = await resource_locker.perform_rw_lock(folder, 'write', recursive=True)
+
+        assert response.status
+
+    async def test_check_bulk_lock_status_reads_all_keys_in_single_round_trip(self, resource_locker, mocker, fake):
+        keys = [fake.pystr() for _ in range(3)]
+        await resource_locker.perform_rw_lock(keys[0], 'write')
+        for _ in range(2):
+            await resource_locker.perform_rw_lock(keys[1], 'read')
+        command_spy = mocker.spy(resource_locker.redis, 'execute_command')
+        pipeline_spy = mocker.spy(Pipeline, 'execute')
+
+        statuses = await resource_locker.check_bulk_lock_status(keys)
+
+        assert command_spy.call_count == 0
+        assert pipeline_spy.call_count == 1
+        assert [(status.key, status.read_count, status.write_count) for status in statuses] == [
+            (keys[0], 0, 1),
+            (keys[1], 2, 0),
+            (keys[2], 0, 0),
+        ]
+        assert statuses[2].status is None
+
+    async def test_check_bulk_lock_status_excludes_expired_leases(self, resource_locker, fake):
+        key = fake.pystr()
+        responses = [await resource_locker.perform_rw_lock(key, 'read') for _ in range(2)]
+        await expire_leases(resource_locker, key, responses[0].token)
+
+        statuses = await resource_locker.check_bulk_lock_status([key])
+
+        assert statuses[0].read_count == 1
+
+    async def test_check_bulk_lock_status_reads_legacy_string_state(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.set(key, '0,1')
+
+        statuses = await resource_locker.check_bulk_lock_status([key])
+
+        assert statuses[0].status == '0,1'
+
+    async def test_check_prefix_lock_status_pages_through_locked_keys(self, resource_locker, fake):
+        folder = fake.pystr()
+        keys = sorted(f'{folder}/{fake.pystr()}' for _ in range(5))
+        await resource_locker.perform_bulk_lock(keys, 'read')
+        await resource_locker.perform_rw_lock(f'{folder}-other/{fake.pystr()}', 'read')
+
+        first_page, cursor = await resource_locker.check_prefix_lock_status(f'{folder}/', limit=3)
+        second_page, next_cursor = await resource_locker.check_prefix_lock_status(f'{folder}/', cursor, limit=3)
+
+        assert [status.key for status in first_page + second_page] == keys
+        assert cursor == keys[2]
+        assert next_cursor is None
+
+    async def test_check_prefix_lock_status_skips_and_removes_unlocked_keys(self, resource_locker, fake):
+        folder = fake.pystr()
+        keys = sorted(f'{folder}/{fake.pystr()}' for _ in range(2))
+        await resource_locker.perform_bulk_lock(keys, 'write')
+        await resource_locker.redis.delete(keys[0])
+
+        statuses, _ = await resource_locker.check_prefix_lock_status(f'{folder}/')
+
+        assert [status.key for status in statuses] == keys[1:]
+        assert await resource_locker.redis.zrange(INDEX_KEY, 0, -1) == [keys[1].encode()]
+
+    async def test_check_prefix_lock_status_keeps_keys_locked_again_after_reading_status(
+        self, resource_locker, fake, mocker
+    ):
+        key = f'{fake.pystr()}/{fake.pystr()}'
+        await resource_locker.perform_rw_lock(key, 'write')
+        await resource_locker.perform_rw_unlock(key, 'write')
+        await resource_locker.redis.zadd(INDEX_KEY, {key: 0})
+        get_lock_statuses = resource_locker.get_lock_statuses
+
+        async def lock_after_reading_statuses(keys):
+            statuses = await get_lock_statuses(keys)
+            await resource_locker.perform_rw_lock(key, 'read')
+            return statuses
+
+        mocker.patch.object(resource_locker, 'get_lock_statuses', lock_after_reading_statuses)
+
+        statuses, _ = await resource_locker.check_prefix_lock_status(key)
+
+        assert statuses == []
+        assert await resource_locker.redis.zrange(INDEX_KEY, 0, -1) == [key.encode()]
+
+    async def test_lock_attempts_are_recorded_into_metrics(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, 'write')
+        await resource_locker.perform_rw_lock(key, 'read')
+        await resource_locker.perform_bulk_lock([key, fake.pystr()], 'write')
+
+        metrics = resource_locker.metrics.to_schema()
+
+        assert metrics.acquisitions == {'write': 1}
+        assert metrics.rejections == {'read': 1, 'write': 1}
+        assert metrics.hot_keys[0].key == key
+        assert metrics.hot_keys[0].count == 3
+        assert metrics.contended_keys[0].key == key
+
+    async def test_hold_duration_is_recorded_once_the_key_is_not_locked(self, resource_locker, fake):
+        key = fake.pystr()
+        tokens = [(await resource_locker.perform_rw_lock(key, 'read')).token for _ in range(2)]
+
+        await resource_locker.perform_rw_unlock(key, 'read', tokens[0])
+        assert 'read' not in resource_locker.metrics.hold_duration
+
+        await resource_locker.perform_bulk_unlock([key], 'read', tokens[1])
+        assert resource_locker.metrics.hold_duration['read'].count == 1
+        assert resource_locker.metrics.release_latency['read'].count == 2
+
+    async def test_perform_rw_convert_upgrades_sole_read_lock_keeping_the_token(self, resource_locker, fake):
+        key = fake.pystr()
+        lock_response = await resource_locker.perform_rw_lock(key, 'read')
+
+        response = await resource_locker.perform_rw_convert(key, 'write', lock_response.token)
+
+        assert response.status
+        assert await get_counts(resource_locker, key) == [(0, 1)]
+        assert not (await resource_locker.perform_rw_lock(key, 'read')).status
+        assert (await resource_locker.perform_rw_unlock(key, 'write', lock_response.token)).status
+
+    async def test_perform_rw_convert_does_not_upgrade_when_other_readers_exist(self, resource_locker, fake):
+        key = fake.pystr()
+        lock_response = await resource_locker.perform_rw_lock(key, 'read')
+        await resource_locker.perform_rw_lock(key, 'read')
+
+        response = await resource_locker.perform_rw_convert(key, 'write', lock_response.token)
+
+        assert not response.status
+        assert await get_counts(resource_locker, key) == [(2, 0)]
+
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_perform_rw_convert_fails_for_foreign_token(self, resource_locker, fake, operation):
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, 'write' if operation == 'read' else 'read')
+
+        response = await resource_locker.perform_rw_convert(key, operation, fake.pystr())
+
+        assert not response.status
+
+    async def test_perform_rw_convert_downgrades_write_lock_and_lets_readers_in(self, resource_locker, fake):
+        key = fake.pystr()
+        lock_response = await resource_locker.perform_rw_lock(key, 'write')
+
+        response = await resource_locker.perform_rw_convert(key, 'read', lock_response.token)
+
+        assert response.status
+        assert (await resource_locker.perform_rw_lock(key, 'read')).status
+        assert await get_counts(resource_locker, key) == [(2, 0)]
+
+    async def test_perform_rw_convert_keeps_recursive_lock_recursive(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        lock_response = await resource_locker.perform_rw_lock(folder, 'read', recursive=True)
+        await resource_locker.perform_rw_convert(folder, 'write', lock_response.token)
+
+        response = await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'read')
+
+        assert not response.status
+
+    async def test_perform_rw_convert_does_not_upgrade_under_recursive_read_lock(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        await resource_locker.perform_rw_lock(folder, 'read', recursive=True)
+        file = f'{folder}/{fake.file_name()}'
+        lock_response = await resource_locker.perform_rw_lock(file, 'read')
+
+        response = await resource_locker.perform_rw_convert(file, 'write', lock_response.token)
+
+        assert not response.status
+
+    async def test_perform_bulk_convert_upgrades_all_keys_or_none(self, resource_locker, fake):
+        keys = [fake.pystr() for _ in range(3)]
+        lock_response = await resource_locker.perform_bulk_lock(keys, 'read')
+        reader_response = await resource_locker.perform_rw_lock(keys[1], 'read')
+
+        response = await resource_locker.perform_bulk_convert(keys, 'write', lock_response.token)
+
+        assert not response.is_successful()
+        assert await get_counts(resource_locker, *keys) == [(1, 0), (2, 0), (1, 0)]
+
+        await resource_locker.perform_rw_unlock(keys[1], 'read', reader_response.token)
+        response = await resource_locker.perform_bulk_convert(keys, 'write', lock_response.token)
+
+        assert response.is_successful()
+
+
+class TestResourceLockerCacheWaiting:
+    @pytest.fixture
+    def resource_locker(self, redis, resource_lock_release_listener):
+        return ResourceLockerCache(redis, listener=resource_lock_release_listener, wait_poll_interval=10)
+
+    async def test_waiting_lock_is_acquired_as_soon_as_lock_is_released(self, resource_locker, fake):
+        key = fake.pystr()
+        holder = await resource_locker.perform_rw_lock(key, 'write')
+        waiter = asyncio.create_task(resource_locker.perform_rw_lock(key, 'write', wait_timeout=5))
+        await asyncio.sleep(0.1)
+
+        started_at = time.monotonic()
+        await resource_locker.perform_rw_unlock(key, 'write', holder.token)
+        response = await waiter
+
+        assert response.status
+        assert time.monotonic() - started_at < 1
+        assert await resource_locker.redis.exists(f'{QUEUE_KEY_PREFIX}{key}') == 0
+
+    async def test_waiting_lock_falls_back_to_polling_without_listener(self, redis, fake):
+        resource_locker = ResourceLockerCache(redis, wait_poll_interval=0.05)
+        key = fake.pystr()
+        holder = await resource_locker.perform_rw_lock(key, 'write')
+        waiter = asyncio.create_task(resource_locker.perform_rw_lock(key, 'read', wait_timeout=5))
+        await asyncio.sleep(0.1)
+
+        await resource_locker.perform_rw_unlock(key, 'write', holder.token)
+        response = await waiter
+
+        assert response.status
+
+    async def test_waiting_lock_fails_and_leaves_queue_after_wait_timeout(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, 'write')
+
+        response = await resource_locker.perform_rw_lock(key, 'write', wait_timeout=0.2)
+
+        assert not response.status
+        assert await resource_locker.redis.zcard(f'{QUEUE_KEY_PREFIX}{key}') == 0
+
+    async def test_read_lock_is_not_granted_while_writer_is_waiting(self, resource_locker, fake):
+        key = fake.pystr()
+        reader = await resource_locker.perform_rw_lock(key, 'read')
+        writer = asyncio.create_task(resource_locker.perform_rw_lock(key, 'write', wait_timeout=5))
+        await asyncio.sleep(0.1)
+
+        response = await resource_locker.perform_rw_lock(key, 'read')
+        assert not response.status
+
+        await resource_locker.perform_rw_unlock(key, 'read', reader.token)
+        response = await writer
+
+        assert response.status
+        assert await get_counts(resource_locker, key) == [(0, 1)]
+
+    async def test_waiting_writers_are_granted_in_arrival_order(self, resource_locker, fake):
+        key = fake.pystr()
+        holder = await resource_locker.perform_rw_lock(key, 'write')
+        waiters = []
+        for _ in range(3):
+            waiters.append(asyncio.create_task(resource_locker.perform_rw_lock(key, 'write', wait_timeout=5)))
+            await asyncio.sleep(0.05)
+
+        token = holder.token
+        for waiter in waiters:
+            await resource_locker.perform_rw_unlock(key, 'write', token)
+            response = await waiter
+            assert response.status
+            assert all(not other.done() for other in waiters[waiters.index(waiter) + 1 :])
+            token = response.token
+
+    async def test_timed_out_writer_does_not_block_waiting_readers(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, 'read')
+        writer = asyncio.create_task(resource_locker.perform_rw_lock(key, 'write', wait_timeout=0.3))
+        await asyncio.sleep(0.1)
+        reader = asyncio.create_task(resource_locker.perform_rw_lock(key, 'read', wait_timeout=5))
+
+        assert not (await writer).status
+        assert (await reader).status
+        assert (await resource_locker.check_lock_status(key)).read_count == 2
+
+    async def test_waiting_bulk_lock_locks_all_keys_once_they_are_released(self, resource_locker, fake):
+        keys = [fake.pystr() for _ in range(3)]
+        holder = await resource_locker.perform_rw_lock(keys[1], 'read')
+        waiter = asyncio.create_task(resource_locker.perform_bulk_lock(keys, 'write', wait_timeout=5))
+        await asyncio.sleep(0.1)
+
+        response = await resource_locker.perform_rw_lock(keys[0], 'write')
+        assert not response.status
+
+        await resource_locker.perform_rw_unlock(keys[1], 'read', holder.token)
+        response = await waiter
+
+        assert response.is_successful()
+        assert await get_counts(resource_locker, *keys) == [(0, 1)] * len(keys)
+
+    async def test_waiting_lock_is_woken_when_recursive_lock_above_the_key_is_released(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        holder = await resource_locker.perform_rw_lock(folder, 'write', recursive=True)
+        waiter = asyncio.create_task(
+            resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'read', wait_timeout=5)
+        )
+        await asyncio.sleep(0.1)
+
+        started_at = time.monotonic()
+        await resource_locker.perform_rw_unlock(folder, 'write', holder.token)
+        response = await waiter
+
+        assert response.status
+        assert time.monotonic() - started_at < 1
+
+    async def test_read_lock_is_not_granted_under_key_while_recursive_writer_is_waiting(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        file = f'{folder}/{fake.file_name()}'
+        reader = await resource_locker.perform_rw_lock(file, 'read')
+        writer = asyncio.create_task(resource_locker.perform_rw_lock(folder, 'write', wait_timeout=5, recursive=True))
+        await asyncio.sleep(0.1)
+
+        response = await resource_locker.perform_rw_lock(file, 'read')
+        assert not response.status
+
+        await resource_locker.perform_rw_unlock(file, 'read', reader.token)
+        response = await writer
+
+        assert response.status
+
+    async def test_waiting_not_recursive_writer_does_not_block_locks_under_the_key(self, resource_locker, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        holder = await resource_locker.perform_rw_lock(folder, 'read')
+        writer = asyncio.create_task(resource_locker.perform_rw_lock(folder, 'write', wait_timeout=0.3))
+        await asyncio.sleep(0.1)
+
+        response = await resource_locker.perform_rw_lock(f'{folder}/{fake.file_name()}', 'read')
+
+        assert response.status
+        assert not (await writer).status
+        await resource_locker.perform_rw_unlock(folder, 'read', holder.token)
+
+
+async def test_shutdown_event_stops_listening_for_released_locks(redis, monkeypatch):
+    monkeypatch.setattr(get_resource_lock_release_listener, 'instance', None)
+    listener = await get_resource_lock_release_listener(redis)
+    listener.start()
+    await asyncio.sleep(0.1)
+
+    await shutdown_event(FastAPI())
+
+    assert listener.task is None
+    assert await redis.pubsub_numsub(RELEASED_CHANNEL) == [(RELEASED_CHANNEL.encode(), 0)]
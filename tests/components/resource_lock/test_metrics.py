@@ -0,0 +1,71 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+from dataops.components.resource_lock.metrics import Histogram
+from dataops.components.resource_lock.metrics import HotKeys
+from dataops.components.resource_lock.metrics import ResourceLockMetrics
+
+
+class TestHistogram:
+    def test_to_schema_returns_cumulative_bucket_counts(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in [0.05, 0.1, 0.5, 2.0]:
+            histogram.observe(value)
+
+        schema = histogram.to_schema()
+
+        assert schema.buckets == {'0.1': 2, '1.0': 3, '+Inf': 4}
+        assert schema.count == 4
+        assert schema.sum == 2.65
+
+
+class TestHotKeys:
+    def test_top_returns_most_frequent_keys(self):
+        hot_keys = HotKeys(capacity=10)
+        for key, count in [('a', 5), ('b', 3), ('c', 1)]:
+            for _ in range(count):
+                hot_keys.add(key)
+
+        top = hot_keys.top(2)
+
+        assert [(item.key, item.count, item.error) for item in top] == [('a', 5, 0), ('b', 3, 0)]
+
+    def test_frequent_key_is_kept_when_capacity_is_exceeded(self):
+        hot_keys = HotKeys(capacity=5)
+        for index in range(1000):
+            hot_keys.add('hot')
+            hot_keys.add(f'cold-{index}')
+
+        top = hot_keys.top(1)
+
+        assert len(hot_keys.counts) == 5
+        assert top[0].key == 'hot'
+        assert top[0].count - top[0].error <= 1000 <= top[0].count
+
+
+class TestResourceLockMetrics:
+    def test_record_acquire_counts_rejections_and_contended_keys(self):
+        metrics = ResourceLockMetrics()
+
+        metrics.record_acquire(['a'], 'write', 0.001, True)
+        metrics.record_acquire(['a', 'b'], 'write', 0.002, False)
+
+        schema = metrics.to_schema()
+        assert schema.acquisitions == {'write': 1}
+        assert schema.rejections == {'write': 1}
+        assert schema.acquire_latency['write'].count == 2
+        assert [item.key for item in schema.hot_keys] == ['a', 'b']
+        assert {item.key for item in schema.contended_keys} == {'a', 'b'}
+
+    def test_record_release_observes_hold_durations(self):
+        metrics = ResourceLockMetrics()
+
+        metrics.record_release('read', 0.001, [30.0, 120.0])
+
+        schema = metrics.to_schema()
+        assert schema.release_latency['read'].count == 1
+        assert schema.hold_duration['read'].buckets['60.0'] == 1
+        assert schema.hold_duration['read'].count == 2
@@ -0,0 +1,125 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+
+from dataops.app import shutdown_event
+from dataops.components.resource_lock.reaper import ResourceLockReaper
+from dataops.components.resource_lock.scripts import HOLDERS_KEY_PREFIX
+from dataops.components.resource_lock.scripts import INDEX_KEY
+from dataops.components.resource_lock.scripts import REAPER_KEY
+from dataops.components.resource_lock.scripts import RENEWED_AT_FIELD_PREFIX
+
+
+class TestResourceLockReaper:
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_reap_removes_locks_with_expired_leases(self, resource_locker, fake, operation):
+        key = fake.pystr()
+        response = await resource_locker.perform_rw_lock(key, operation)
+        await resource_locker.redis.zadd(f'{HOLDERS_KEY_PREFIX}{key}', {response.token: 1}, xx=True)
+        reaper = ResourceLockReaper(resource_locker, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 1
+        assert not await resource_locker.redis.exists(key)
+        assert await resource_locker.redis.zscore(INDEX_KEY, key) is None
+
+    async def test_reap_keeps_locks_with_live_leases(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.perform_rw_lock(key, 'read')
+        reaper = ResourceLockReaper(resource_locker, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 0
+        assert (await resource_locker.check_lock_status(key)).read_count == 1
+
+    async def test_reap_removes_locks_not_renewed_during_max_age(self, resource_locker, fake):
+        key = fake.pystr()
+        response = await resource_locker.perform_rw_lock(key, 'write')
+        await resource_locker.redis.hset(key, f'{RENEWED_AT_FIELD_PREFIX}{response.token}', 1)
+        reaper = ResourceLockReaper(resource_locker, max_age=60, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 1
+        assert not await resource_locker.redis.exists(key)
+
+    async def test_reap_keeps_renewed_locks_acquired_before_max_age(self, resource_locker, fake):
+        key = fake.pystr()
+        response = await resource_locker.perform_rw_lock(key, 'read')
+        await resource_locker.redis.hset(
+            key, mapping={'acquired_at': 1, f'{RENEWED_AT_FIELD_PREFIX}{response.token}': 1}
+        )
+        await resource_locker.perform_rw_renew(key, response.token)
+        reaper = ResourceLockReaper(resource_locker, max_age=60, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 0
+        assert (await resource_locker.check_lock_status(key)).read_count == 1
+
+    async def test_reap_releases_only_read_leases_not_renewed_during_max_age(self, resource_locker, fake):
+        key = fake.pystr()
+        abandoned = await resource_locker.perform_rw_lock(key, 'read')
+        renewed = await resource_locker.perform_rw_lock(key, 'read')
+        await resource_locker.redis.hset(key, f'{RENEWED_AT_FIELD_PREFIX}{abandoned.token}', 1)
+        reaper = ResourceLockReaper(resource_locker, max_age=60, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 0
+        assert (await resource_locker.check_lock_status(key)).read_count == 1
+        assert await resource_locker.redis.zrange(f'{HOLDERS_KEY_PREFIX}{key}', 0, -1) == [renewed.token.encode()]
+        assert not await resource_locker.redis.hexists(key, f'{RENEWED_AT_FIELD_PREFIX}{abandoned.token}')
+
+    async def test_reap_removes_locks_without_lease_acquired_before_max_age(self, resource_locker, fake):
+        key = fake.pystr()
+        await resource_locker.redis.hset(key, mapping={'r': 0, 'w': 1, 'acquired_at': 1})
+        await resource_locker.redis.zadd(INDEX_KEY, {key: 0})
+        reaper = ResourceLockReaper(resource_locker, max_age=60, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 1
+        assert not await resource_locker.redis.exists(key)
+
+    async def test_reap_processes_all_keys_in_batches(self, resource_locker, fake):
+        keys = [fake.unique.pystr() for _ in range(5)]
+        for key in keys:
+            response = await resource_locker.perform_rw_lock(key, 'read')
+            await resource_locker.redis.zadd(f'{HOLDERS_KEY_PREFIX}{key}', {response.token: 1}, xx=True)
+        reaper = ResourceLockReaper(resource_locker, batch_size=2, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 5
+        assert await resource_locker.redis.zcard(INDEX_KEY) == 0
+
+    async def test_reap_is_skipped_when_another_instance_performed_pass_during_interval(self, resource_locker, fake):
+        await resource_locker.redis.set(REAPER_KEY, fake.pystr())
+        key = fake.pystr()
+        response = await resource_locker.perform_rw_lock(key, 'read')
+        await resource_locker.redis.zadd(f'{HOLDERS_KEY_PREFIX}{key}', {response.token: 1}, xx=True)
+        reaper = ResourceLockReaper(resource_locker, batch_pause=0)
+
+        removed_count = await reaper.reap()
+
+        assert removed_count == 0
+        assert await resource_locker.redis.exists(key)
+
+
+async def test_shutdown_event_cancels_reaper_task():
+    app = FastAPI()
+    app.state.resource_lock_reaper = asyncio.create_task(asyncio.sleep(3600))
+
+    await shutdown_event(app)
+
+    assert app.state.resource_lock_reaper.cancelled()
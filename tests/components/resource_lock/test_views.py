@@ -4,6 +4,8 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+
 import pytest
 
 
@@ -57,6 +59,26 @@ class TestResourceLockViews:
         response = await test_client.post('/v2/resource/lock/bulk', json=payload)
         assert response.status_code == 409
 
+    @pytest.mark.parametrize('operation', ['read', 'write'])
+    async def test_bulk_lock_does_not_leave_any_lock_when_lock_attempt_fails_return_409(
+        self, test_client, fake, operation
+    ):
+        key1 = f'a_{fake.pystr()}'
+        key2 = f'b_{fake.pystr()}'
+
+        await test_client.post('/v2/resource/lock/', json={'resource_key': key2, 'operation': 'write'})
+
+        payload = {
+            'resource_keys': [key1, key2],
+            'operation': operation,
+        }
+
+        response = await test_client.post('/v2/resource/lock/bulk', json=payload)
+        assert response.status_code == 409
+
+        response = await test_client.get('/v2/resource/lock/', query_string={'resource_key': key1})
+        assert response.json()['status'] is None
+
     @pytest.mark.parametrize('operation', ['read', 'write'])
     async def test_bulk_unlock_performs_unlock_for_multiple_keys_return_200(self, test_client, fake, operation):
         key1 = f'a_{fake.pystr()}'
@@ -138,3 +160,192 @@ class TestResourceLockViews:
 
         response = await test_client.post('/v2/resource/lock/', json=payload)
         assert response.status_code == 409
+
+    async def test_lock_returns_token_that_renews_and_removes_the_lock_return_200(self, test_client, fake):
+        key = fake.pystr()
+        response = await test_client.post('/v2/resource/lock/', json={'resource_key': key, 'operation': 'write'})
+        token = response.json()['token']
+
+        response = await test_client.post('/v2/resource/lock/renew', json={'resource_key': key, 'token': token})
+        assert response.status_code == 200
+
+        payload = {'resource_key': key, 'operation': 'write', 'token': fake.pystr()}
+        response = await test_client.delete('/v2/resource/lock/', json=payload)
+        assert response.status_code == 400
+
+        payload = {'resource_key': key, 'operation': 'write', 'token': token}
+        response = await test_client.delete('/v2/resource/lock/', json=payload)
+        assert response.status_code == 200
+
+    async def test_renew_returns_404_for_not_existing_lock(self, test_client, fake):
+        payload = {'resource_key': fake.pystr(), 'token': fake.pystr()}
+
+        response = await test_client.post('/v2/resource/lock/renew', json=payload)
+
+        assert response.status_code == 404
+
+    async def test_bulk_renew_returns_404_when_one_of_locks_is_not_owned(self, test_client, fake):
+        keys = [fake.pystr(), fake.pystr()]
+        payload = {'resource_keys': keys[:1], 'operation': 'read'}
+        response = await test_client.post('/v2/resource/lock/bulk', json=payload)
+        token = response.json()['token']
+
+        response = await test_client.post('/v2/resource/lock/bulk/renew', json={'resource_keys': keys, 'token': token})
+
+        assert response.status_code == 404
+
+    async def test_check_lock_returns_reader_and_writer_counts_return_200(self, test_client, fake):
+        key = fake.pystr()
+        for _ in range(2):
+            await test_client.post('/v2/resource/lock/', json={'resource_key': key, 'operation': 'read'})
+
+        response = await test_client.get('/v2/resource/lock/', query_string={'resource_key': key})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body['status'] == '2,0'
+        assert body['read_count'] == 2
+        assert body['write_count'] == 0
+
+    async def test_lock_with_wait_timeout_waits_until_lock_is_released_return_200(self, test_client, fake):
+        key = fake.pystr()
+        payload = {'resource_key': key, 'operation': 'write'}
+        response = await test_client.post('/v2/resource/lock/', json=payload)
+        token = response.json()['token']
+
+        waiter = asyncio.create_task(test_client.post('/v2/resource/lock/', json=payload | {'wait_timeout': 5}))
+        await asyncio.sleep(0.1)
+        await test_client.delete('/v2/resource/lock/', json=payload | {'token': token})
+        response = await waiter
+
+        assert response.status_code == 200
+        assert response.json()['token'] != token
+
+    async def test_lock_with_wait_timeout_returns_409_when_lock_is_not_released(self, test_client, fake):
+        payload = {'resource_key': fake.pystr(), 'operation': 'write'}
+        await test_client.post('/v2/resource/lock/', json=payload)
+
+        response = await test_client.post('/v2/resource/lock/', json=payload | {'wait_timeout': 0.2})
+
+        assert response.status_code == 409
+
+    async def test_recursive_lock_blocks_lock_under_the_key_return_409(self, test_client, fake):
+        folder = f'{fake.pystr()}/{fake.pystr()}'
+        payload = {'resource_key': folder, 'operation': 'write', 'recursive': True}
+        response = await test_client.post('/v2/resource/lock/', json=payload)
+        assert response.status_code == 200
+
+        payload = {'resource_key': f'{folder}/{fake.file_name()}', 'operation': 'read'}
+        response = await test_client.post('/v2/resource/lock/', json=payload)
+
+        assert response.status_code == 409
+
+    async def test_check_bulk_lock_returns_status_of_every_key_return_200(self, test_client, fake):
+        keys = [fake.pystr(), fake.pystr()]
+        await test_client.post('/v2/resource/lock/', json={'resource_key': keys[0], 'operation': 'write'})
+
+        response = await test_client.post('/v2/resource/lock/bulk/status', json={'resource_keys': keys})
+
+        assert response.status_code == 200
+        locks = response.json()['locks']
+        assert [(lock['key'], lock['status']) for lock in locks] == [(keys[0], '0,1'), (keys[1], None)]
+
+    async def test_check_bulk_lock_returns_locks_under_prefix_return_200(self, test_client, fake):
+        folder = fake.pystr()
+        key = f'{folder}/{fake.pystr()}'
+        await test_client.post('/v2/resource/lock/', json={'resource_key': key, 'operation': 'read'})
+
+        response = await test_client.post('/v2/resource/lock/bulk/status', json={'prefix': f'{folder}/', 'limit': 10})
+
+        assert response.status_code == 200
+        assert response.json() == {
+            'locks': [response.json()['locks'][0] | {'key': key, 'status': '1,0', 'read_count': 1}],
+            'next_cursor': None,
+        }
+
+    async def test_check_bulk_lock_requires_either_keys_or_prefix_return_422(self, test_client, fake):
+        payload = {'resource_keys': [fake.pystr()], 'prefix': fake.pystr()}
+
+        response = await test_client.post('/v2/resource/lock/bulk/status', json=payload)
+
+        assert response.status_code == 422
+
+    async def test_list_locks_returns_locks_under_prefix_page_by_page_return_200(self, test_client, fake):
+        folder = fake.pystr()
+        keys = sorted(f'{folder}/{fake.unique.pystr()}' for _ in range(3))
+        for key in keys:
+            await test_client.post('/v2/resource/lock/', json={'resource_key': key, 'operation': 'read'})
+
+        first_page = await test_client.get(
+            '/v2/resource/lock/inventory', query_string={'prefix': f'{folder}/', 'limit': 2}
+        )
+        second_page = await test_client.get(
+            '/v2/resource/lock/inventory',
+            query_string={'prefix': f'{folder}/', 'limit': 2, 'cursor': first_page.json()['next_cursor']},
+        )
+
+        assert first_page.status_code == 200
+        assert second_page.status_code == 200
+        locks = first_page.json()['locks'] + second_page.json()['locks']
+        assert [(lock['key'], lock['read_count'], lock['write_count']) for lock in locks] == [
+            (key, 1, 0) for key in keys
+        ]
+        assert all(0 <= lock['age'] < 60 for lock in locks)
+        assert second_page.json()['next_cursor'] is None
+
+    async def test_get_metrics_returns_lock_metrics_return_200(self, test_client, fake):
+        key = fake.pystr()
+        payload = {'resource_key': key, 'operation': 'write'}
+        for _ in range(2):
+            await test_client.post('/v2/resource/lock/', json=payload)
+
+        response = await test_client.get('/v2/resource/lock/metrics', query_string={'top': 1})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body['acquisitions'] == {'write': 1}
+        assert body['rejections'] == {'write': 1}
+        assert body['acquire_latency']['write']['count'] == 2
+        assert body['hot_keys'] == [{'key': key, 'count': 2, 'error': 0}]
+
+    async def test_upgrade_and_downgrade_convert_lock_of_the_owner_return_200(self, test_client, fake):
+        key = fake.pystr()
+        response = await test_client.post('/v2/resource/lock/', json={'resource_key': key, 'operation': 'read'})
+        payload = {'resource_key': key, 'token': response.json()['token']}
+
+        response = await test_client.post('/v2/resource/lock/upgrade', json=payload)
+        assert response.status_code == 200
+
+        response = await test_client.post('/v2/resource/lock/downgrade', json=payload)
+        assert response.status_code == 200
+
+        response = await test_client.get('/v2/resource/lock/', query_string={'resource_key': key})
+        assert response.json()['status'] == '1,0'
+
+    async def test_upgrade_returns_409_when_other_reader_exists(self, test_client, fake):
+        key = fake.pystr()
+        response = await test_client.post('/v2/resource/lock/', json={'resource_key': key, 'operation': 'read'})
+        token = response.json()['token']
+        await test_client.post('/v2/resource/lock/', json={'resource_key': key, 'operation': 'read'})
+
+        response = await test_client.post('/v2/resource/lock/upgrade', json={'resource_key': key, 'token': token})
+
+        assert response.status_code == 409
+
+    async def test_bulk_upgrade_and_bulk_downgrade_convert_all_locks_return_200(self, test_client, fake):
+        keys = [fake.pystr(), fake.pystr()]
+        response = await test_client.post('/v2/resource/lock/bulk', json={'resource_keys': keys, 'operation': 'read'})
+        payload = {'resource_keys': keys, 'token': response.json()['token']}
+
+        response = await test_client.post('/v2/resource/lock/bulk/upgrade', json=payload)
+        assert response.status_code == 200
+
+        response = await test_client.post('/v2/resource/lock/bulk/downgrade', json=payload)
+        assert response.status_code == 200
+
+    async def test_bulk_downgrade_returns_400_when_lock_is_not_owned(self, test_client, fake):
+        payload = {'resource_keys': [fake.pystr()], 'token': fake.pystr()}
+
+        response = await test_client.post('/v2/resource/lock/bulk/downgrade', json=payload)
+
+        assert response.status_code == 400
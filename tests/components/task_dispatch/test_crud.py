@@ -0,0 +1,566 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import json
+import time
+
+import pytest
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from dataops.components.codecs import get_codec
+from dataops.components.exceptions import AlreadyExists
+from dataops.components.exceptions import Conflict
+from dataops.components.exceptions import InvalidInput
+from dataops.components.exceptions import NotFound
+from dataops.components.schemas import EActionType
+from dataops.components.task_dispatch.crud import INDEX_BACKFILL_KEY
+from dataops.components.task_dispatch.crud import SessionJobCRUD
+from dataops.components.task_dispatch.schemas import TaskDeleteSchema
+from dataops.components.task_dispatch.schemas import TaskSchema
+from dataops.components.task_dispatch.schemas import TaskUpdateSchema
+from dataops.config import get_settings
+
+
+async def set_jobs(session_job_crud: SessionJobCRUD, redis: Redis, tasks: list[TaskSchema], seconds: list[int]) -> None:
+    """Create jobs and move their update time in the session index to the seconds from now."""
+
+    now = round(time.time())
+    for task, second in zip(tasks, seconds):
+        await session_job_crud.set_job(task)
+        index_key = session_job_crud.get_index_key(task.session_id)
+        job_keys, _ = await session_job_crud.get_keys_by_index(index_key, f'*:{task.job_id}:*')
+        await redis.zadd(index_key, {job_keys[0]: now + second}, xx=True)
+
+
+class TestSessionJobCRUD:
+    async def test_get_job_does_not_scan_keyspace(self, session_job_crud, task_factory, redis, mocker):
+        task = task_factory()
+        await session_job_crud.set_job(task)
+        spy = mocker.spy(redis, 'execute_command')
+
+        jobs = await session_job_crud.get_job(task.session_id, task.label, '*', '*', '*', '*')
+
+        assert [job['job_id'] for job in jobs] == [task.job_id]
+        assert 'KEYS' not in [call.args[0] for call in spy.call_args_list]
+
+    async def test_get_job_filters_jobs_of_the_session(self, session_job_crud, task_factory):
+        task = task_factory(action=EActionType.data_transfer.name)
+        other_task = task_factory(session_id=task.session_id, action=EActionType.data_delete.name)
+        other_session_task = task_factory(action=EActionType.data_transfer.name)
+        for entry in [task, other_task, other_session_task]:
+            await session_job_crud.set_job(entry)
+
+        jobs = await session_job_crud.get_job(task.session_id, task.label, '*', '*', task.action, '*')
+
+        assert [job['job_id'] for job in jobs] == [task.job_id]
+
+    async def test_get_job_removes_expired_jobs_from_index(self, session_job_crud, task_factory, redis):
+        task = task_factory()
+        await session_job_crud.set_job(task)
+        index_key = session_job_crud.get_index_key(task.session_id)
+        job_key = (await redis.zrange(index_key, 0, -1))[0]
+        await redis.delete(job_key)
+
+        jobs = await session_job_crud.get_job(task.session_id, task.label, task.job_id, '*', '*', '*')
+
+        assert jobs == []
+        assert await redis.zcard(index_key) == 0
+
+    async def test_get_job_increments_session_version_when_removing_expired_jobs_from_index(
+        self, session_job_crud, task_factory, redis
+    ):
+        task = task_factory()
+        await session_job_crud.set_job(task)
+        version = await session_job_crud.get_version(task.session_id)
+        job_key = (await redis.zrange(session_job_crud.get_index_key(task.session_id), 0, -1))[0]
+        await redis.delete(job_key)
+
+        await session_job_crud.get_job(task.session_id, task.label, task.job_id, '*', '*', '*')
+
+        assert await session_job_crud.get_version(task.session_id) > version
+
+    async def test_get_version_increments_version_when_jobs_expired_since_their_update(
+        self, session_job_crud, task_factory, redis
+    ):
+        task = task_factory()
+        await session_job_crud.set_job(task)
+        version = await session_job_crud.get_version(task.session_id)
+        index_key = session_job_crud.get_index_key(task.session_id)
+        job_key = (await redis.zrange(index_key, 0, -1))[0]
+        await redis.zadd(index_key, {job_key: time.time() - session_job_crud.expire * 3600 - 1}, xx=True)
+
+        new_version = await session_job_crud.get_version(task.session_id)
+
+        assert new_version > version
+        assert await session_job_crud.get_version(task.session_id) == new_version
+        assert await redis.zcard(index_key) == 0
+
+    async def test_delete_job_removes_only_matching_jobs_and_their_index_entries(
+        self, session_job_crud, task_factory, redis
+    ):
+        task = task_factory()
+        other_task = task_factory(session_id=task.session_id)
+        for entry in [task, other_task]:
+            await session_job_crud.set_job(entry)
+
+        await session_job_crud.delete_job(task)
+
+        jobs = await session_job_crud.get_job(task.session_id, task.label, '*', '*', '*', '*')
+        assert [job['job_id'] for job in jobs] == [other_task.job_id]
+        assert await redis.zcard(session_job_crud.get_index_key(task.session_id)) == 1
+
+    async def test_get_job_page_returns_jobs_page_by_page_in_descending_update_time_order(
+        self, session_job_crud, task_factory, redis
+    ):
+        session_id = task_factory().session_id
+        tasks = [task_factory(session_id=session_id) for _ in range(5)]
+        await set_jobs(session_job_crud, redis, tasks, [0, 0, 1, 2, 2])
+
+        job_ids = []
+        cursor = None
+        for _ in range(3):
+            jobs, cursor = await session_job_crud.get_job_page(session_id, 'Container', '*', '*', '*', '*', 2, cursor)
+            job_ids += [job['job_id'] for job in jobs]
+
+        assert cursor is None
+        assert sorted(job_ids[:2]) == sorted(task.job_id for task in tasks[3:])
+        assert job_ids[2] == tasks[2].job_id
+        assert sorted(job_ids[3:]) == sorted(task.job_id for task in tasks[:2])
+
+    async def test_get_job_page_skips_jobs_updated_before_since_timestamp(self, session_job_crud, task_factory, redis):
+        session_id = task_factory().session_id
+        tasks = [task_factory(session_id=session_id) for _ in range(2)]
+        await set_jobs(session_job_crud, redis, tasks, [0, 100])
+
+        jobs, _ = await session_job_crud.get_job_page(
+            session_id, 'Container', '*', '*', '*', '*', since_timestamp=round(time.time()) + 50
+        )
+
+        assert [job['job_id'] for job in jobs] == [tasks[1].job_id]
+
+    async def test_get_job_page_raises_invalid_input_for_malformed_cursor(self, session_job_crud, fake):
+        with pytest.raises(InvalidInput):
+            await session_job_crud.get_job_page(fake.uuid4(), 'Container', '*', '*', '*', '*', 2, fake.pystr())
+
+    async def test_update_job_takes_single_round_trip_after_lookup(self, session_job_crud, task_factory, redis, mocker):
+        task = task_factory(payload={'first': 1})
+        await session_job_crud.set_job(task)
+        await session_job_crud.scripts.load()
+        spy = mocker.spy(redis, 'execute_command')
+
+        job = await session_job_crud.update_job(
+            task.session_id, '*', '*', '*', task.label, task.job_id, {'second': 2}, 'RUNNING', 50
+        )
+
+        assert job['status'] == 'RUNNING'
+        assert job['progress'] == 50
+        assert job['payload'] == {'first': 1, 'second': 2}
+        assert [call.args[0] for call in spy.call_args_list] == ['ZREVRANGEBYSCORE', 'EVALSHA']
+
+    async def test_update_job_does_not_lose_concurrent_payload_updates(self, session_job_crud, task_factory):
+        task = task_factory()
+        await session_job_crud.set_job(task)
+
+        await asyncio.gather(
+            *(
+                session_job_crud.update_job(
+                    task.session_id, '*', '*', '*', task.label, task.job_id, {f'file_{i}': i}, 'RUNNING', i
+                )
+                for i in range(10)
+            )
+        )
+
+        jobs = await session_job_crud.get_job(task.session_id, task.label, task.job_id, '*', '*', '*')
+        assert jobs[0]['payload'] == {f'file_{i}': i for i in range(10)}
+
+    async def test_update_job_with_expected_status_updates_only_matching_job(self, session_job_crud, task_factory):
+        task = task_factory(target_status='INIT')
+        await session_job_crud.set_job(task)
+        args = (task.session_id, '*', '*', '*', task.label, task.job_id, {}, 'RUNNING', 0)
+
+        job = await session_job_crud.update_job(*args, expected_status='INIT')
+        with pytest.raises(Conflict):
+            await session_job_crud.update_job(*args, expected_status='INIT')
+
+        assert job['status'] == 'RUNNING'
+
+    async def test_update_job_converts_job_stored_in_legacy_format(self, session_job_crud, task_factory, redis):
+        task = task_factory(payload={'first': 1})
+        await session_job_crud.set_job(task)
+        index_key = session_job_crud.get_index_key(task.session_id)
+        job_key = (await redis.zrange(index_key, 0, -1))[0]
+        legacy_job = (await session_job_crud.get_job(task.session_id, task.label, '*', '*', '*', '*'))[0]
+        await redis.delete(job_key)
+        await redis.set(job_key, json.dumps(legacy_job), ex=3600)
+
+        job = await session_job_crud.update_job(
+            task.session_id, '*', '*', '*', task.label, task.job_id, {'second': 2}, 'RUNNING', 50
+        )
+
+        assert job == legacy_job | {
+            'status': 'RUNNING',
+            'progress': 50,
+            'payload': {'first': 1, 'second': 2},
+            'update_timestamp': job['update_timestamp'],
+        }
+        assert await redis.type(job_key) == b'hash'
+
+    async def test_convert_legacy_job_counts_job_converted_concurrently_once(
+        self, session_job_crud, task_factory, redis
+    ):
+        task = task_factory(payload={'first': 1})
+        await session_job_crud.set_job(task)
+        job_key = (await redis.zrange(session_job_crud.get_index_key(task.session_id), 0, -1))[0]
+        legacy_job = (await session_job_crud.get_job(task.session_id, task.label, '*', '*', '*', '*'))[0]
+        await redis.delete(*await redis.keys('dataaction:stats:*'))
+        await redis.set(job_key, json.dumps(legacy_job), ex=3600)
+
+        await asyncio.gather(session_job_crud.convert_legacy_job(job_key), session_job_crud.convert_legacy_job(job_key))
+
+        assert await redis.type(job_key) == b'hash'
+        assert 0 < await redis.ttl(job_key) <= 3600
+        assert (await session_job_crud.get_job(task.session_id, task.label, '*', '*', '*', '*'))[0] == legacy_job
+        assert await session_job_crud.get_stats(session_id=task.session_id) == [
+            {'label': task.label, 'code': task.code, 'action': task.action, 'status': legacy_job['status'], 'count': 1}
+        ]
+
+    async def test_update_job_converts_job_encoded_with_another_codec(self, redis, task_factory):
+        task = task_factory(payload={'first': 1})
+        await SessionJobCRUD(redis, get_codec('json')).set_job(task)
+        session_job_crud = SessionJobCRUD(redis, get_codec('msgpack'))
+
+        job = await session_job_crud.update_job(
+            task.session_id, '*', '*', '*', task.label, task.job_id, {'second': 2}, 'RUNNING', 50
+        )
+
+        assert job['payload'] == {'first': 1, 'second': 2}
+        assert (await session_job_crud.get_job(task.session_id, task.label, '*', '*', '*', '*'))[0] == job
+        job_key = (await redis.zrange(session_job_crud.get_index_key(task.session_id), 0, -1))[0]
+        assert await redis.hget(job_key, 'f') == b'msgpack'
+        assert await session_job_crud.get_stats(session_id=task.session_id) == [
+            {'label': task.label, 'code': task.code, 'action': task.action, 'status': 'RUNNING', 'count': 1}
+        ]
+
+    async def test_backfill_indexes_adds_jobs_stored_without_index_to_session_indexes(
+        self, session_job_crud, task_factory, redis
+    ):
+        task = task_factory(payload={'first': 1})
+        legacy_task = task_factory(session_id=task.session_id, label=task.label)
+        for entry in [task, legacy_task]:
+            await session_job_crud.set_job(entry)
+        index_key = session_job_crud.get_index_key(task.session_id)
+        legacy_job_key = (await session_job_crud.get_keys_by_index(index_key, f'*:{legacy_task.job_id}:*'))[0][0]
+        legacy_job = (await session_job_crud.get_job(task.session_id, task.label, legacy_task.job_id, '*', '*', '*'))[0]
+        await redis.delete(legacy_job_key, index_key)
+        await redis.set(legacy_job_key, json.dumps(legacy_job), ex=3600)
+
+        added_count = await session_job_crud.backfill_indexes()
+        jobs = await session_job_crud.get_job(task.session_id, task.label, '*', '*', '*', '*')
+        job = await session_job_crud.update_job(
+            task.session_id, '*', '*', '*', task.label, legacy_task.job_id, {'second': 2}, 'RUNNING', 50
+        )
+
+        assert added_count == 2
+        assert {job['job_id'] for job in jobs} == {task.job_id, legacy_task.job_id}
+        assert job['payload'] == legacy_job['payload'] | {'second': 2}
+        assert await redis.type(legacy_job_key) == b'hash'
+
+    async def test_backfill_indexes_scans_keyspace_once(self, session_job_crud, task_factory, redis, mocker):
+        await session_job_crud.set_job(task_factory())
+        await session_job_crud.backfill_indexes()
+        spy = mocker.spy(redis, 'execute_command')
+
+        added_count = await session_job_crud.backfill_indexes()
+
+        assert added_count == 0
+        assert 'SCAN' not in [call.args[0] for call in spy.call_args_list]
+        assert await redis.ttl(INDEX_BACKFILL_KEY) == -1
+
+    async def test_backfill_indexes_reads_scanned_keys_in_batches(self, session_job_crud, task_factory, redis, mocker):
+        task = task_factory()
+        for entry in [task, *(task_factory(session_id=task.session_id) for _ in range(2))]:
+            await session_job_crud.set_job(entry)
+        await redis.delete(session_job_crud.get_index_key(task.session_id))
+        index_spy = mocker.spy(session_job_crud, 'index_jobs')
+
+        added_count = await session_job_crud.backfill_indexes(batch_size=1)
+
+        assert added_count == 3
+        assert all(len(call.args[0]) <= 1 for call in index_spy.call_args_list)
+        assert await redis.zcard(session_job_crud.get_index_key(task.session_id)) == 3
+
+    async def test_set_job_stores_only_fields_missing_in_job_key(self, session_job_crud, task_factory, redis):
+        task = task_factory(payload={'first': 1})
+
+        await session_job_crud.set_job(task)
+
+        job_key = (await redis.zrange(session_job_crud.get_index_key(task.session_id), 0, -1))[0]
+        assert sorted(await redis.hkeys(job_key)) == [b'f', b'p.first', b'pr', b'st', b'ti', b'ts']
+
+    async def test_create_jobs_reports_already_existing_and_duplicated_jobs(self, session_job_crud, task_factory):
+        existing_task = task_factory()
+        await session_job_crud.set_job(existing_task)
+        new_task = task_factory(session_id=existing_task.session_id)
+
+        results = await session_job_crud.create_jobs([existing_task, new_task, new_task])
+
+        assert isinstance(results[0], AlreadyExists)
+        assert results[1]['job_id'] == new_task.job_id
+        assert isinstance(results[2], AlreadyExists)
+        jobs = await session_job_crud.get_job(existing_task.session_id, 'Container', '*', '*', '*', '*')
+        assert sorted(job['job_id'] for job in jobs) == sorted([existing_task.job_id, new_task.job_id])
+
+    async def test_create_jobs_takes_two_round_trips_for_any_number_of_jobs(
+        self, session_job_crud, task_factory, mocker
+    ):
+        tasks = [task_factory() for _ in range(10)]
+        spy = mocker.spy(Pipeline, 'execute')
+
+        await session_job_crud.create_jobs(tasks)
+
+        assert spy.call_count == 2
+
+    async def test_update_jobs_returns_updated_record_or_error_for_every_job(self, session_job_crud, task_factory):
+        tasks = [task_factory(target_status='INIT') for _ in range(3)]
+        for task in tasks:
+            await session_job_crud.set_job(task)
+        entries = [
+            TaskUpdateSchema(session_id=tasks[0].session_id, job_id=tasks[0].job_id, status='RUNNING'),
+            TaskUpdateSchema(
+                session_id=tasks[1].session_id, job_id=tasks[1].job_id, status='RUNNING', expected_status='FAILED'
+            ),
+            TaskUpdateSchema(session_id=tasks[2].session_id, job_id='unknown', status='RUNNING'),
+        ]
+
+        results = await session_job_crud.update_jobs(entries)
+
+        assert results[0]['status'] == 'RUNNING'
+        assert isinstance(results[1], Conflict)
+        assert isinstance(results[2], NotFound)
+
+    async def test_delete_jobs_returns_number_of_deleted_jobs_for_every_entry(self, session_job_crud, task_factory):
+        tasks = [task_factory() for _ in range(2)]
+        for task in tasks:
+            await session_job_crud.set_job(task)
+        entries = [
+            TaskDeleteSchema(session_id=tasks[0].session_id),
+            TaskDeleteSchema(session_id=tasks[1].session_id, job_id='unknown'),
+        ]
+
+        results = await session_job_crud.delete_jobs(entries)
+
+        assert results == [1, 0]
+        assert await session_job_crud.get_job(tasks[0].session_id, 'Container', '*', '*', '*', '*') == []
+
+    async def test_delete_job_unlinks_matching_jobs_in_single_round_trip(
+        self, session_job_crud, task_factory, mocker, redis
+    ):
+        task = task_factory()
+        tasks = [task_factory(session_id=task.session_id) for _ in range(3)]
+        for entry in tasks:
+            await session_job_crud.set_job(entry)
+        keys = await redis.keys(f'dataaction:{task.session_id}:*')
+        execute_spy = mocker.spy(Pipeline, 'execute')
+
+        deleted_count = await session_job_crud.delete_job(TaskDeleteSchema(session_id=task.session_id))
+
+        assert deleted_count == 3
+        assert execute_spy.call_count == 2
+        assert await redis.exists(*keys) == 0
+
+    async def test_detach_job_hides_jobs_until_they_are_unlinked(self, session_job_crud, task_factory, redis):
+        task = task_factory()
+        await session_job_crud.set_job(task)
+
+        keys = await session_job_crud.detach_job(TaskDeleteSchema(session_id=task.session_id))
+
+        assert await session_job_crud.get_job(task.session_id, 'Container', '*', '*', '*', '*') == []
+        assert await redis.exists(*keys) == 1
+        assert await session_job_crud.unlink_by_keys(keys) == 1
+        assert await redis.exists(*keys) == 0
+
+    async def test_get_stats_counts_existing_jobs_by_label_code_action_and_status(self, session_job_crud, task_factory):
+        task = task_factory(target_status='INIT')
+        other_task = task_factory(session_id=task.session_id, code=task.code, target_status='INIT')
+        await session_job_crud.set_job(task)
+        await session_job_crud.set_job(other_task)
+        group = {'label': task.label, 'code': task.code, 'action': task.action}
+
+        await session_job_crud.update_job(
+            task.session_id, '*', '*', '*', task.label, task.job_id, {'first': 1}, 'SUCCEED', 100
+        )
+        session_stats = await session_job_crud.get_stats(session_id=task.session_id)
+        code_stats = await session_job_crud.get_stats(code=task.code)
+
+        expected_stats = [{**group, 'status': 'INIT', 'count': 1}, {**group, 'status': 'SUCCEED', 'count': 1}]
+        assert sorted(session_stats, key=lambda stats: stats['status']) == expected_stats
+        assert sorted(code_stats, key=lambda stats: stats['status']) == expected_stats
+
+        await session_job_crud.delete_job(TaskDeleteSchema(session_id=task.session_id, job_id=task.job_id))
+
+        assert await session_job_crud.get_stats(session_id=task.session_id) == [{**group, 'status': 'INIT', 'count': 1}]
+
+    async def test_get_stats_of_session_counts_only_jobs_of_given_code(self, session_job_crud, task_factory):
+        task = task_factory()
+        other_code_task = task_factory(session_id=task.session_id, label=task.label, action=task.action)
+        for entry in [task, other_code_task]:
+            await session_job_crud.set_job(entry)
+
+        stats = await session_job_crud.get_stats(session_id=task.session_id, code=task.code)
+
+        assert [group['code'] for group in stats] == [task.code]
+
+    async def test_delete_job_removes_jobs_in_batches(self, session_job_crud, task_factory, mocker, redis):
+        mocker.patch('dataops.components.task_dispatch.crud.REMOVE_BATCH_SIZE', 2)
+        task = task_factory()
+        for entry in [task, *(task_factory(session_id=task.session_id) for _ in range(4))]:
+            await session_job_crud.set_job(entry)
+        remove_spy = mocker.spy(session_job_crud.scripts, 'remove')
+
+        deleted_count = await session_job_crud.delete_job(TaskDeleteSchema(session_id=task.session_id))
+
+        assert deleted_count == 5
+        assert [len(call.kwargs['keys']) for call in remove_spy.call_args_list] == [3, 3, 2]
+        assert await redis.keys(f'dataaction:{task.session_id}:*') == []
+        assert await session_job_crud.get_stats(session_id=task.session_id) == []
+
+    async def test_get_stats_counts_detached_jobs_as_removed(self, session_job_crud, task_factory):
+        task = task_factory()
+        await session_job_crud.set_job(task)
+
+        await session_job_crud.detach_job(TaskDeleteSchema(session_id=task.session_id))
+
+        assert await session_job_crud.get_stats(session_id=task.session_id) == []
+
+    async def test_get_job_history_returns_status_changes_of_job(self, session_job_crud, task_factory):
+        session_job_crud.history_max_length = 10
+        task = task_factory()
+        await session_job_crud.set_job(task)
+        for status, progress in [('RUNNING', 10), ('RUNNING', 50), ('FAILED', 50)]:
+            await session_job_crud.update_job(
+                task.session_id, '*', '*', '*', task.label, task.job_id, {}, status, progress
+            )
+
+        [job_history] = await session_job_crud.get_job_history(task.session_id, task.label, task.job_id, '*', '*', '*')
+
+        assert job_history['job_id'] == task.job_id
+        assert job_history['source'] == task.source
+        history = [(entry['status'], entry['progress']) for entry in job_history['history']]
+        assert history == [('INIT', 0), ('RUNNING', 10), ('FAILED', 50)]
+
+    async def test_job_history_is_capped_by_length(self, session_job_crud, task_factory, redis):
+        session_job_crud.history_max_length = 2
+        task = task_factory()
+        key, _ = session_job_crud.build_job(task)
+        await session_job_crud.create_jobs([task])
+        for status in ['RUNNING', 'FAILED']:
+            await session_job_crud.update_jobs(
+                [TaskUpdateSchema(session_id=task.session_id, job_id=task.job_id, status=status)]
+            )
+
+        entries = await redis.xrange(session_job_crud.get_history_key(key))
+
+        assert [entry[b'st'] for _, entry in entries] == [b'"RUNNING"', b'"FAILED"']
+
+    async def test_job_history_is_not_recorded_by_default(self, session_job_crud, task_factory, redis):
+        task = task_factory()
+        key, _ = session_job_crud.build_job(task)
+        await session_job_crud.set_job(task)
+        await session_job_crud.update_job(task.session_id, '*', '*', '*', task.label, task.job_id, {}, 'RUNNING', 10)
+
+        assert await redis.exists(session_job_crud.get_history_key(key)) == 0
+
+    async def test_delete_job_unlinks_job_history(self, session_job_crud, task_factory, redis):
+        session_job_crud.history_max_length = 10
+        task = task_factory()
+        key, _ = session_job_crud.build_job(task)
+        await session_job_crud.set_job(task)
+
+        await session_job_crud.delete_job(TaskDeleteSchema(session_id=task.session_id))
+
+        assert await redis.exists(session_job_crud.get_history_key(key)) == 0
+
+    async def test_job_changes_are_published_to_session_events_channel(self, session_job_crud, task_factory, redis):
+        task = task_factory(target_status='INIT')
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(session_job_crud.get_events_channel(task.session_id))
+        await pubsub.get_message(timeout=1.0)
+
+        await session_job_crud.set_job(task)
+        await session_job_crud.update_job(
+            task.session_id, '*', '*', '*', task.label, task.job_id, {'first': 1}, 'RUNNING', 10
+        )
+        await session_job_crud.delete_job(TaskDeleteSchema(session_id=task.session_id))
+
+        events = []
+        for _ in range(3):
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            events.append(json.loads(message['data']))
+        await pubsub.reset()
+        assert [event['type'] for event in events] == ['set', 'updated', 'deleted']
+        assert events[0]['job']['status'] == 'INIT'
+        assert events[1]['job']['job_id'] == task.job_id
+        assert events[1]['job']['status'] == 'RUNNING'
+        assert events[1]['add_payload'] == {'first': 1}
+        assert events[2]['deleted_count'] == 1
+
+    async def test_listen_events_yields_published_events_until_client_disconnects(
+        self, session_job_crud, task_factory, mocker
+    ):
+        mocker.patch.object(get_settings(), 'SSE_DISCONNECT_CHECK_INTERVAL', 0.01)
+        disconnected = asyncio.Event()
+        request = mocker.Mock(is_disconnected=mocker.AsyncMock(side_effect=lambda: disconnected.is_set()))
+        task = task_factory()
+        events = session_job_crud.listen_events(request, task.session_id)
+        first_event = asyncio.create_task(events.__anext__())
+        await asyncio.sleep(0.1)
+
+        await session_job_crud.set_job(task)
+        event = json.loads(await asyncio.wait_for(first_event, 1))
+        disconnected.set()
+
+        assert event['job']['job_id'] == task.job_id
+        with pytest.raises(StopAsyncIteration):
+            await asyncio.wait_for(events.__anext__(), 1)
+
+    async def test_listen_events_stops_once_request_times_out(self, session_job_crud, task_factory, mocker):
+        request = mocker.Mock(is_disconnected=mocker.AsyncMock(return_value=False))
+
+        events = [event async for event in session_job_crud.listen_events(request, task_factory().session_id, 0.2)]
+
+        assert events == []
+        request.is_disconnected.assert_awaited()
+
+    async def test_job_update_rejected_by_expected_status_is_not_published(self, session_job_crud, task_factory, redis):
+        task = task_factory(target_status='INIT')
+        await session_job_crud.set_job(task)
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(session_job_crud.get_events_channel(task.session_id))
+        await pubsub.get_message(timeout=1.0)
+
+        with pytest.raises(Conflict):
+            await session_job_crud.update_job(
+                task.session_id, '*', '*', '*', task.label, task.job_id, {}, 'RUNNING', 10, 'FAILED'
+            )
+
+        assert await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.1) is None
+        await pubsub.reset()
+
+    async def test_every_job_change_increments_session_version(self, session_job_crud, task_factory):
+        task = task_factory()
+        versions = [await session_job_crud.get_version(task.session_id)]
+
+        await session_job_crud.set_job(task)
+        versions.append(await session_job_crud.get_version(task.session_id))
+        await session_job_crud.update_job(task.session_id, '*', '*', '*', task.label, task.job_id, {}, 'RUNNING', 1)
+        versions.append(await session_job_crud.get_version(task.session_id))
+        await session_job_crud.delete_job(TaskDeleteSchema(session_id=task.session_id))
+        versions.append(await session_job_crud.get_version(task.session_id))
+
+        assert versions[0] is None
+        assert versions[1] < versions[2] < versions[3]
@@ -4,11 +4,15 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+import json
+
 from dataops.components.schemas import EActionType
+from dataops.config import get_settings
 
 
 class TestTaskDispatchViews:
-    async def test_create_new_task_return_200(self, test_client, create_fake_job_response, fake_job_save_status):
+    async def test_create_new_task_return_200(self, test_client, create_fake_job_response, redis):
         payload = {
             'session_id': '12345',
             'task_id': '5678',
@@ -30,6 +34,9 @@ class TestTaskDispatchViews:
         res = response.json()['task_status']
         assert response.status_code == 200
         assert res == 'SUCCEED'
+        assert await redis.zrange('dataaction:index:12345', 0, -1) == [
+            b'dataaction:12345:Container:fake_global_entity_id:data_transfer:testcode:me:any'
+        ]
 
     async def test_create_new_task_with_duplicate_job_id_return_409(self, test_client, create_fake_job):
         payload = {
@@ -69,7 +76,7 @@ class TestTaskDispatchViews:
         assert res['update_timestamp'] == '1643041442'
         assert response.status_code == 200
 
-    async def test_delete_task_return_200(self, test_client, create_fake_job_delete_response):
+    async def test_delete_task_return_200(self, test_client):
         payload = {
             'session_id': '12345',
             'label': 'Container',
@@ -84,9 +91,19 @@ class TestTaskDispatchViews:
         assert response.status_code == 200
         assert res == 'SUCCEED'
 
-    async def test_update_task_return_200(
-        self, test_client, create_fake_job_updated, fake_job_save_status_updated_task
-    ):
+    async def test_update_task_merges_payload_return_200(self, test_client):
+        payload = {
+            'session_id': '12345',
+            'task_id': '5678',
+            'job_id': 'fake_global_entity_id',
+            'source': 'any',
+            'action': EActionType.data_transfer.name,
+            'target_status': 'TRANSFER',
+            'operator': 'me',
+            'code': 'testcode',
+            'payload': {'task_id': 'fake_global_entity_id', 'parent_folder_geid': None},
+        }
+        await test_client.post('/v1/tasks/', json=payload)
         payload = {
             'session_id': '12345',
             'label': 'Container',
@@ -98,4 +115,232 @@ class TestTaskDispatchViews:
         response = await test_client.put('/v1/tasks/', json=payload)
         res = response.json()['task_info']
         assert response.status_code == 200
-        assert res['payload']['parent_folder_geid'] == 'newgeid'
+        assert res['status'] == 'SUCCEED'
+        assert res['progress'] == 1
+        assert res['payload'] == {'task_id': 'fake_global_entity_id', 'parent_folder_geid': 'newgeid'}
+
+    async def test_update_task_with_not_matching_expected_status_return_409(self, test_client, fake):
+        payload = {
+            'session_id': '12345',
+            'job_id': 'fake_global_entity_id',
+            'source': 'any',
+            'action': EActionType.data_transfer.name,
+            'target_status': 'RUNNING',
+            'operator': 'me',
+            'code': 'testcode',
+        }
+        await test_client.post('/v1/tasks/', json=payload)
+        payload = {
+            'session_id': '12345',
+            'job_id': 'fake_global_entity_id',
+            'status': 'SUCCEED',
+            'expected_status': 'INIT',
+        }
+        response = await test_client.put('/v1/tasks/', json=payload)
+        assert response.status_code == 409
+
+    async def test_get_task_with_limit_returns_page_and_next_cursor_return_200(self, test_client, fake):
+        session_id = fake.uuid4()
+        for _ in range(2):
+            payload = {
+                'session_id': session_id,
+                'job_id': fake.uuid4(),
+                'source': 'any',
+                'action': EActionType.data_transfer.name,
+                'code': 'testcode',
+                'operator': 'me',
+            }
+            await test_client.post('/v1/tasks/', json=payload)
+
+        first_page = await test_client.get('/v1/tasks/', query_string={'session_id': session_id, 'limit': 1})
+        second_page = await test_client.get(
+            '/v1/tasks/',
+            query_string={'session_id': session_id, 'limit': 1, 'cursor': first_page.json()['next_cursor']},
+        )
+
+        assert first_page.status_code == 200
+        assert second_page.status_code == 200
+        assert len(first_page.json()['task_info']) == 1
+        assert len(second_page.json()['task_info']) == 1
+        assert first_page.json()['task_info'][0]['job_id'] != second_page.json()['task_info'][0]['job_id']
+
+    async def test_bulk_create_update_and_delete_tasks_return_result_for_every_task_return_200(self, test_client, fake):
+        session_id = fake.uuid4()
+        job_ids = [fake.uuid4() for _ in range(2)]
+        tasks = [
+            {
+                'session_id': session_id,
+                'job_id': job_id,
+                'source': 'any',
+                'action': EActionType.data_transfer.name,
+                'code': 'testcode',
+                'operator': 'me',
+            }
+            for job_id in job_ids
+        ]
+
+        created = await test_client.post('/v1/tasks/bulk', json=tasks + tasks[:1])
+        updated = await test_client.put(
+            '/v1/tasks/bulk',
+            json=[{'session_id': session_id, 'job_id': job_id, 'status': 'RUNNING'} for job_id in job_ids],
+        )
+        deleted = await test_client.delete('/v1/tasks/bulk', json=[{'session_id': session_id}])
+
+        assert created.status_code == 200
+        assert [result['task_status'] for result in created.json()['results']] == ['SUCCEED', 'SUCCEED', 'FAILED']
+        assert created.json()['results'][2]['error']['code'] == 'global.already_exists'
+        assert updated.status_code == 200
+        assert [result['task_info']['status'] for result in updated.json()['results']] == ['RUNNING', 'RUNNING']
+        assert deleted.status_code == 200
+        assert deleted.json()['results'][0]['task_info'] == {'deleted_count': 2}
+
+    async def test_bulk_create_tasks_rejects_empty_list_return_422(self, test_client):
+        response = await test_client.post('/v1/tasks/bulk', json=[])
+
+        assert response.status_code == 422
+
+    async def test_delete_task_asynchronously_returns_number_of_deleted_tasks_return_200(
+        self, test_client, redis, fake
+    ):
+        session_id = fake.uuid4()
+        payload = {
+            'session_id': session_id,
+            'job_id': fake.uuid4(),
+            'source': 'any',
+            'action': EActionType.data_transfer.name,
+            'code': 'testcode',
+            'operator': 'me',
+        }
+        await test_client.post('/v1/tasks/', json=payload)
+
+        response = await test_client.delete(
+            '/v1/tasks/', json={'session_id': session_id}, query_string={'asynchronous': True}
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {'task_status': 'SUCCEED', 'deleted_count': 1}
+        assert await redis.keys(f'dataaction:{session_id}:*') == []
+
+    async def test_get_events_streams_task_changes_over_sse_return_200(self, test_client, fake):
+        session_id = fake.uuid4()
+        payload = {
+            'session_id': session_id,
+            'job_id': fake.uuid4(),
+            'source': 'any',
+            'action': EActionType.data_transfer.name,
+            'code': 'testcode',
+            'operator': 'me',
+        }
+        events = asyncio.create_task(
+            test_client.get('/v1/tasks/events', query_string={'session_id': session_id, 'request_timeout': 1})
+        )
+        await asyncio.sleep(0.2)
+
+        await test_client.post('/v1/tasks/', json=payload)
+        response = await events
+
+        assert response.status_code == 200
+        data = [json.loads(line[6:]) for line in response.text.splitlines() if line.startswith('data: ')]
+        assert [(event['type'], event['job']['job_id']) for event in data] == [('set', payload['job_id'])]
+
+    async def test_get_task_returns_304_when_session_version_matches_etag_return_304(self, test_client, fake):
+        session_id = fake.uuid4()
+        payload = {
+            'session_id': session_id,
+            'job_id': fake.uuid4(),
+            'source': 'any',
+            'action': EActionType.data_transfer.name,
+            'code': 'testcode',
+            'operator': 'me',
+        }
+        await test_client.post('/v1/tasks/', json=payload)
+        response = await test_client.get('/v1/tasks/', query_string={'session_id': session_id})
+        etag = response.headers['ETag']
+
+        not_modified = await test_client.get(
+            '/v1/tasks/', query_string={'session_id': session_id}, headers={'If-None-Match': etag}
+        )
+        await test_client.put(
+            '/v1/tasks/', json={'session_id': session_id, 'job_id': payload['job_id'], 'status': 'RUNNING'}
+        )
+        modified = await test_client.get(
+            '/v1/tasks/', query_string={'session_id': session_id}, headers={'If-None-Match': etag}
+        )
+
+        assert not_modified.status_code == 304
+        assert not_modified.headers['ETag'] == etag
+        assert modified.status_code == 200
+        assert modified.headers['ETag'] != etag
+        assert modified.json()['task_info'][0]['status'] == 'RUNNING'
+
+    async def test_get_aggregate_counts_tasks_by_label_code_action_and_status_return_200(self, test_client, fake):
+        session_id = fake.uuid4()
+        job_ids = [fake.uuid4() for _ in range(3)]
+        for job_id in job_ids:
+            payload = {
+                'session_id': session_id,
+                'job_id': job_id,
+                'source': 'any',
+                'action': EActionType.data_transfer.name,
+                'code': 'testcode',
+                'operator': 'me',
+            }
+            await test_client.post('/v1/tasks/', json=payload)
+        await test_client.put('/v1/tasks/', json={'session_id': session_id, 'job_id': job_ids[0], 'status': 'RUNNING'})
+
+        response = await test_client.get('/v1/tasks/aggregate', query_string={'session_id': session_id})
+
+        assert response.status_code == 200
+        groups = sorted(response.json()['groups'], key=lambda group: group['status'])
+        assert [(group['status'], group['count']) for group in groups] == [('INIT', 2), ('RUNNING', 1)]
+        assert groups[1]['code'] == 'testcode'
+
+    async def test_get_aggregate_counts_tasks_of_session_with_code_return_200(self, test_client, fake):
+        session_id = fake.uuid4()
+        for code in ['testcode', 'othercode']:
+            payload = {
+                'session_id': session_id,
+                'job_id': fake.uuid4(),
+                'source': 'any',
+                'action': EActionType.data_transfer.name,
+                'code': code,
+                'operator': 'me',
+            }
+            await test_client.post('/v1/tasks/', json=payload)
+
+        response = await test_client.get(
+            '/v1/tasks/aggregate', query_string={'session_id': session_id, 'code': 'testcode'}
+        )
+
+        assert response.status_code == 200
+        assert [(group['code'], group['count']) for group in response.json()['groups']] == [('testcode', 1)]
+
+    async def test_get_aggregate_without_session_id_and_code_return_400(self, test_client):
+        response = await test_client.get('/v1/tasks/aggregate')
+
+        assert response.status_code == 400
+
+    async def test_get_history_returns_status_changes_of_task_return_200(self, test_client, fake, monkeypatch):
+        monkeypatch.setattr(get_settings(), 'TASK_HISTORY_ENABLED', True)
+        session_id = fake.uuid4()
+        payload = {
+            'session_id': session_id,
+            'job_id': fake.uuid4(),
+            'source': 'any',
+            'action': EActionType.data_transfer.name,
+            'code': 'testcode',
+            'operator': 'me',
+        }
+        await test_client.post('/v1/tasks/', json=payload)
+        await test_client.put(
+            '/v1/tasks/',
+            json={'session_id': session_id, 'job_id': payload['job_id'], 'status': 'FAILED', 'progress': 30},
+        )
+
+        response = await test_client.get(
+            '/v1/tasks/history', query_string={'session_id': session_id, 'job_id': payload['job_id']}
+        )
+
+        assert response.status_code == 200
+        history = response.json()['task_history'][0]['history']
+        assert [(entry['status'], entry['progress']) for entry in history] == [('INIT', 0), ('FAILED', 30)]
@@ -0,0 +1,171 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import json
+import uuid
+from collections.abc import AsyncIterator
+
+import pytest
+
+from dataops.components.codecs import get_codec
+from dataops.components.schemas import EActionType
+from dataops.components.schemas import EFileStatus
+from dataops.components.task_stream.crud import StreamCRUD
+from dataops.components.task_stream.schemas import SSETaskStreamSchema
+from dataops.components.task_stream.schemas import TaskStreamCreateSchema
+from dataops.components.task_stream.schemas import TaskStreamRangeSchema
+
+
+@pytest.fixture
+def file_status(fake) -> TaskStreamCreateSchema:
+    return TaskStreamCreateSchema(
+        session_id=f'{fake.user_name()}-{uuid.uuid4()}',
+        target_names=[fake.file_name(), fake.file_name()],
+        target_type='batch',
+        container_code='test_project',
+        container_type='project',
+        action_type=EActionType.data_upload.name,
+        status=EFileStatus.RUNNING.name,
+    )
+
+
+class TestStreamCRUD:
+    @pytest.mark.parametrize('codec_name', ['json', 'msgpack'])
+    async def test_create_status_stores_entry_encoded_by_codec(self, redis, file_status, codec_name):
+        stream_crud = StreamCRUD(redis, get_codec(codec_name))
+
+        await stream_crud.create_status(file_status)
+
+        entries = await redis.xrange(file_status.session_id)
+        [parsed_status] = stream_crud.parse_file_status([[file_status.session_id.encode(), entries]])
+        assert list(entries[0][1]) == [codec_name.encode()]
+        assert parsed_status.copy(update={'entry_id': None}) == file_status
+
+    async def test_create_status_stores_entry_in_legacy_format_when_enabled(self, redis, file_status):
+        stream_crud = StreamCRUD(redis, legacy_format=True)
+
+        await stream_crud.create_status(file_status)
+
+        [(_, values)] = await redis.xrange(file_status.session_id)
+        assert values[b'target_names'] == str(file_status.target_names).encode()
+        assert values[b'job_id'] == str(file_status.job_id).encode()
+        [parsed_status] = stream_crud.parse_file_status([[file_status.session_id.encode(), [(b'0-1', values)]]])
+        assert parsed_status.copy(update={'entry_id': None}) == file_status
+
+    async def test_get_status_reads_entries_stored_by_previous_versions(self, redis, file_status):
+        stream_crud = StreamCRUD(redis)
+        values = file_status.to_payload()
+        values.pop('entry_id')
+        values.pop('session_id')
+        values['target_names'] = str(values['target_names'])
+        await redis.xadd(file_status.session_id, values)
+        await stream_crud.create_status(file_status)
+
+        entries = await redis.xrange(file_status.session_id)
+        parsed_statuses = stream_crud.parse_file_status([[file_status.session_id.encode(), entries]])
+        assert [parsed_status.copy(update={'entry_id': None}) for parsed_status in parsed_statuses] == [file_status] * 2
+
+    async def test_create_status_trims_stream_and_refreshes_expiration(self, redis, file_status, mocker):
+        mocker.patch('dataops.components.task_stream.crud.settings.TASK_STREAM_MAX_LENGTH', 2)
+        mocker.patch('dataops.components.task_stream.crud.settings.TASK_STREAM_EXPIRE', 3600)
+        stream_crud = StreamCRUD(redis)
+
+        for _ in range(3):
+            await stream_crud.create_status(file_status)
+
+        assert await redis.xlen(file_status.session_id) == 2
+        assert 0 < await redis.ttl(file_status.session_id) <= 3600
+
+    def test_get_retention_returns_minimum_id_for_maximum_age(self, mocker):
+        mocker.patch('dataops.components.task_stream.crud.settings.TASK_STREAM_MAX_AGE', 60)
+        mocker.patch('dataops.components.task_stream.parsing.time', return_value=1000)
+
+        retention = StreamCRUD.get_retention()
+
+        assert retention['min_id'] == '940000'
+
+    async def test_get_status_without_sse_returns_pages_of_latest_statuses(self, redis, file_status):
+        stream_crud = StreamCRUD(redis)
+        for status in [EFileStatus.WAITING, EFileStatus.RUNNING, EFileStatus.SUCCEED]:
+            await stream_crud.create_status(file_status.copy(update={'status': status.name}))
+
+        first_page = await stream_crud.get_status_without_sse(
+            TaskStreamRangeSchema(session_id=file_status.session_id, count=2, reverse=True)
+        )
+        last_page = await stream_crud.get_status_without_sse(
+            TaskStreamRangeSchema(session_id=file_status.session_id, end=first_page.next_cursor, count=2, reverse=True)
+        )
+
+        assert [status['status'] for status in first_page.stream_info] == [
+            EFileStatus.SUCCEED.name,
+            EFileStatus.RUNNING.name,
+        ]
+        assert [status['status'] for status in last_page.stream_info] == [EFileStatus.WAITING.name]
+        assert last_page.next_cursor is None
+
+    async def test_get_status_with_sse_returns_statuses_written_while_connected(
+        self, redis, stream_hub, file_status, mocker
+    ):
+        stream_crud = StreamCRUD(redis)
+        request = mocker.Mock(is_disconnected=mocker.AsyncMock(return_value=False))
+        await stream_crud.create_status(file_status)
+
+        response = await stream_crud.get_status_with_sse(
+            request, SSETaskStreamSchema(session_id=file_status.session_id, request_timeout=1), stream_hub
+        )
+        events = asyncio.create_task(self.collect(response.body_iterator))
+        await asyncio.sleep(0.2)
+        await stream_crud.create_status(file_status.copy(update={'status': EFileStatus.SUCCEED.name}))
+
+        events = await asyncio.wait_for(events, timeout=2)
+        entries = await redis.xrange(file_status.session_id)
+        assert [event['id'] for event in events] == [entry_id.decode() for entry_id, _ in entries]
+        assert [json.loads(event['data'])['status'] for event in events] == [
+            EFileStatus.RUNNING.name,
+            EFileStatus.SUCCEED.name,
+        ]
+
+    async def test_get_status_with_sse_resumes_after_from_id(self, redis, stream_hub, file_status, mocker):
+        stream_crud = StreamCRUD(redis)
+        request = mocker.Mock(is_disconnected=mocker.AsyncMock(return_value=False))
+        await stream_crud.create_status(file_status)
+        await stream_crud.create_status(file_status.copy(update={'status': EFileStatus.SUCCEED.name}))
+        [(first_entry_id, _), (last_entry_id, _)] = await redis.xrange(file_status.session_id)
+
+        params = SSETaskStreamSchema(session_id=file_status.session_id, request_timeout=1, from_id=first_entry_id)
+        response = await stream_crud.get_status_with_sse(request, params, stream_hub)
+        events = await asyncio.wait_for(self.collect(response.body_iterator), timeout=2)
+
+        assert [event['id'] for event in events] == [last_entry_id.decode()]
+
+    async def test_get_status_with_sse_unsubscribes_once_client_disconnects(self, redis, stream_hub, mocker):
+        stream_crud = StreamCRUD(redis)
+        mocker.patch('dataops.components.task_stream.crud.settings.SSE_DISCONNECT_CHECK_INTERVAL', 0.01)
+        request = mocker.Mock(is_disconnected=mocker.AsyncMock(side_effect=[False, True]))
+
+        response = await stream_crud.get_status_with_sse(request, SSETaskStreamSchema(session_id='any'), stream_hub)
+        events = await asyncio.wait_for(self.collect(response.body_iterator), timeout=1)
+
+        assert events == []
+        assert stream_hub.subscriptions == {}
+        assert stream_hub.offsets == {}
+
+    async def test_get_status_with_sse_stops_at_request_timeout(self, redis, stream_hub, mocker):
+        stream_crud = StreamCRUD(redis)
+        request = mocker.Mock(is_disconnected=mocker.AsyncMock(return_value=False))
+
+        response = await stream_crud.get_status_with_sse(
+            request, SSETaskStreamSchema(session_id='any', request_timeout=1), stream_hub
+        )
+        events = await asyncio.wait_for(self.collect(response.body_iterator), timeout=2)
+
+        assert events == []
+        assert stream_hub.subscriptions == {}
+
+    @staticmethod
+    async def collect(events: AsyncIterator[dict]) -> list[dict]:
+        return [event async for event in events]
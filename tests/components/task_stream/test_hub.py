@@ -0,0 +1,117 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import uuid
+
+import pytest
+from fastapi import FastAPI
+
+from dataops.app import shutdown_event
+from dataops.components.schemas import EActionType
+from dataops.components.schemas import EFileStatus
+from dataops.components.task_stream.crud import StreamCRUD
+from dataops.components.task_stream.dependencies import get_stream_hub
+from dataops.components.task_stream.hub import StreamHub
+from dataops.components.task_stream.hub import parse_entry_id
+from dataops.components.task_stream.schemas import TaskStreamCreateSchema
+from dataops.config import get_settings
+
+
+@pytest.fixture
+def stream_crud(redis) -> StreamCRUD:
+    return StreamCRUD(redis)
+
+
+def build_file_status(session_id: str, status: EFileStatus = EFileStatus.RUNNING) -> TaskStreamCreateSchema:
+    return TaskStreamCreateSchema(
+        session_id=session_id,
+        target_names=['file.txt'],
+        target_type='file',
+        container_code='test_project',
+        container_type='project',
+        action_type=EActionType.data_upload.name,
+        status=status.name,
+    )
+
+
+class TestStreamHub:
+    def test_parse_entry_id_orders_ids_numerically(self):
+        assert parse_entry_id('0') < parse_entry_id('9-1') < parse_entry_id('10-0') < parse_entry_id('10-2')
+
+    async def test_subscriptions_of_all_streams_are_served_by_single_read(self, redis, stream_hub, stream_crud, mocker):
+        session_ids = [f'test-{uuid.uuid4()}', f'test-{uuid.uuid4()}']
+        xread = mocker.spy(type(redis), 'xread')
+
+        async with stream_hub.subscribe(session_ids[0]) as first, stream_hub.subscribe(
+            session_ids[0]
+        ) as second, stream_hub.subscribe(session_ids[1]) as third:
+            reads = [asyncio.create_task(subscription.get()) for subscription in [first, second, third]]
+            await asyncio.sleep(0.05)
+            for session_id in session_ids:
+                await stream_crud.create_status(build_file_status(session_id))
+
+            results = await asyncio.wait_for(asyncio.gather(*reads), timeout=1)
+
+        assert [[file_status.session_id for file_status in result] for result in results] == [
+            [session_ids[0]],
+            [session_ids[0]],
+            [session_ids[1]],
+        ]
+        blocking_reads = [call.args[1] for call in xread.call_args_list if call.kwargs.get('block')]
+        assert any(streams.keys() == set(session_ids) for streams in blocking_reads)
+
+    async def test_subscription_returns_statuses_written_before_subscribing(self, stream_hub, stream_crud):
+        session_id = f'test-{uuid.uuid4()}'
+        await stream_crud.create_status(build_file_status(session_id))
+
+        async with stream_hub.subscribe(session_id) as subscription:
+            [file_status] = await asyncio.wait_for(subscription.get(), timeout=1)
+
+        assert file_status.status == EFileStatus.RUNNING.name
+
+    async def test_subscription_reads_stream_once_queue_overflows(self, redis, stream_crud):
+        session_id = f'test-{uuid.uuid4()}'
+        stream_hub = StreamHub(redis, block_timeout=100, queue_size=1)
+
+        async with stream_hub.subscribe(session_id) as subscription:
+            await stream_crud.create_status(build_file_status(session_id))
+            await asyncio.wait_for(subscription.get(), timeout=1)
+            await stream_hub.stop()
+            for status in [EFileStatus.SUCCEED, EFileStatus.FAILED]:
+                await stream_crud.create_status(build_file_status(session_id, status))
+                stream_hub.dispatch(await redis.xread({session_id: stream_hub.offsets[session_id]}))
+
+            file_statuses = await asyncio.wait_for(subscription.get(), timeout=1)
+
+        await stream_hub.stop()
+        assert [file_status.status for file_status in file_statuses] == [
+            EFileStatus.SUCCEED.name,
+            EFileStatus.FAILED.name,
+        ]
+
+    async def test_stream_is_not_followed_once_last_subscription_is_closed(self, stream_hub, stream_crud):
+        session_id = f'test-{uuid.uuid4()}'
+
+        async with stream_hub.subscribe(session_id) as subscription:
+            await stream_crud.create_status(build_file_status(session_id))
+            await asyncio.wait_for(subscription.get(), timeout=1)
+            assert session_id in stream_hub.offsets
+
+        assert stream_hub.subscriptions == {}
+        assert stream_hub.offsets == {}
+
+
+async def test_shutdown_event_stops_reading_streams_by_hub(redis, monkeypatch):
+    monkeypatch.setattr(get_stream_hub, 'instance', None)
+    settings = get_settings()
+    stream_hub = await get_stream_hub(redis, settings)
+    stream_hub.start()
+    await asyncio.sleep(0)
+
+    await shutdown_event(FastAPI())
+
+    assert stream_hub.task is None
@@ -204,14 +204,14 @@ class TestTaskStreamViews:
         for entry in response_data:
             assert entry['container_code'] == 'test_project'
 
-    async def test_get_static_file_status_entry_return_200(self, test_client, fake, fake_redis_streams_xread):
+    async def test_get_static_file_status_entry_return_200(self, test_client, fake, fake_redis_streams_xrange):
         params = {'session_id': f'{fake.user_name()}-{str(uuid.uuid4())}'}
         response = await test_client.get('/v1/task-stream/static/', query_string=params)
         assert response.status_code == 200
         assert response.json()['total'] == 3
 
     async def test_get_static_file_status_entry_filter_by_container_code_return_200(
-        self, test_client, fake, fake_redis_streams_xread
+        self, test_client, fake, fake_redis_streams_xrange
     ):
         params = {
             'session_id': f'{fake.user_name()}-{str(uuid.uuid4())}',
@@ -224,6 +224,35 @@ class TestTaskStreamViews:
         for entry in response.json()['stream_info']:
             assert entry['container_code'] == 'test_project'
 
+    async def test_get_static_file_status_entry_page_return_200(self, test_client, fake, fake_redis_streams_xrange):
+        params = {'session_id': f'{fake.user_name()}-{str(uuid.uuid4())}', 'start': '1669237934000', 'count': 1}
+        response = await test_client.get('/v1/task-stream/static/', query_string=params)
+        assert response.status_code == 200
+        assert [entry['entry_id'] for entry in response.json()['stream_info']] == ['1669237934500-0']
+        assert response.json()['next_cursor'] == '1669237936000-0'
+
+        params['start'] = response.json()['next_cursor']
+        response = await test_client.get('/v1/task-stream/static/', query_string=params)
+        assert [entry['entry_id'] for entry in response.json()['stream_info']] == ['1669237936000-0']
+        assert response.json()['next_cursor'] is None
+
+    async def test_get_static_file_status_entry_latest_page_return_200(
+        self, test_client, fake, fake_redis_streams_xrange
+    ):
+        params = {'session_id': f'{fake.user_name()}-{str(uuid.uuid4())}', 'count': 2, 'reverse': True}
+        response = await test_client.get('/v1/task-stream/static/', query_string=params)
+        assert response.status_code == 200
+        assert [entry['entry_id'] for entry in response.json()['stream_info']] == [
+            '1669237936000-0',
+            '1669237934500-0',
+        ]
+        assert response.json()['next_cursor'] == '1669237933000-0'
+
+    async def test_get_static_file_status_entry_invalid_start_return_422(self, test_client, fake):
+        params = {'session_id': f'{fake.user_name()}-{str(uuid.uuid4())}', 'start': 'latest'}
+        response = await test_client.get('/v1/task-stream/static/', query_string=params)
+        assert response.status_code == 422
+
     async def test_get_file_status_entry_filter_by_action_type_return_200(
         self,
         test_client,
@@ -290,6 +319,56 @@ class TestTaskStreamViews:
             assert entry['container_code'] == 'test_project'
             assert entry['job_id'] == '1b51ac5e-eb49-40c8-b072-9115ef3ec2a5'
 
+    async def test_get_file_status_entry_resumes_after_last_event_id_return_200(
+        self,
+        test_client,
+        fake_redis_streams_xread,
+        mock_get_token,
+        mock_decode_validate_token,
+        mock_get_current_identity,
+    ):
+        params = {
+            'session_id': f'test-{str(uuid.uuid4())}',
+            'from_id': '0',
+            'request_timeout': 1,
+        }
+        headers = {'Last-Event-ID': '1669237934500-0'}
+        response = await test_client.get('/v1/task-stream/', query_string=params, headers=headers)
+        assert response.status_code == 200
+        response_data = parse_sse_response(response)
+        assert [entry['entry_id'] for entry in response_data] == ['1669237936000-0']
+        assert 'id: 1669237936000-0' in response.text.split('\r\n')
+
+    async def test_get_file_status_entry_resumes_after_from_id_return_200(
+        self,
+        test_client,
+        fake_redis_streams_xread,
+        mock_get_token,
+        mock_decode_validate_token,
+        mock_get_current_identity,
+    ):
+        params = {
+            'session_id': f'test-{str(uuid.uuid4())}',
+            'from_id': '1669237933000-0',
+            'request_timeout': 1,
+        }
+        response = await test_client.get('/v1/task-stream/', query_string=params)
+        assert response.status_code == 200
+        response_data = parse_sse_response(response)
+        assert [entry['entry_id'] for entry in response_data] == ['1669237934500-0', '1669237936000-0']
+
+    async def test_get_file_status_entry_invalid_last_event_id_return_422(
+        self,
+        test_client,
+        mock_get_token,
+        mock_decode_validate_token,
+        mock_get_current_identity,
+    ):
+        params = {'session_id': f'test-{str(uuid.uuid4())}', 'request_timeout': 1}
+        headers = {'Last-Event-ID': 'invalid'}
+        response = await test_client.get('/v1/task-stream/', query_string=params, headers=headers)
+        assert response.status_code == 422
+
     async def test_delete_file_statuses_return_200(self, test_client, fake, fake_redis_scan, fake_redis_delete_by_key):
         params = {'user': fake.user_name()}
         response = await test_client.delete('/v1/task-stream/', query_string=params)
@@ -0,0 +1,37 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import pytest
+
+from dataops.components.codecs import Codec
+from dataops.components.codecs import JSONCodec
+from dataops.components.codecs import get_codec
+
+
+class TestCodecs:
+    @pytest.mark.parametrize('name', ['json', 'msgpack'])
+    def test_codec_decodes_encoded_value(self, name):
+        codec = get_codec(name)
+        value = {'progress': 50, 'names': ['file_1.txt', 'файл.txt'], 'parent': None}
+
+        assert codec.decode(codec.encode(value)) == value
+
+    def test_json_codec_encodes_value_without_whitespace(self):
+        assert JSONCodec().encode({'first': [1, 2]}) == b'{"first":[1,2]}'
+
+    def test_codec_without_encoding_methods_cannot_be_created(self):
+        class IncompleteCodec(Codec):
+            name = 'incomplete'
+
+        with pytest.raises(TypeError):
+            IncompleteCodec()
+
+    def test_get_codec_accepts_name_read_from_redis(self):
+        assert isinstance(get_codec(b'json'), JSONCodec)
+
+    def test_get_codec_raises_error_for_unknown_codec(self):
+        with pytest.raises(ValueError):
+            get_codec('unknown')
@@ -51,5 +51,6 @@ pytest_plugins = [
     'tests.fixtures.components.central_node',
     'tests.fixtures.components.task_dispatch',
     'tests.fixtures.components.resource_operations',
+    'tests.fixtures.components.resource_lock',
     'tests.fixtures.components.task_stream',
 ]
@@ -13,6 +13,9 @@ from fastapi import FastAPI
 from dataops.app import create_app
 from dataops.components.central_node.device_storage import get_device_storage
 from dataops.components.central_node.keycloak import get_keycloak_client
+from dataops.components.resource_lock.dependencies import get_resource_lock_metrics
+from dataops.components.resource_lock.dependencies import get_resource_lock_release_listener
+from dataops.components.task_stream.dependencies import get_stream_hub
 from dataops.dependencies import get_redis
 from dataops.dependencies.db import get_db_session
 
@@ -27,10 +30,23 @@ def event_loop(request):
 
 
 @pytest.fixture
-def app(event_loop, db_session, cache, redis, keycloak_client, storage) -> FastAPI:
+def app(
+    event_loop,
+    db_session,
+    cache,
+    redis,
+    resource_lock_release_listener,
+    resource_lock_metrics,
+    stream_hub,
+    keycloak_client,
+    storage,
+) -> FastAPI:
     app = create_app()
     app.dependency_overrides[get_db_session] = lambda: db_session
     app.dependency_overrides[get_redis] = lambda: redis
+    app.dependency_overrides[get_resource_lock_release_listener] = lambda: resource_lock_release_listener
+    app.dependency_overrides[get_resource_lock_metrics] = lambda: resource_lock_metrics
+    app.dependency_overrides[get_stream_hub] = lambda: stream_hub
     app.dependency_overrides[get_keycloak_client] = lambda: keycloak_client
     app.dependency_overrides[get_device_storage] = lambda: storage
     yield app
@@ -0,0 +1,29 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import pytest
+from redis.asyncio import Redis
+
+from dataops.components.resource_lock.cache import ResourceLockerCache
+from dataops.components.resource_lock.listener import ResourceLockReleaseListener
+from dataops.components.resource_lock.metrics import ResourceLockMetrics
+
+
+@pytest.fixture
+def resource_lock_metrics() -> ResourceLockMetrics:
+    return ResourceLockMetrics()
+
+
+@pytest.fixture
+async def resource_lock_release_listener(redis: Redis) -> ResourceLockReleaseListener:
+    listener = ResourceLockReleaseListener(redis)
+    yield listener
+    await listener.stop()
+
+
+@pytest.fixture
+def resource_locker(redis: Redis) -> ResourceLockerCache:
+    return ResourceLockerCache(redis)
@@ -7,68 +7,43 @@
 import json
 
 import pytest
+from redis.asyncio import Redis
 
 from dataops.components.schemas import EActionType
+from dataops.components.task_dispatch.crud import SessionJobCRUD
+from dataops.components.task_dispatch.schemas import TaskSchema
 
 
 @pytest.fixture
-async def create_fake_job(monkeypatch):
-    from dataops.components.crud import RedisCRUD
-
-    record = {
-        'session_id': '12345',
-        'label': 'testlabel',
-        'task_id': '5678',
-        'source': '/path/to/file',
-        'job_id': 'fake_global_entity_id',
-        'action': EActionType.data_transfer.name,
-        'status': 'TRANSFER',
-        'code': 'any',
-        'operator': 'me',
-        'progress': 'SUCCESS',
-        'payload': {
-            'task_id': 'fake_global_entity_id',
-            'resumable_identifier': 'fake_global_entity_id',
-            'parent_folder_geid': None,
-        },
-        'update_timestamp': '1643041442',
-    }
-
-    async def fake_return(x, y):
-        return [bytes(json.dumps(record), 'utf-8')]
-
-    monkeypatch.setattr(RedisCRUD, 'mget_by_prefix', fake_return)
+def session_job_crud(redis: Redis) -> SessionJobCRUD:
+    return SessionJobCRUD(redis)
 
 
 @pytest.fixture
-async def create_fake_job_response(monkeypatch):
-    from dataops.components.crud import RedisCRUD
-
-    async def fake_return(x, y):
-        return b''
+def task_factory(fake):
+    def create_task(**kwds) -> TaskSchema:
+        values = {
+            'session_id': fake.uuid4(),
+            'job_id': fake.uuid4(),
+            'source': fake.file_path(),
+            'action': EActionType.data_transfer.name,
+            'code': fake.pystr(),
+            'operator': fake.user_name(),
+        }
+        return TaskSchema(**(values | kwds))
 
-    monkeypatch.setattr(RedisCRUD, 'mget_by_prefix', fake_return)
+    return create_task
 
 
 @pytest.fixture
-async def create_fake_job_delete_response(monkeypatch):
-    from dataops.components.crud import RedisCRUD
-
-    async def fake_return(x, y):
-        return b''
-
-    monkeypatch.setattr(RedisCRUD, 'mdele_by_prefix', fake_return)
-
-
-@pytest.fixture
-async def fake_job_save_status(monkeypatch):
+async def create_fake_job(monkeypatch):
     from dataops.components.crud import RedisCRUD
 
     record = {
         'session_id': '12345',
         'label': 'testlabel',
-        'source': 'any',
         'task_id': '5678',
+        'source': '/path/to/file',
         'job_id': 'fake_global_entity_id',
         'action': EActionType.data_transfer.name,
         'status': 'TRANSFER',
@@ -83,65 +58,19 @@ async def fake_job_save_status(monkeypatch):
         'update_timestamp': '1643041442',
     }
 
-    async def fake_return(w, x, y, z):
-        return [bytes(json.dumps(record), 'utf-8')]
+    key = b'dataaction:12345:testlabel:fake_global_entity_id:data_transfer:any:me:/path/to/file'
 
-    monkeypatch.setattr(RedisCRUD, 'set_by_key', fake_return)
+    async def fake_return(u, v, w, x, y, z):
+        return [(key, bytes(json.dumps(record), 'utf-8'))], None
 
-
-@pytest.fixture
-async def create_fake_job_updated(monkeypatch):
-    from dataops.components.crud import RedisCRUD
-
-    record = {
-        'session_id': '12345',
-        'label': 'testlabel',
-        'task_id': '5678',
-        'source': '/path/to/file',
-        'job_id': 'fake_global_entity_id',
-        'action': EActionType.data_transfer.name,
-        'status': 'TRANSFER',
-        'code': 'any',
-        'operator': 'me',
-        'progress': 'SUCCESS',
-        'payload': {
-            'task_id': 'fake_global_entity_id',
-            'resumable_identifier': 'fake_global_entity_id',
-            'parent_folder_geid': 'newgeid',
-        },
-        'update_timestamp': '1643041442',
-    }
-
-    async def fake_return(x, y):
-        return [bytes(json.dumps(record), 'utf-8')]
-
-    monkeypatch.setattr(RedisCRUD, 'mget_by_prefix', fake_return)
+    monkeypatch.setattr(RedisCRUD, 'hgetall_by_index', fake_return)
 
 
 @pytest.fixture
-async def fake_job_save_status_updated_task(monkeypatch):
+async def create_fake_job_response(monkeypatch):
     from dataops.components.crud import RedisCRUD
 
-    record = {
-        'session_id': '12345',
-        'label': 'testlabel',
-        'source': 'any',
-        'task_id': '5678',
-        'job_id': 'fake_global_entity_id',
-        'action': EActionType.data_transfer.name,
-        'status': 'TRANSFER',
-        'code': 'any',
-        'operator': 'me',
-        'progress': 'SUCCESS',
-        'payload': {
-            'task_id': 'fake_global_entity_id',
-            'resumable_identifier': 'fake_global_entity_id',
-            'parent_folder_geid': 'newgeid',
-        },
-        'update_timestamp': '1643041442',
-    }
-
-    async def fake_return(w, x, y, z):
-        return [bytes(json.dumps(record), 'utf-8')]
+    async def fake_return(u, v, w, x, y, z):
+        return [], None
 
-    monkeypatch.setattr(RedisCRUD, 'set_by_key', fake_return)
+    monkeypatch.setattr(RedisCRUD, 'hgetall_by_index', fake_return)
@@ -6,6 +6,16 @@
 
 import pytest
 from common import JWTHandler
+from redis.asyncio import Redis
+
+from dataops.components.task_stream.hub import StreamHub
+
+
+@pytest.fixture
+async def stream_hub(redis: Redis) -> StreamHub:
+    hub = StreamHub(redis, block_timeout=100)
+    yield hub
+    await hub.stop()
 
 
 @pytest.fixture
@@ -4,18 +4,75 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
 from time import time
 
 import pytest
+from fakeredis import FakeServer
 from fakeredis.aioredis import FakeRedis
 
 from dataops.components.schemas import EActionType
 from dataops.dependencies.redis import GetRedis
 
+FAKE_STREAM_ENTRIES = [
+    (
+        bytes('1669237933000-0', 'utf-8'),
+        {
+            b'target_names': b"['file_1.txt', 'file_2.txt']",
+            b'target_type': b'batch',
+            b'container_code': b'test_project',
+            b'container_type': b'project',
+            b'action_type': bytes(EActionType.data_transfer.name, 'utf-8'),
+            b'status': b'SUCCEED',
+            b'job_id': b'875d55fd-8154-4eec-a969-016664b9b86b',
+        },
+    ),
+    (
+        bytes('1669237934500-0', 'utf-8'),
+        {
+            b'target_names': b"['file_3.txt']",
+            b'target_type': b'file',
+            b'container_code': b'test_project',
+            b'container_type': b'project',
+            b'action_type': bytes(EActionType.data_upload.name, 'utf-8'),
+            b'status': b'RUNNING',
+            b'job_id': b'1b51ac5e-eb49-40c8-b072-9115ef3ec2a5',
+        },
+    ),
+    (
+        bytes('1669237936000-0', 'utf-8'),
+        {
+            b'target_names': b"['file_4.txt']",
+            b'target_type': b'file',
+            b'container_code': b'test_project_2',
+            b'container_type': b'project',
+            b'action_type': bytes(EActionType.data_delete.name, 'utf-8'),
+            b'status': b'RUNNING',
+            b'job_id': b'82ea9a79-30b1-46eb-b5db-6263b7579d6e',
+        },
+    ),
+]
+
+
+class FakeStreamsRedis(FakeRedis):
+    """FakeRedis with XREAD emulated on top of XRANGE, since fakeredis does not support it."""
+
+    async def xread(self, streams: dict, count: int | None = None, block: int | None = None) -> list:
+        deadline = time() + block / 1000 if block else float('inf')
+        while True:
+            results = []
+            for name, offset in streams.items():
+                entries = await self.xrange(name, min=f'({offset}', count=count)
+                if entries:
+                    results.append([name.encode() if isinstance(name, str) else name, entries])
+            if results or block is None or time() >= deadline:
+                return results
+            await asyncio.sleep(0.01)
+
 
 @pytest.fixture
 def redis():
-    yield FakeRedis()
+    yield FakeStreamsRedis(server=FakeServer())
 
 
 @pytest.fixture
@@ -27,7 +84,7 @@ def get_redis():
 async def create_fake_xadd_response(monkeypatch):
     from dataops.components.task_dispatch.crud import RedisCRUD
 
-    async def fake_return(w, x, y, z):
+    async def fake_return(w, x, y, z, **kwargs):
         return b''
 
     monkeypatch.setattr(RedisCRUD, 'streams_xadd', fake_return)
@@ -37,7 +94,7 @@ async def create_fake_xadd_response(monkeypatch):
 async def fake_redis_streams_xadd(monkeypatch):
     from dataops.components.task_dispatch.crud import RedisCRUD
 
-    async def fake_function(w, x, y, z):
+    async def fake_function(w, x, y, z, **kwargs):
         current_time_ms = int(time() * 1000)
         return bytes(f'{current_time_ms}-0', 'utf-8')
 
@@ -49,56 +106,41 @@ async def fake_redis_streams_xread(monkeypatch):
     from dataops.components.task_dispatch.crud import RedisCRUD
 
     async def fake_function(self, key, offset, block=None, count=None):
-        all_entries = [
-            (
-                bytes('1669237933000-0', 'utf-8'),
-                {
-                    b'target_names': b"['file_1.txt', 'file_2.txt']",
-                    b'target_type': b'batch',
-                    b'container_code': b'test_project',
-                    b'container_type': b'project',
-                    b'action_type': bytes(EActionType.data_transfer.name, 'utf-8'),
-                    b'status': b'SUCCEED',
-                    b'job_id': b'875d55fd-8154-4eec-a969-016664b9b86b',
-                },
-            ),
-            (
-                bytes('1669237934500-0', 'utf-8'),
-                {
-                    b'target_names': b"['file_3.txt']",
-                    b'target_type': b'file',
-                    b'container_code': b'test_project',
-                    b'container_type': b'project',
-                    b'action_type': bytes(EActionType.data_upload.name, 'utf-8'),
-                    b'status': b'RUNNING',
-                    b'job_id': b'1b51ac5e-eb49-40c8-b072-9115ef3ec2a5',
-                },
-            ),
-            (
-                bytes('1669237936000-0', 'utf-8'),
-                {
-                    b'target_names': b"['file_4.txt']",
-                    b'target_type': b'file',
-                    b'container_code': b'test_project_2',
-                    b'container_type': b'project',
-                    b'action_type': bytes(EActionType.data_delete.name, 'utf-8'),
-                    b'status': b'RUNNING',
-                    b'job_id': b'82ea9a79-30b1-46eb-b5db-6263b7579d6e',
-                },
-            ),
-        ]
         entries_after_offset = []
-        for entry in all_entries:
+        for entry in FAKE_STREAM_ENTRIES:
             offset_int = int(offset) if offset == '0' else int(offset[:-2])
             if int(entry[0].decode()[:-2]) > offset_int:
                 entries_after_offset.append(entry)
         if entries_after_offset:
             return [[bytes(key, 'utf-8'), entries_after_offset]]
+        if block:
+            await asyncio.sleep(block / 1000)
         return []
 
     monkeypatch.setattr(RedisCRUD, 'streams_xread', fake_function)
 
 
+@pytest.fixture
+async def fake_redis_streams_xrange(monkeypatch):
+    from dataops.components.task_dispatch.crud import RedisCRUD
+
+    def parse_id(entry_id, default):
+        if entry_id in ('-', '+'):
+            return default
+        milliseconds, _, sequence = entry_id.partition('-')
+        return int(milliseconds), int(sequence or 0)
+
+    async def fake_function(self, key, min_id='-', max_id='+', count=None, reverse=False):
+        lowest = parse_id(min_id, (0, 0))
+        highest = parse_id(max_id, (float('inf'), 0))
+        entries = [entry for entry in FAKE_STREAM_ENTRIES if lowest <= parse_id(entry[0].decode(), None) <= highest]
+        if reverse:
+            entries.reverse()
+        return entries[:count]
+
+    monkeypatch.setattr(RedisCRUD, 'streams_xrange', fake_function)
+
+
 @pytest.fixture
 async def fake_redis_scan(monkeypatch):
     from redis.asyncio.client import Redis